@@ -0,0 +1,497 @@
+# asgi.py
+#
+# Async serving mode: the same routes as main.py as Quart coroutines, so a worker waits on
+# LLM calls instead of blocking on them. LLM requests go through the async backend balancer; text
+# extraction, PDF rendering and zipping run in a process pool off the event loop.
+#
+# Run with:  hypercorn asgi:app --bind 0.0.0.0:8000
+
+import os
+import io
+import time
+import asyncio
+import logging
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from quart import Quart, current_app, render_template, request, redirect, url_for, send_file, session, flash, g, jsonify
+from werkzeug.utils import secure_filename
+from dotenv import load_dotenv
+
+from utils.groq_integration import MISSING_KEY_MESSAGE
+from utils.llm_backends import build_balancer
+from utils.scheduler import scheduling, scheduler_stats, INTERACTIVE
+from utils.run_journal import start_run, interrupted_runs
+from utils.file_processing import extract_all_text, extraction_cost, COST_HEAVY
+from utils.analysis import (
+    tool_selection, course_context_async, plan_tasks, run_checkpointed_async, resume_job_async, save_outcomes,
+    start_draining_async, reports_by_assignment, requested_report, DOWNLOAD_GROUPS, download_tools, report_files, zip_reports,
+)
+from utils.report_store import job_reports, STATUS_OK
+from utils.cohort_analytics import cohort_key, cohort_analytics, submitter_view
+from utils.similarity import index_submissions, similarity_report
+from utils.cli import resume_command
+from utils.http_cache import jinja_options, prerender, static_response, encode_body, record_response, page_stats
+from utils.model_router import route_stats
+from utils.single_flight import flight_stats
+from utils.ocr import ocr_stats
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB per uploaded file
+MAX_SESSION_JOBS = 50  # Published jobs remembered per session for the cohort routes
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))  # In-flight LLM tasks per analysis request
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+
+_cpu_pool = None
+
+
+def cpu_pool():
+    """Process pool for extraction, PDF rendering and zipping, created on first use."""
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _cpu_pool
+
+
+async def run_cpu(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), func, *args)
+
+
+async def extract(files):
+    """extract_all_text per file: heavy formats in the process pool, light ones in a thread."""
+    async def one(name, path):
+        if await asyncio.to_thread(extraction_cost, path) == COST_HEAVY:
+            return await run_cpu(extract_all_text, {name: path})
+        return await asyncio.to_thread(extract_all_text, {name: path})
+
+    results = await asyncio.gather(*(one(name, path) for name, path in files.items()))
+    return {name: text for result in results for name, text in result.items()}
+
+
+async def shutdown_pool():
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def render_static(template_name):
+    app = current_app
+    static_pages = app.extensions['static_pages']
+    page = static_pages.get(template_name)
+    if page is None:
+        template_paths = [os.path.join(app.root_path, app.template_folder, name) for name in (template_name, '_header.html')]
+        page = static_pages[template_name] = prerender(await render_template(template_name), template_paths)
+    g.raw_bytes = len(page.body)
+    status, body, headers = static_response(page, request.headers)
+    return app.response_class(body, status=status, headers=headers)
+
+
+async def start_timer():
+    g.request_started = time.perf_counter()
+
+
+async def compress_and_measure(response):
+    # Dynamic HTML is compressed per request; prerendered pages arrive already encoded
+    raw_bytes = g.pop('raw_bytes', None)
+    if response.mimetype == 'text/html' and response.status_code == 200 and 'Content-Encoding' not in response.headers:
+        body = await response.get_data()
+        raw_bytes = len(body)
+        encoded, encoding = encode_body(body, request.headers.get('Accept-Encoding'))
+        if encoding:
+            response.set_data(encoded)
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    if 'request_started' in g:
+        wire_bytes = response.content_length or 0
+        record_response(request.endpoint, g.request_started, raw_bytes if raw_bytes is not None else wire_bytes, wire_bytes)
+    return response
+
+
+async def home():
+    return await render_template('home.html')
+
+async def tutorial():
+    return await render_static('tutorial.html')
+
+async def reports():
+    # Indexed lookups in the report repository; fast enough to run on the event loop
+    user_id = session.get('user_id')
+    job_id = session.get('job_id')
+    records = job_reports(job_id, user_id=user_id) if user_id and job_id else []
+    return await render_template('reports.html',
+                                 analysis_completed=session.get('analysis_completed', False),
+                                 selected_tools=session.get('selected_tools', {}),
+                                 reports_by_assignment=reports_by_assignment(records),
+                                 assignments=session.get('assignments_text', {}).keys(),
+                                 cohort_id=session.get('cohort_id'))
+
+async def process_files():
+    try:
+        files = await request.files
+        assignment_file = files.get('assignment_file')
+        assessment_brief_file = files.get('assessment_brief_file')
+        module_material_files = files.getlist('module_material_files')
+
+        missing_files = []
+        if not assignment_file or assignment_file.filename == '':
+            missing_files.append("Student's Assignment")
+        if not assessment_brief_file or assessment_brief_file.filename == '':
+            missing_files.append("Assessment Brief")
+        if not module_material_files or all(f.filename == '' for f in module_material_files):
+            missing_files.append("Module Materials")
+        if missing_files:
+            await flash(f"🛑 The following required files are missing: {', '.join(missing_files)}. Please upload them.", "error")
+            return redirect(url_for('home'))
+
+        oversized_files = []
+        for file in [assignment_file, assessment_brief_file] + module_material_files:
+            file.seek(0, os.SEEK_END)
+            if file.tell() > MAX_FILE_SIZE:
+                oversized_files.append(file.filename)
+            file.seek(0)
+        if oversized_files:
+            await flash(f"🛑 The following files exceed the 5MB limit: {', '.join(oversized_files)}. Please upload smaller files.", "error")
+            return redirect(url_for('home'))
+
+        # Generate a new user ID for each file upload to prevent conflicts
+        user_id = os.urandom(8).hex()
+        session['user_id'] = user_id
+        upload_folder = os.path.join('uploads', secure_filename(user_id))
+        reports_folder = os.path.join(upload_folder, 'reports')
+        if os.path.exists(reports_folder):
+            shutil.rmtree(reports_folder)
+        os.makedirs(reports_folder, exist_ok=True)
+
+        async def save(file):
+            filename = secure_filename(file.filename)
+            await file.save(os.path.join(upload_folder, filename))
+            return filename
+
+        assignment_filename = await save(assignment_file)
+        assessment_brief_filename = await save(assessment_brief_file)
+        module_material_filenames = [await save(file) for file in module_material_files]
+        session['assignment_filename'] = assignment_filename
+        session['assessment_brief_filename'] = assessment_brief_filename
+        session['module_material_filenames'] = module_material_filenames
+
+        for key in ('job_id', 'analysis_completed', 'selected_tools', 'cohort_id'):
+            session.pop(key, None)
+
+        def paths(names):
+            return {name: os.path.join(upload_folder, name) for name in names}
+
+        # Every file is extracted in parallel, routed by the cost class of its format
+        assignments_text, assessment_briefs_text, module_materials_text = await asyncio.gather(
+            extract(paths([assignment_filename])),
+            extract(paths([assessment_brief_filename])),
+            extract(paths(module_material_filenames)),
+        )
+        session['assignments_text'] = assignments_text
+        session['assessment_briefs_text'] = assessment_briefs_text
+        session['module_materials_text'] = module_materials_text
+        session['files_processed'] = True
+
+        await flash("✅ Files processed and stored successfully!", "success")
+        return redirect(url_for('home'))
+
+    except Exception as e:
+        logger.error(f"Error in process_files: {e}")
+        await flash(f"🛑 An error occurred while processing files: {e}", "error")
+        return redirect(url_for('home'))
+
+async def analyze_tools():
+    try:
+        selected_tools, error = tool_selection(await request.form)
+        if error:
+            await flash(error, "error")
+            return redirect(url_for('home'))
+        session['selected_tools'] = selected_tools
+
+        assignments_text = session.get('assignments_text', {})
+        assessment_briefs_text = session.get('assessment_briefs_text', {})
+        module_materials_text = session.get('module_materials_text', {})
+
+        user_id = session.get('user_id')
+        if not user_id:
+            await flash("🛑 Session expired or invalid. Please upload the files again.", "error")
+            return redirect(url_for('home'))
+        upload_folder = os.path.join('uploads', secure_filename(user_id))
+        reports_folder = os.path.join(upload_folder, 'reports')
+        os.makedirs(reports_folder, exist_ok=True)
+
+        session.pop('job_id', None)
+
+        if not assignments_text:
+            await flash("🛑 No assignments found for analysis.", "error")
+            return redirect(url_for('home'))
+
+        groq_client = current_app.extensions['groq_client']
+        job_id = os.urandom(8).hex()
+        cohort_id = cohort_key(assessment_briefs_text, job_id)
+        # An upload being analysed is interactive work: its LLM calls and PDF renders go ahead
+        # of batch and speculative work, and share slots fairly with other users
+        with scheduling(INTERACTIVE, user_id):
+            brief_checklist, module_concepts = await course_context_async(
+                groq_client, selected_tools, assessment_briefs_text, module_materials_text, upload_folder
+            )
+            # Grammar drafts and scores are kept per submitter (this browser session, which keeps
+            # its id across uploads) within the cohort, never across students sharing a filename
+            submitter_id = session.setdefault('submitter_id', os.urandom(8).hex())
+            draft_scope = (cohort_id, submitter_id)
+            # Planning deduplicates the module materials (MinHash), so it runs in the process pool
+            tasks = await run_cpu(
+                plan_tasks, assignments_text, selected_tools, assessment_briefs_text, module_materials_text,
+                brief_checklist, module_concepts, draft_scope
+            )
+
+            # The plan and every finished task are journaled, so /resume can finish the job if this worker dies
+            await asyncio.to_thread(
+                start_run, job_id, user_id, cohort_id, reports_folder, selected_tools, assignments_text, tasks, submitter_id
+            )
+
+            # Every (assignment, report) task runs concurrently, bounded by LLM_CONCURRENCY
+            limit = asyncio.Semaphore(LLM_CONCURRENCY)
+
+            async def bounded(task):
+                async with limit:
+                    return await run_checkpointed_async(groq_client, job_id, task, reports_folder, cpu_pool())
+
+            outcomes = await asyncio.gather(*(bounded(task) for task in tasks))
+
+        queued = await asyncio.to_thread(
+            save_outcomes, user_id, job_id, assignments_text, selected_tools, outcomes, cohort_id, submitter_id
+        )
+        await publish_job(groq_client, user_id, job_id, cohort_id, assignments_text, queued)
+        await flash("✅ Analysis completed and reports generated!", "success")
+        return redirect(url_for('reports'))
+
+    except Exception as e:
+        logger.error(f"Error in analyze_tools: {e}")
+        await flash(f"🛑 An error occurred during analysis: {e}", "error")
+        return redirect(url_for('home'))
+
+
+async def publish_job(groq_client, user_id, job_id, cohort_id, assignments_text, queued):
+    # Points the session at a job whose outcomes are recorded and flashes what needs attention
+    session['job_id'] = job_id
+    session['cohort_id'] = cohort_id
+    session['analysis_completed'] = True
+    session['published_jobs'] = (session.get('published_jobs', []) + [[cohort_id, job_id]])[-MAX_SESSION_JOBS:]
+
+    # Each submission is checked against the rest of the cohort through the LSH index
+    try:
+        # Submissions are indexed per submitter, which stays the same across this session's uploads
+        submitter_id = session.get('submitter_id', user_id)
+        similar = await asyncio.to_thread(index_submissions, cohort_id, submitter_id, job_id, assignments_text)
+    except Exception as e:
+        similar = 0
+        logger.error(f"Error indexing submissions for similarity: {e}")
+    if similar:
+        await flash(f"⚠️ Found {similar} submission pair(s) with highly similar text in this cohort.", "warning")
+
+    # Degraded mode: the LLM circuit was open, so some reports wait in the deferred queue
+    if queued:
+        start_draining_async(groq_client, cpu_pool())
+        await flash(f"⏳ The AI service is unavailable: {queued} report(s) were queued and will be completed automatically.", "warning")
+
+
+async def resume():
+    # Finishes the user's latest analysis that a crashed or restarted worker left unfinished;
+    # tasks the journal has finished are not run (or paid for) again
+    user_id = session.get('user_id')
+    if not user_id:
+        await flash("🛑 Session expired or invalid. Please upload the files again.", "error")
+        return redirect(url_for('home'))
+    try:
+        groq_client = current_app.extensions['groq_client']
+        job_ids = await asyncio.to_thread(interrupted_runs, user_id)
+        result = await resume_job_async(groq_client, job_ids[-1], INTERACTIVE, executor=cpu_pool()) if job_ids else None
+        if result is None:
+            await flash("🛑 No interrupted analysis to resume.", "error")
+            return redirect(url_for('home'))
+        run, queued = result
+        session['selected_tools'] = run.selected_tools
+        session['assignments_text'] = run.assignments_text
+        await publish_job(groq_client, user_id, run.job_id, run.cohort_id, run.assignments_text, queued)
+        await flash(f"✅ Analysis resumed: {len(run.tasks) - run.finished} unfinished report(s) completed.", "success")
+        return redirect(url_for('reports'))
+    except Exception as e:
+        logger.error(f"Error in resume: {e}")
+        await flash(f"🛑 An error occurred while resuming the analysis: {e}", "error")
+        return redirect(url_for('home'))
+
+async def download_reports():
+    try:
+        download_tool = (await request.values).get('download_tool')
+        if not download_tool:
+            await flash("🛑 No download tool specified.", "error")
+            return redirect(url_for('reports'))
+
+        assignments = session.get('assignments_text', {})
+        user_id = session.get('user_id')
+        if not user_id:
+            await flash("🛑 Session expired or invalid. Please upload the files again.", "error")
+            return redirect(url_for('home'))
+
+        job_id = session.get('job_id')
+        if not job_id or not assignments:
+            await flash("🛑 No reports available for download.", "error")
+            return redirect(url_for('reports'))
+        if download_tool != 'all' and download_tool not in DOWNLOAD_GROUPS:
+            await flash("🛑 Invalid download option selected.", "error")
+            logger.warning(f"Invalid download option selected: {download_tool}")
+            return redirect(url_for('reports'))
+
+        records = job_reports(job_id, user_id=user_id, tools=download_tools(download_tool))
+        zip_bytes, missing = await run_cpu(zip_reports, report_files(records, download_tool))
+        for pdf_filename, label in missing:
+            await flash(f"🛑 {label} report file not found: {pdf_filename}", "error")
+
+        if zip_bytes is None:
+            if download_tool == 'all':
+                await flash("🛑 No reports available to compile.", "error")
+            else:
+                await flash("🛑 No reports available for the selected tool.", "error")
+            return redirect(url_for('reports'))
+
+        filename = 'All_Reports.zip' if download_tool == 'all' else f'{download_tool.capitalize()}_Reports.zip'
+        return await send_file(io.BytesIO(zip_bytes), mimetype='application/zip', as_attachment=True,
+                               attachment_filename=filename)
+
+    except Exception as e:
+        logger.error(f"Error in download_reports: {e}")
+        await flash(f"🛑 An error occurred while generating reports: {e}", "error")
+        return redirect(url_for('reports'))
+
+async def view_report():
+    try:
+        report_id = request.args.get('report_id')
+        assignment = request.args.get('assignment')
+        report = request.args.get('report')
+        if not report_id and not (assignment and report):
+            await flash("🛑 Invalid report parameters.", "error")
+            return redirect(url_for('reports'))
+
+        user_id = session.get('user_id')
+        if not user_id:
+            await flash("🛑 Session expired or invalid. Please upload the files again.", "error")
+            return redirect(url_for('home'))
+
+        record = requested_report(user_id, session.get('job_id'), report_id, assignment, report)
+        if record is None:
+            await flash("🛑 Report not found.", "error")
+            logger.warning(f"Report not found: id={report_id} assignment={assignment} report={report}")
+            return redirect(url_for('reports'))
+        if record.status != STATUS_OK:
+            await flash(record.error, "error")
+            return redirect(url_for('reports'))
+
+        return await send_file(record.pdf_path, mimetype='application/pdf', as_attachment=False,
+                               attachment_filename=os.path.basename(record.pdf_path))
+
+    except Exception as e:
+        logger.error(f"Error in view_report: {e}")
+        await flash(f"🛑 An error occurred while viewing the report: {e}", "error")
+        return redirect(url_for('reports'))
+
+def session_jobs(cohort_id):
+    # Jobs this browser session published to the cohort; the cohort routes only show a cohort
+    # to its own submitters (an unknown cohort and someone else's look the same)
+    return {job_id for cohort, job_id in session.get('published_jobs', []) if cohort == cohort_id}
+
+
+async def analytics(cohort_id):
+    # A cold cohort is aggregated off the event loop; later requests hit the cache
+    job_ids = session_jobs(cohort_id)
+    if not job_ids:
+        return jsonify(error="🛑 No scores recorded for this cohort."), 404
+    try:
+        result = await asyncio.to_thread(cohort_analytics, cohort_id)
+    except Exception as e:
+        logger.error(f"Error in analytics for cohort {cohort_id}: {e}")
+        return jsonify(error=f"🛑 Error: {e}"), 500
+    if result is None:
+        return jsonify(error="🛑 No scores recorded for this cohort."), 404
+    return jsonify(submitter_view(result, job_ids))
+
+
+async def similarity(cohort_id):
+    # Only pairs involving the session's own submissions, and only to the cohort's submitters
+    job_ids = session_jobs(cohort_id)
+    if not job_ids:
+        return jsonify(error="🛑 No submissions recorded for this cohort."), 404
+    try:
+        return jsonify(await asyncio.to_thread(similarity_report, cohort_id, job_ids))
+    except Exception as e:
+        logger.error(f"Error in similarity for cohort {cohort_id}: {e}")
+        return jsonify(error=f"🛑 Error: {e}"), 500
+
+
+async def metrics():
+    # Counters since startup, per process
+    llm = current_app.extensions['groq_client']
+    return jsonify(
+        llm_backends=llm.stats() if hasattr(llm, 'stats') else {},
+        llm_breaker=llm.breaker.stats() if hasattr(llm, 'breaker') else {},
+        llm_routes=route_stats(),
+        llm_flights=flight_stats(),
+        scheduler=scheduler_stats(),
+        pages=page_stats(),
+        ocr=ocr_stats(),
+    )
+
+
+async def request_entity_too_large(error):
+    await flash("🛑 File too large. Maximum upload size is 16MB.", "error")
+    return redirect(url_for('home'))
+
+ROUTES = [
+    ('/', home, ['GET']),
+    ('/tutorial', tutorial, ['GET']),
+    ('/reports', reports, ['GET']),
+    ('/process_files', process_files, ['POST']),
+    ('/analyze_tools', analyze_tools, ['POST']),
+    ('/resume', resume, ['POST']),
+    ('/download_reports', download_reports, ['POST']),
+    ('/view_report', view_report, ['GET']),
+    ('/cohort/<cohort_id>/analytics', analytics, ['GET']),
+    ('/cohort/<cohort_id>/similarity', similarity, ['GET']),
+    ('/metrics', metrics, ['GET']),
+]
+
+
+def create_app(config=None):
+    """Builds the Quart app; config is a mapping that overrides the defaults below."""
+    app = Quart(__name__)
+    app.jinja_options = {**app.jinja_options, **jinja_options('asgi')}
+    app.secret_key = os.getenv("SECRET_KEY") or os.urandom(24)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB upload limit
+    app.config['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
+    app.config['LLM_BACKENDS'] = os.getenv("LLM_BACKENDS")  # JSON list of backends, see utils/llm_backends.py
+    app.config.update(config or {})
+
+    if not app.config['GROQ_API_KEY'] and not app.config['LLM_BACKENDS']:
+        logger.warning(MISSING_KEY_MESSAGE)
+    app.extensions['groq_client'] = build_balancer(app.config['LLM_BACKENDS'], app.config['GROQ_API_KEY'], asynchronous=True)
+    # Pages with no per-request state are rendered once per app: {template name: StaticPage}
+    app.extensions['static_pages'] = {}
+
+    for rule, view, methods in ROUTES:
+        app.add_url_rule(rule, view_func=view, methods=methods)
+    app.before_request(start_timer)
+    app.after_request(compress_and_measure)
+    app.after_serving(shutdown_pool)
+    app.register_error_handler(413, request_entity_too_large)
+    app.cli.add_command(resume_command(app, asynchronous=True))
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    os.makedirs('uploads', exist_ok=True)
+    app.run(debug=True, port=8000)
@@ -0,0 +1,56 @@
+# benchmarks/bench_cohort.py
+#
+# Cohort analytics latency on a synthetic cohort: every submission gets an overall score
+# for each tool and per-criterion scores for the critical-writing check. "cold" aggregates
+# from the score store, "warm" is a repeat request answered from the cache.
+#
+#   python benchmarks/bench_cohort.py [submissions]
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.database import connect  # noqa: E402
+from utils.cohort_analytics import cohort_analytics, OVERALL  # noqa: E402
+
+TOOLS = ("Assessment Brief Compliance", "Grammar Check", "Critical Writing Check", "Reference Check")
+CRITERIA = ("Argument Structure", "Critical Analysis", "Evidence and Support", "Clarity and Conciseness", "Grammar and Syntax")
+
+
+def seed(path, submissions):
+    rng = random.Random(0)
+    rows = []
+    for i in range(submissions):
+        for tool in TOOLS:
+            rows.append(("bench", f"user{i % 50}", f"essay{i}.docx", tool, OVERALL, rng.randint(2, 10), 10.0, "job", 0.0))
+        for criterion in CRITERIA:
+            rows.append(("bench", f"user{i % 50}", f"essay{i}.docx", "Critical Writing Check", criterion, rng.choice((0.5, 1, 1.5, 2)), 2.0, "job", 0.0))
+    conn = connect(path)
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def timed(path):
+    start = time.perf_counter()
+    cohort_analytics("bench", path=path)
+    return (time.perf_counter() - start) * 1000
+
+
+def main(submissions=10000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        rows = seed(path, submissions)
+        import pandas  # noqa: F401  (import cost is paid once per process, not per request)
+        cold = timed(path)
+        warm = sorted(timed(path) for _ in range(50))[25]
+        print(f"{submissions} submissions, {rows} score rows")
+        print(f"cold {cold:.1f} ms, warm {warm:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,55 @@
+# benchmarks/bench_ocr.py
+#
+# OCR throughput: renders a generated text PDF as page images, as a scan would arrive, and
+# runs them through the OCR worker pool with an empty cache. Prints pages/s overall and per
+# core, then the same batch again to show that cached pages skip recognition.
+#
+#   python benchmarks/bench_ocr.py [pages]
+
+import io
+import os
+import sys
+import time
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["QA_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_ocr_")  # cold cache
+
+from utils.ocr import OCR_WORKERS, ocr_available, ocr_images, ocr_stats, render_page, shutdown_pool  # noqa: E402
+
+
+def sample_pdf(pages):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for n in range(pages):
+        y = 780
+        for line in range(40):
+            pdf.drawString(60, y, f"Page {n + 1}, line {line + 1}: marketing strategy depends on segmentation and pricing.")
+            y -= 18
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def main(pages=8):
+    if not ocr_available():
+        print("OCR unavailable: install pytesseract and the tesseract binary.")
+        return 1
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(sample_pdf(pages))) as pdf:
+        images = [render_page(page) for page in pdf.pages]
+    for label in ("cold", "cached"):
+        start = time.perf_counter()
+        ocr_images(images)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<8}{pages} pages in {elapsed:.2f}s: {pages / elapsed:.2f} pages/s on {OCR_WORKERS} worker(s)")
+    print(f"per core: {ocr_stats()['pages_per_core_second']:.2f} pages/s")
+    shutdown_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 8))
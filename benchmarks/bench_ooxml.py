@@ -0,0 +1,78 @@
+# benchmarks/bench_ooxml.py
+#
+# DOCX/PPTX extraction: the streaming OOXML path against the python-docx/python-pptx object
+# models it replaces, on generated documents. Prints wall time and, from a second traced run,
+# peak Python heap (tracemalloc does not see lxml's C allocations, so the object models are
+# under-reported).
+#
+#   python benchmarks/bench_ooxml.py [paragraphs] [slides]
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.file_processing import docx_pages, docx_pages_fallback, pptx_pages, pptx_pages_fallback  # noqa: E402
+
+
+def sample_docx(paragraphs):
+    import docx
+    doc = docx.Document()
+    for n in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {n + 1}: marketing strategy depends on segmentation, targeting and pricing.")
+        if n % 50 == 0:
+            table = doc.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = "criterion"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def sample_pptx(slides):
+    from pptx import Presentation
+    from pptx.util import Inches
+    prs = Presentation()
+    for n in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {n + 1}"
+        slide.placeholders[1].text = "Segmentation\nTargeting\nPositioning"
+        group = slide.shapes.add_group_shape()
+        group.shapes.add_textbox(0, 0, Inches(2), Inches(1)).text_frame.text = "Grouped caption"
+        slide.notes_slide.notes_text_frame.text = "Speaker notes for this slide."
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def measure(label, extract, data):
+    start = time.perf_counter()
+    pages = extract(data)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    extract(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    chars = sum(len(text) for text, _ in pages)
+    print(f"{label:<22}{elapsed * 1000:8.1f} ms {peak / 2**20:8.1f} MiB peak {chars:>9} chars")
+
+
+def main(paragraphs=5000, slides=200):
+    data = sample_docx(paragraphs)
+    print(f"DOCX, {paragraphs} paragraphs ({len(data) // 1024} KiB)")
+    measure("streaming", docx_pages, data)
+    measure("python-docx", docx_pages_fallback, data)
+    data = sample_pptx(slides)
+    print(f"PPTX, {slides} slides ({len(data) // 1024} KiB)")
+    measure("streaming", pptx_pages, data)
+    measure("python-pptx", pptx_pages_fallback, data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
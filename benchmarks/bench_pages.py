@@ -0,0 +1,52 @@
+# benchmarks/bench_pages.py
+#
+# Server-side TTFB and bytes on the wire for the HTML pages, through the Flask test client.
+# "identity" is the old behaviour (full render, uncompressed); the other rows show what a
+# browser actually gets now: compressed bodies and 304s on revalidation.
+#
+#   python benchmarks/bench_pages.py [requests per row]
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from main import app  # noqa: E402
+
+CASES = [
+    ("identity", {"Accept-Encoding": "identity"}),
+    ("gzip", {"Accept-Encoding": "gzip"}),
+    ("br, gzip", {"Accept-Encoding": "br, gzip"}),
+]
+
+
+def measure(client, path, headers, runs):
+    timings = []
+    size = status = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+        size, status = len(body), response.status_code
+    return statistics.median(timings), size, status
+
+
+def main(runs=200):
+    client = app.test_client()
+    print(f"{'page':<12}{'request':<22}{'status':>7}{'ttfb ms':>10}{'bytes':>9}")
+    for path in ("/", "/tutorial", "/reports"):
+        for label, headers in CASES:
+            ttfb, size, status = measure(client, path, headers, runs)
+            print(f"{path:<12}{label:<22}{status:>7}{ttfb:>10.3f}{size:>9}")
+        etag = client.get(path, headers={"Accept-Encoding": "gzip"}).headers.get("ETag")
+        if etag:
+            ttfb, size, status = measure(client, path, {"Accept-Encoding": "gzip", "If-None-Match": etag}, runs)
+            print(f"{path:<12}{'revalidate (ETag)':<22}{status:>7}{ttfb:>10.3f}{size:>9}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,91 @@
+# benchmarks/bench_pdf_engines.py
+#
+# PDF engines side by side: pages/s and text fidelity of each registered engine (PDF_ENGINES)
+# on a corpus. By default the corpus is generated: prose-only PDFs, plus a PDF whose pages
+# mix prose with ruled tables, so that the pdfium engine's hand-off to pdfplumber is measured
+# too. Fidelity is the word-level similarity of the normalised text to the source text (to
+# the pdfplumber text when the corpus is a directory of real PDFs).
+#
+#   python benchmarks/bench_pdf_engines.py [pages per document | directory of PDFs]
+
+import io
+import os
+import sys
+import time
+import difflib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.file_processing import PDF_ENGINES  # noqa: E402
+from utils.text_normalization import normalize_pages  # noqa: E402
+
+SENTENCES = [
+    "A marketing strategy depends on segmentation, targeting and positioning.",
+    "The evidence for each choice should be drawn from the case study rather than asserted.",
+    "Pricing decisions follow from the value the chosen segment places on the offer.",
+    "Competitor analysis explains why the positioning is defensible over time.",
+    "Distribution channels must match how the segment already searches and buys.",
+    "Objectives are measurable, time-bound and tied to the budget in the appendix.",
+    "The conclusion weighs the risks of the plan against its expected returns.",
+]
+
+
+def sample_pdf(pages, tables=False):
+    """Generated PDF and its source text."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+    style = getSampleStyleSheet()["Normal"]
+    story, source = [], []
+    for page in range(1, pages + 1):
+        for n in range(6):
+            text = " ".join(SENTENCES[(page * 3 + n + k) % len(SENTENCES)] for k in range(3))
+            story.append(Paragraph(text, style))
+            source.append(text)
+        if tables and page % 2:
+            rows = [["Criterion", "Weight"], ["Analysis", "40%"], ["Evidence", "30%"], ["Structure", "30%"]]
+            table = Table(rows)
+            table.setStyle(TableStyle([("GRID", (0, 0), (-1, -1), 0.5, colors.black)]))
+            story.append(table)
+            source.extend(" ".join(row) for row in rows)
+        story.append(PageBreak())
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4).build(story)
+    return buffer.getvalue(), "\n".join(source)
+
+
+def fidelity(text, reference):
+    return difflib.SequenceMatcher(None, text.split(), reference.split(), autojunk=False).ratio()
+
+
+def corpus(arg):
+    if arg and os.path.isdir(arg):
+        for name in sorted(os.listdir(arg)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(arg, name), "rb") as f:
+                    yield name, f.read(), None
+        return
+    pages = int(arg or 20)
+    yield "prose.pdf", *sample_pdf(pages)
+    yield "tables.pdf", *sample_pdf(pages, tables=True)
+
+
+def main(arg=None):
+    print(f"{'document':<20}{'engine':<12}{'pages/s':>10}{'fidelity':>10}{'tables':>8}")
+    for name, data, source in corpus(arg):
+        results = {}
+        for engine, extract in PDF_ENGINES.items():
+            start = time.perf_counter()
+            pages = extract(data)
+            elapsed = time.perf_counter() - start
+            results[engine] = (len(pages) / elapsed, normalize_pages(pages).text, sum(len(tables) for _, tables in pages))
+        reference = source if source is not None else results["pdfplumber"][1]
+        for engine, (rate, text, tables) in results.items():
+            print(f"{name[:19]:<20}{engine:<12}{rate:>10.1f}{fidelity(text, reference):>10.3f}{tables:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,53 @@
+# benchmarks/bench_report_render.py
+#
+# Report rendering: tokenizing LLM Markdown (cold, then from the content-hash cache) and
+# laying it out as a PDF and as HTML, on a generated report of the usual shape (headings,
+# bullet lists, a criteria table and a score).
+#
+#   python benchmarks/bench_report_render.py [sections] [repeats]
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.report_markdown import tokenize, parse_report, to_html  # noqa: E402
+from utils.pdf_generation_reportlab import generate_individual_pdf_report  # noqa: E402
+
+
+def sample_report(sections):
+    parts = ["# Critical Writing Report"]
+    for n in range(sections):
+        parts.append(f"## Section {n + 1}: **Argument** and evidence")
+        parts.append(
+            f"The essay's *claim* in paragraph {n + 1} is clear, but the evidence is lacking in places; "
+            "see `Kotler (2019)` for the missing market data & figures."
+        )
+        parts.append("\n".join(f"- Point {k + 1} about **structure** and _tone_" for k in range(4)))
+    parts.append("| Criterion | Score |\n|---|---|\n" + "\n".join(f"| Criterion {k} | {k % 10}/10 |" for k in range(8)))
+    parts.append("## Score: 7/10")
+    return "\n\n".join(parts)
+
+
+def timed(label, func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    print(f"{label:<22}{(time.perf_counter() - start) * 1000 / repeats:8.2f} ms")
+
+
+def main(sections=40, repeats=20):
+    report = sample_report(sections)
+    print(f"Report, {sections} sections ({len(report)} chars), mean of {repeats} runs")
+    timed("tokenize", lambda: tokenize(report), repeats)
+    parse_report(report)
+    timed("parse (cached)", lambda: parse_report(report), repeats)
+    timed("HTML", lambda: to_html(parse_report(report)), repeats)
+    timed("PDF", lambda: generate_individual_pdf_report("Critical Writing Check", report), repeats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
@@ -0,0 +1,51 @@
+# benchmarks/import_budget.py
+#
+# Cold-start check: imports a module in a fresh interpreter under `python -X importtime`,
+# prints the slowest imports, and exits non-zero if the cumulative time goes over budget
+# or any heavy backend (parsers, PDF, LLM SDK) was imported eagerly.
+#
+#   python benchmarks/import_budget.py [module] [budget ms]
+
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only; none of these may appear in a cold import of the app.
+HEAVY_MODULES = ("pdfplumber", "docx", "pptx", "reportlab", "markdown", "groq", "numpy", "pandas")
+DEFAULT_BUDGET_MS = 250
+
+
+def import_times(module):
+    """Returns [(cumulative ms, self ms, name)] for a cold import of module."""
+    env = dict(os.environ, GROQ_API_KEY="")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name))
+    return rows
+
+
+def main(module="main", budget_ms=DEFAULT_BUDGET_MS):
+    rows = import_times(module)
+    total = next(cumulative for cumulative, _, name in rows if name == module)
+    eager = sorted({name.split(".")[0] for _, _, name in rows} & set(HEAVY_MODULES))
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative, self_ms, name in sorted(rows, reverse=True)[:15]:
+        print(f"{cumulative:>14.1f}{self_ms:>10.1f}  {name}")
+    print(f"\nimport {module}: {total:.1f} ms (budget {budget_ms} ms)")
+    if eager:
+        print(f"Heavy modules imported eagerly: {', '.join(eager)}")
+    return 0 if total <= budget_ms and not eager else 1
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sys.exit(main(args[0] if args else "main", float(args[1]) if len(args) > 1 else DEFAULT_BUDGET_MS))
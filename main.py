@@ -1,485 +1,92 @@
 
 
-from flask import Flask, render_template_string, request, redirect, url_for, send_file, session, flash
+from flask import Flask, current_app, render_template, request, redirect, url_for, send_file, session, flash, g, jsonify
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import os
 import io
-from zipfile import ZipFile
+import time
 import logging
 import shutil
 
 # Import custom modules (Ensure these modules are correctly implemented in your project)
-from utils.groq_integration import GroqClient
+from utils.groq_integration import MISSING_KEY_MESSAGE
+from utils.llm_backends import build_balancer
+from utils.scheduler import scheduling, scheduler_stats, INTERACTIVE
+from utils.run_journal import start_run, interrupted_runs
 from utils.file_processing import extract_all_text
-from utils.pdf_generation_reportlab import generate_individual_pdf_report, generate_compiled_pdf_report
-from tools.compliance_checks import check_assessment_compliance, check_module_compliance
-from tools.grammar_check import grammar_check
-from tools.reference_check import reference_check
-from tools.critical_writing_check import critical_writing_check
+from utils.analysis import (
+    tool_selection, course_context, plan_tasks, run_checkpointed, resume_job, save_outcomes, start_draining,
+    reports_by_assignment, requested_report, DOWNLOAD_GROUPS, download_tools, report_files, zip_reports,
+)
+from utils.report_store import job_reports, STATUS_OK
+from utils.cohort_analytics import cohort_key, cohort_analytics, submitter_view
+from utils.similarity import index_submissions, similarity_report
+from utils.cli import resume_command
+from utils.http_cache import jinja_options, prerender, static_response, encode_body, record_response, page_stats
+from utils.model_router import route_stats
+from utils.single_flight import flight_stats
+from utils.ocr import ocr_stats
 
 # Load environment variables from a .env file
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.urandom(24)  # In production, use a fixed secret key.
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB upload limit
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize GroqClient
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise EnvironmentError("🛑 GROQ_API_KEY not found. Please set it in the environment variables.")
-groq_client = GroqClient(api_key=GROQ_API_KEY)
+MAX_SESSION_JOBS = 50  # Published jobs remembered per session for the cohort routes
 
-# HTML Templates as normal triple-quoted strings (no f-strings)
-base_header = """
-<header>
-    <nav style="background-color: #f8f9fa; padding: 10px;">
-        <a href="{{ url_for('home') }}" style="margin-right: 15px;">Home</a>
-        <a href="{{ url_for('tutorial') }}" style="margin-right: 15px;">Tutorial</a>
-        <a href="{{ url_for('reports') }}">Reports</a>
-    </nav>
-</header>
-<hr>
-"""
+def render_static(template_name):
+    app = current_app
+    static_pages = app.extensions['static_pages']
+    page = static_pages.get(template_name)
+    if page is None:
+        template_paths = [os.path.join(app.root_path, app.template_folder, name) for name in (template_name, '_header.html')]
+        page = static_pages[template_name] = prerender(render_template(template_name), template_paths)
+    g.raw_bytes = len(page.body)
+    status, body, headers = static_response(page, request.headers)
+    return app.response_class(body, status=status, headers=headers)
 
-home_template = """
-<!doctype html>
-<html lang="en">
-  <head>
-    <title>Academic QA Assistant 📚</title>
-    <style>
-      body { font-family: Arial, sans-serif; margin: 40px; }
-      .container { max-width: 800px; margin: auto; }
-      .error { color: red; }
-      .success { color: green; }
-      .section { margin-bottom: 30px; }
-      .button { padding: 10px 20px; background-color: green; color: white; border: none; cursor: pointer; }
-      .button:hover { background-color: darkgreen; }
-      a { text-decoration: none; color: #007bff; }
-      a:hover { text-decoration: underline; }
-      .file-list { list-style-type: none; padding: 0; }
-      .file-list li { margin-bottom: 5px; }
-      .checkbox-group { margin-left: 20px; }
-    </style>
-  </head>
-  <body>
-    """ + base_header + """
-    <div class="container">
-      <h1>Academic QA Assistant 📚</h1>
-      <h3>Automate Quality Assurance for Academic Assignments with AI 🧠</h3>
-      <hr>
-      
-      {% with messages = get_flashed_messages(with_categories=true) %}
-        {% if messages %}
-          {% for category, message in messages %}
-            <p class="{{ category }}">{{ message }}</p>
-          {% endfor %}
-        {% endif %}
-      {% endwith %}
-      
-      <div class="section">
-        <h2>📁 Upload Your Documents</h2>
-        <form method="POST" action="{{ url_for('process_files') }}" enctype="multipart/form-data">
-          <label>📄 Upload Student's Assignment (Max 5MB):</label><br>
-          <input type="file" name="assignment_file" accept=".pdf,.docx,.pptx" required>
-          {% if session.get('assignment_filename') %}
-            <p>Selected file: <strong>{{ session['assignment_filename'] }}</strong></p>
-          {% endif %}
-          <br><br>
-          
-          <label>📜 Upload Assessment Brief (Max 5MB):</label><br>
-          <input type="file" name="assessment_brief_file" accept=".pdf,.docx,.pptx" required>
-          {% if session.get('assessment_brief_filename') %}
-            <p>Selected file: <strong>{{ session['assessment_brief_filename'] }}</strong></p>
-          {% endif %}
-          <br><br>
-          
-          <label>📚 Upload Module Materials:</label><br>
-          <input type="file" name="module_material_files" accept=".pdf,.docx,.pptx" multiple required>
-          {% if session.get('module_material_filenames') %}
-            <ul>
-              {% for filename in session['module_material_filenames'] %}
-                <li><strong>{{ filename }}</strong></li>
-              {% endfor %}
-            </ul>
-          {% endif %}
-          <br><br>
-          
-          <button type="submit" class="button">✅ Process Files</button>
-        </form>
-        
-        {% if session.get('files_processed') %}
-          <h3>Uploaded Files:</h3>
-          <ul class="file-list">
-            <li><strong>Assignment:</strong> {{ session['assignment_filename'] }}</li>
-            <li><strong>Assessment Brief:</strong> {{ session['assessment_brief_filename'] }}</li>
-            <li><strong>Module Materials:</strong>
-              <ul>
-                {% for filename in session['module_material_filenames'] %}
-                  <li>{{ filename }}</li>
-                {% endfor %}
-              </ul>
-            </li>
-          </ul>
-        {% endif %}
-      </div>
-      
-      {% if session.get('files_processed') %}
-      <div class="section">
-        <h2>🛠️ Select Analysis Tools</h2>
-        <form method="POST" action="{{ url_for('analyze_tools') }}">
-          <h3>Select the tools you want to use:</h3>
-          <input type="checkbox" name="compliance_check" id="compliance_check" onchange="toggleComplianceOptions()">
-          <label for="compliance_check">Compliance Check</label><br>
-          
-          <div id="compliance_options" class="checkbox-group" style="display:none;">
-            <input type="checkbox" name="assessment_brief_compliance" id="assessment_brief_compliance">
-            <label for="assessment_brief_compliance">Assessment Brief Compliance</label><br>
-            
-            <input type="checkbox" name="module_materials_compliance" id="module_materials_compliance">
-            <label for="module_materials_compliance">Module Materials Compliance</label><br>
-          </div>
-          
-          <input type="checkbox" name="grammar_check" id="grammar_check">
-          <label for="grammar_check">Grammar Check</label><br>
-          
-          <input type="checkbox" name="critical_writing_check" id="critical_writing_check">
-          <label for="critical_writing_check">Critical Writing Check</label><br>
-          
-          <input type="checkbox" name="reference_check" id="reference_check" onclick="toggleReferenceStyle()">
-          <label for="reference_check">Reference Check</label><br><br>
-          
-          <div id="reference_style_div" style="display:none;">
-            <label for="reference_style">Select the Reference Style:</label><br>
-            <select name="reference_style" id="reference_style">
-              <option value="APA">APA</option>
-              <option value="Harvard">Harvard</option>
-              <option value="IEEE">IEEE</option>
-              <option value="Chicago">Chicago</option>
-              <option value="MLA">MLA</option>
-            </select><br><br>
-          </div>
-          
-          <button type="submit" class="button">🔍 Analyze Selected Tools</button>
-        </form>
-      </div>
-      {% endif %}
-      
-      {% if session.get('analysis_completed') %}
-      <div class="section">
-        <h2>📥 Download Reports</h2>
-        <p>You can view and download your generated reports on the <a href="{{ url_for('reports') }}">Reports</a> page.</p>
-      </div>
-      {% endif %}
-      
-    </div>
-    
-    <script>
-      function toggleReferenceStyle() {
-        var checkBox = document.getElementById("reference_check");
-        var text = document.getElementById("reference_style_div");
-        if (checkBox.checked == true){
-          text.style.display = "block";
-        } else {
-          text.style.display = "none";
-        }
-      }
-      
-      function toggleComplianceOptions() {
-        var checkBox = document.getElementById("compliance_check");
-        var options = document.getElementById("compliance_options");
-        if (checkBox.checked == true){
-          options.style.display = "block";
-        } else {
-          options.style.display = "none";
-        }
-      }
-    </script>
-  </body>
-</html>
-"""
-
-tutorial_template = """
-<!doctype html>
-<html lang="en">
-  <head>
-    <title>Tutorial - Academic QA Assistant 📚</title>
-    <style>
-      body { font-family: Arial, sans-serif; margin: 40px; }
-      .container { max-width: 800px; margin: auto; }
-      a { text-decoration: none; color: #007bff; }
-      a:hover { text-decoration: underline; }
-    </style>
-  </head>
-  <body>
-    """ + base_header + """
-    <div class="container">
-      <h1>Tutorial 📖</h1>
-      <hr>
-      <h2>Getting Started</h2>
-      <p>Welcome to the Academic QA Assistant! This tutorial will guide you through the steps to effectively use the application.</p>
-      
-      <h3>Step 1: Upload Your Documents</h3>
-      <p>Begin by uploading the necessary documents:</p>
-      <ul>
-        <li><strong>Student's Assignment:</strong> Upload the assignment file you want to analyze.</li>
-        <li><strong>Assessment Brief:</strong> Upload the assessment brief to check compliance.</li>
-        <li><strong>Module Materials:</strong> Upload all relevant module materials.</li>
-      </ul>
-      
-      <h3>Step 2: Process Files</h3>
-      <p>After uploading, click "Process Files" to extract and store the content for analysis.</p>
-      
-      <h3>Step 3: Select Analysis Tools</h3>
-      <p>Choose the analysis tools you want to apply to your assignment:</p>
-      <ul>
-        <li><strong>Compliance Check:</strong> Ensure the assignment adheres to the assessment brief and module materials.</li>
-        <li><strong>Grammar Check:</strong> Analyze grammar and language usage.</li>
-        <li><strong>Critical Writing Check:</strong> Evaluate the critical thinking and writing quality.</li>
-        <li><strong>Reference Check:</strong> Verify the references against the selected style (e.g., APA, Harvard).</li>
-      </ul>
-      
-      <h3>Step 4: Analyze and Download Reports</h3>
-      <p>After selecting the tools, click "Analyze Selected Tools" to perform the analysis. Once completed, you can view and download the reports on the Reports page.</p>
-      
-      <h2>Additional Tips</h2>
-      <ul>
-        <li>Ensure all uploaded files are within the size limits (Max 5MB each).</li>
-        <li>Use consistent reference styles across all documents.</li>
-        <li>Review the reports thoroughly to understand the feedback.</li>
-      </ul>
-      
-      <p>For more assistance, feel free to reach out to our support team.</p>
-    </div>
-  </body>
-</html>
-"""
+def start_timer():
+    g.request_started = time.perf_counter()
 
-reports_template = """
-<!doctype html>
-<html lang="en">
-  <head>
-    <title>Reports - Academic QA Assistant 📚</title>
-    <style>
-      body {
-        font-family: Arial, sans-serif; 
-        margin: 40px;
-      }
-      .container {
-        max-width: 800px; 
-        margin: auto;
-      }
-      .section {
-        margin-bottom: 30px;
-      }
-      .button {
-        padding: 10px 20px; 
-        background-color: green; 
-        color: white; 
-        border: none; 
-        cursor: pointer;
-        margin-bottom: 10px;
-      }
-      .button:hover {
-        background-color: darkgreen;
-      }
-      a {
-        text-decoration: none; 
-        color: #007bff;
-      }
-      a:hover {
-        text-decoration: underline;
-      }
-      .file-list {
-        list-style-type: none; 
-        padding: 0;
-      }
-      .file-list li {
-        margin-bottom: 5px;
-      }
-      .choice-title {
-        font-weight: bold;
-        margin-bottom: 10px;
-      }
-      .report-section {
-        border: 1px solid #ddd; 
-        padding: 15px; 
-        margin-bottom: 20px; 
-        border-radius: 5px;
-      }
-      .report-section h3 {
-        margin-top: 0;
-      }
-      .report-link {
-        display: block; 
-        margin-bottom: 8px; 
-        color: #000;
-      }
-      .report-link:hover {
-        text-decoration: underline;
-      }
-      .no-reports {
-        color: #666;
-        font-style: italic;
-      }
-    </style>
-  </head>
-  <body>
-    """ + base_header + """
-    <div class="container">
-      <h1>📥 Download Reports</h1>
-      <p>Below are your reports based on the tools you selected:</p>
-      
-      {% if analysis_completed %}
-        {% set selected_tools = selected_tools %}
-        
-        {% set compliance_selected = selected_tools.get('compliance_checks', []) %}
-        {% set grammar_selected = selected_tools.get('grammar_check', False) %}
-        {% set critical_selected = selected_tools.get('critical_writing_check', False) %}
-        {% set reference_selected = selected_tools.get('reference_check', False) %}
-        
-        {% set assignments = assignments %}
-        
-        {% if assignments %}
-          {% for assignment in assignments %}
-            <div class="report-section">
-              <h3>Assignment: {{ assignment }}</h3>
-              
-              {% set have_reports = False %}
-              
-              {% if compliance_selected %}
-                {% set compliance_reports = compliance_reports.get(assignment, {}) %}
-                {% if compliance_reports %}
-                  <h4>Compliance Reports</h4>
-                  {% for report_title, pdf_filename in compliance_reports.items() %}
-                    <a class="report-link" href="{{ url_for('view_report', assignment=assignment, report=report_title.replace(' ', '_')) }}" target="_blank">
-                      View {{ report_title }}
-                    </a>
-                    {% set have_reports = True %}
-                  {% endfor %}
-                {% endif %}
-              {% endif %}
-              
-              {% if grammar_selected %}
-                {% set grammar_report = grammar_reports.get(assignment, None) %}
-                {% if grammar_report %}
-                  <h4>Grammar Check</h4>
-                  <a class="report-link" href="{{ url_for('view_report', assignment=assignment, report='Grammar_Check') }}" target="_blank">
-                    View Grammar Check
-                  </a>
-                  {% set have_reports = True %}
-                {% endif %}
-              {% endif %}
-              
-              {% if critical_selected %}
-                {% set critical_report = critical_writing_reports.get(assignment, None) %}
-                {% if critical_report %}
-                  <h4>Critical Writing Check</h4>
-                  <a class="report-link" href="{{ url_for('view_report', assignment=assignment, report='Critical_Writing_Check') }}" target="_blank">
-                    View Critical Writing Check
-                  </a>
-                  {% set have_reports = True %}
-                {% endif %}
-              {% endif %}
-              
-              {% if reference_selected %}
-                {% set reference_report = reference_reports.get(assignment, None) %}
-                {% if reference_report %}
-                  <h4>Reference Check</h4>
-                  <a class="report-link" href="{{ url_for('view_report', assignment=assignment, report='Reference_Check') }}" target="_blank">
-                    View Reference Check
-                  </a>
-                  {% set have_reports = True %}
-                {% endif %}
-              {% endif %}
-              
-              {% if not have_reports %}
-                <p class="no-reports">No reports available for this assignment.</p>
-              {% endif %}
-            </div>
-          {% endfor %}
-          
-          <h2>Download Your Reports</h2>
-          <p>Select one or more download options to receive your reports as ZIP files.</p>
-          <form method="POST" action="{{ url_for('download_reports') }}">
-            {% if compliance_selected %}
-              <button type="submit" name="download_tool" value="compliance" class="button">
-                Download Compliance Reports
-              </button><br>
-            {% endif %}
-            
-            {% if grammar_selected %}
-              <button type="submit" name="download_tool" value="grammar" class="button">
-                Download Grammar Reports
-              </button><br>
-            {% endif %}
-            
-            {% if critical_selected %}
-              <button type="submit" name="download_tool" value="critical_writing" class="button">
-                Download Critical Writing Reports
-              </button><br>
-            {% endif %}
-            
-            {% if reference_selected %}
-              <button type="submit" name="download_tool" value="reference" class="button">
-                Download Reference Reports
-              </button><br>
-            {% endif %}
-            
-            {% if (compliance_selected or grammar_selected or critical_selected or reference_selected) %}
-              <button type="submit" name="download_tool" value="all" class="button" style="background-color: #007bff;">
-                Download All Reports
-              </button>
-            {% endif %}
-          </form>
-        {% else %}
-          <p class="no-reports">No assignments found to generate reports for.</p>
-        {% endif %}
-      
-      {% else %}
-        <p class="no-reports">No reports have been generated yet. Please <a href="{{ url_for('home') }}">go back</a> and run the analysis first.</p>
-      {% endif %}
-      
-    </div>
-  </body>
-</html>
-"""
+def compress_and_measure(response):
+    # Dynamic HTML is compressed per request; prerendered pages arrive already encoded
+    raw_bytes = g.pop('raw_bytes', None)
+    if (response.mimetype == 'text/html' and response.status_code == 200
+            and not response.direct_passthrough and 'Content-Encoding' not in response.headers):
+        body = response.get_data()
+        raw_bytes = len(body)
+        encoded, encoding = encode_body(body, request.headers.get('Accept-Encoding'))
+        if encoding:
+            response.set_data(encoded)
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    if 'request_started' in g:
+        wire_bytes = response.content_length or 0
+        record_response(request.endpoint, g.request_started, raw_bytes if raw_bytes is not None else wire_bytes, wire_bytes)
+    return response
 
-@app.route('/', methods=['GET'])
 def home():
-    return render_template_string(home_template)
+    return render_template('home.html')
 
-@app.route('/tutorial', methods=['GET'])
 def tutorial():
-    return render_template_string(tutorial_template)
+    return render_static('tutorial.html')
 
-@app.route('/reports', methods=['GET'])
 def reports():
-    # Fetch necessary data from session
-    analysis_completed = session.get('analysis_completed', False)
-    selected_tools = session.get('selected_tools', {})
-    compliance_reports = session.get('compliance_reports', {})
-    grammar_reports = session.get('grammar_reports', {})
-    critical_writing_reports = session.get('critical_writing_reports', {})
-    reference_reports = session.get('reference_reports', {})
-    assignments = session.get('assignments_text', {}).keys()
+    # Reports of the user's latest analysis job come from the report repository
+    user_id = session.get('user_id')
+    job_id = session.get('job_id')
+    records = job_reports(job_id, user_id=user_id) if user_id and job_id else []
     
-    return render_template_string(reports_template,
-                                  analysis_completed=analysis_completed,
-                                  selected_tools=selected_tools,
-                                  compliance_reports=compliance_reports,
-                                  grammar_reports=grammar_reports,
-                                  critical_writing_reports=critical_writing_reports,
-                                  reference_reports=reference_reports,
-                                  assignments=assignments)
+    return render_template('reports.html',
+                           analysis_completed=session.get('analysis_completed', False),
+                           selected_tools=session.get('selected_tools', {}),
+                           reports_by_assignment=reports_by_assignment(records),
+                           assignments=session.get('assignments_text', {}).keys(),
+                           cohort_id=session.get('cohort_id'))
 
-@app.route('/process_files', methods=['POST'])
 def process_files():
     try:
         assignment_file = request.files.get('assignment_file')
@@ -547,12 +154,10 @@ def process_files():
         session['module_material_filenames'] = module_material_filenames
         
         # Clear previous reports data if any
-        session.pop('compliance_reports', None)
-        session.pop('grammar_reports', None)
-        session.pop('reference_reports', None)
-        session.pop('critical_writing_reports', None)
+        session.pop('job_id', None)
         session.pop('analysis_completed', None)
         session.pop('selected_tools', None)
+        session.pop('cohort_id', None)
         
         # Remove any existing reports directory and recreate it
         if os.path.exists(reports_folder):
@@ -582,39 +187,13 @@ def process_files():
         flash(f"🛑 An error occurred while processing files: {e}", "error")
         return redirect(url_for('home'))
 
-@app.route('/analyze_tools', methods=['POST'])
 def analyze_tools():
     try:
-        compliance_check = 'compliance_check' in request.form
-        assessment_brief_compliance = 'assessment_brief_compliance' in request.form
-        module_materials_compliance = 'module_materials_compliance' in request.form
-        grammar_check_option = 'grammar_check' in request.form
-        critical_writing_check_option = 'critical_writing_check' in request.form
-        reference_check_option = 'reference_check' in request.form
-        reference_style = request.form.get('reference_style') if reference_check_option else None
-        
-        selected_compliance_checks = []
-        if compliance_check:
-            if assessment_brief_compliance:
-                selected_compliance_checks.append('assessment_brief')
-            if module_materials_compliance:
-                selected_compliance_checks.append('module_materials')
-            if not selected_compliance_checks:
-                flash("🛑 Please select at least one compliance check option.", "error")
-                return redirect(url_for('home'))
-        
-        if not any([compliance_check, grammar_check_option, critical_writing_check_option, reference_check_option]):
-            flash("🛑 Please select at least one tool to analyze.", "error")
+        selected_tools, error = tool_selection(request.form)
+        if error:
+            flash(error, "error")
             return redirect(url_for('home'))
         
-        selected_tools = {
-            'compliance_checks': selected_compliance_checks,
-            'grammar_check': grammar_check_option,
-            'critical_writing_check': critical_writing_check_option,
-            'reference_check': reference_check_option,
-            'reference_style': reference_style
-        }
-        
         session['selected_tools'] = selected_tools
         
         assignments_text = session.get('assignments_text', {})
@@ -632,149 +211,39 @@ def analyze_tools():
         os.makedirs(reports_folder, exist_ok=True)
         
         # Clear previous reports data before generating new reports
-        session.pop('compliance_reports', None)
-        session.pop('grammar_reports', None)
-        session.pop('reference_reports', None)
-        session.pop('critical_writing_reports', None)
-        
-        compliance_reports = {}
-        grammar_reports = {}
-        reference_reports = {}
-        critical_writing_reports = {}
+        session.pop('job_id', None)
         
         total = len(assignments_text)
         if total == 0:
             flash("🛑 No assignments found for analysis.", "error")
             return redirect(url_for('home'))
         
-        for assignment_name, assignment_text in assignments_text.items():
-            compliance_reports[assignment_name] = {}
-        
-            if selected_tools['compliance_checks']:
-                if 'assessment_brief' in selected_tools['compliance_checks']:
-                    try:
-                        # Assuming the first assessment brief corresponds to the assignment
-                        assessment_brief_text = next(iter(assessment_briefs_text.values()))
-                        response = check_assessment_compliance(groq_client, assignment_text, assessment_brief_text)
-                        compliance_reports[assignment_name]['Assessment Brief Compliance'] = response
-                        
-                        # Save compliance report as a file
-                        report_content = response
-                        report_title = "Assessment Brief Compliance"
-                        pdf_bytes = generate_individual_pdf_report(report_title, report_content)
-                        pdf_filename = f"{assignment_name}_Assessment_Brief_Compliance.pdf"
-                        pdf_path = os.path.join(reports_folder, pdf_filename)
-                        with open(pdf_path, 'wb') as f:
-                            f.write(pdf_bytes)
-                        
-                        compliance_reports[assignment_name][report_title] = pdf_filename
-                        
-                    except Exception as e:
-                        error_message = f"🛑 Error: {e}"
-                        compliance_reports[assignment_name]['Assessment Brief Compliance'] = error_message
-                        logger.error(f"Error in Assessment Brief Compliance for {assignment_name}: {e}")
-        
-                if 'module_materials' in selected_tools['compliance_checks']:
-                    try:
-                        # Combine all module materials texts for compliance check
-                        combined_module_text = "\n".join(module_materials_text.values())
-                        response = check_module_compliance(groq_client, assignment_text, combined_module_text)
-                        compliance_reports[assignment_name]['Module Materials Compliance'] = response
-                        
-                        # Save compliance report as a file
-                        report_content = response
-                        report_title = "Module Materials Compliance"
-                        pdf_bytes = generate_individual_pdf_report(report_title, report_content)
-                        pdf_filename = f"{assignment_name}_Module_Materials_Compliance.pdf"
-                        pdf_path = os.path.join(reports_folder, pdf_filename)
-                        with open(pdf_path, 'wb') as f:
-                            f.write(pdf_bytes)
-                        
-                        compliance_reports[assignment_name][report_title] = pdf_filename
-                        
-                    except Exception as e:
-                        error_message = f"🛑 Error: {e}"
-                        compliance_reports[assignment_name]['Module Materials Compliance'] = error_message
-                        logger.error(f"Error in Module Materials Compliance for {assignment_name}: {e}")
-        
-            if selected_tools['grammar_check']:
-                try:
-                    response = grammar_check(groq_client, assignment_text)
-                    grammar_reports[assignment_name] = response
-                    
-                    # Save grammar report as a file
-                    report_title = "Grammar_Check"
-                    pdf_bytes = generate_individual_pdf_report(report_title, response)
-                    pdf_filename = f"{assignment_name}_Grammar_Check.pdf"
-                    pdf_path = os.path.join(reports_folder, pdf_filename)
-                    with open(pdf_path, 'wb') as f:
-                        f.write(pdf_bytes)
-                    
-                    grammar_reports[assignment_name] = pdf_filename
-                    
-                except Exception as e:
-                    error_message = f"🛑 Error: {e}"
-                    grammar_reports[assignment_name] = error_message
-                    logger.error(f"Error in Grammar Check for {assignment_name}: {e}")
-        
-            if selected_tools['critical_writing_check']:
-                try:
-                    response = critical_writing_check(groq_client, assignment_text)
-                    critical_writing_reports[assignment_name] = response
-                    
-                    # Save critical writing report as a file
-                    report_title = "Critical_Writing_Check"
-                    pdf_bytes = generate_individual_pdf_report(report_title, response)
-                    pdf_filename = f"{assignment_name}_Critical_Writing_Check.pdf"
-                    pdf_path = os.path.join(reports_folder, pdf_filename)
-                    with open(pdf_path, 'wb') as f:
-                        f.write(pdf_bytes)
-                    
-                    critical_writing_reports[assignment_name] = pdf_filename
-                    
-                except Exception as e:
-                    error_message = f"🛑 Error: {e}"
-                    critical_writing_reports[assignment_name] = error_message
-                    logger.error(f"Error in Critical Writing Check for {assignment_name}: {e}")
-        
-            if selected_tools['reference_check']:
-                if not selected_tools['reference_style']:
-                    reference_reports[assignment_name] = "🛑 No reference style provided."
-                    logger.warning(f"No reference style provided for Reference Check in {assignment_name}.")
-                else:
-                    try:
-                        # Combine all module materials texts for reference check
-                        combined_module_text = "\n".join(module_materials_text.values())
-                        response = reference_check(
-                            groq_client,
-                            assignment_text,
-                            combined_module_text,
-                            reference_style=selected_tools['reference_style']
-                        )
-                        reference_reports[assignment_name] = response
-                        
-                        # Save reference report as a file
-                        report_title = "Reference_Check"
-                        pdf_bytes = generate_individual_pdf_report(report_title, response)
-                        pdf_filename = f"{assignment_name}_Reference_Check.pdf"
-                        pdf_path = os.path.join(reports_folder, pdf_filename)
-                        with open(pdf_path, 'wb') as f:
-                            f.write(pdf_bytes)
-                        
-                        reference_reports[assignment_name] = pdf_filename
-                        
-                    except Exception as e:
-                        error_message = f"🛑 Error: {e}"
-                        reference_reports[assignment_name] = error_message
-                        logger.error(f"Error in Reference Check for {assignment_name}: {e}")
-        
-        # Update session with generated report filenames
-        session['compliance_reports'] = compliance_reports
-        session['grammar_reports'] = grammar_reports
-        session['reference_reports'] = reference_reports
-        session['critical_writing_reports'] = critical_writing_reports
-        session['analysis_completed'] = True
-        
+        groq_client = current_app.extensions['groq_client']
+        job_id = os.urandom(8).hex()
+        cohort_id = cohort_key(assessment_briefs_text, job_id)
+        
+        # An upload being analysed is interactive work: its LLM calls and PDF renders go ahead
+        # of batch and speculative work, and share slots fairly with other users
+        with scheduling(INTERACTIVE, user_id):
+            # Course-level digests are built once per brief/module pack and reused for every student
+            brief_checklist, module_concepts = course_context(
+                groq_client, selected_tools, assessment_briefs_text, module_materials_text, upload_folder
+            )
+            # Grammar drafts and scores are kept per submitter (this browser session, which keeps
+            # its id across uploads) within the cohort, never across students sharing a filename
+            submitter_id = session.setdefault('submitter_id', os.urandom(8).hex())
+            draft_scope = (cohort_id, submitter_id)
+            tasks = plan_tasks(
+                assignments_text, selected_tools, assessment_briefs_text, module_materials_text,
+                brief_checklist, module_concepts, draft_scope
+            )
+            # The plan and every finished task are journaled, so /resume can finish the job if this worker dies
+            start_run(job_id, user_id, cohort_id, reports_folder, selected_tools, assignments_text, tasks, submitter_id)
+            outcomes = [run_checkpointed(groq_client, job_id, task, reports_folder) for task in tasks]
+        
+        # Record the job's reports; the session only keeps the job id
+        queued = save_outcomes(user_id, job_id, assignments_text, selected_tools, outcomes, cohort_id, submitter_id)
+        publish_job(groq_client, user_id, job_id, cohort_id, assignments_text, queued)
         flash("✅ Analysis completed and reports generated!", "success")
         return redirect(url_for('reports'))
     
@@ -783,7 +252,55 @@ def analyze_tools():
         flash(f"🛑 An error occurred during analysis: {e}", "error")
         return redirect(url_for('home'))
 
-@app.route('/download_reports', methods=['POST'])
+def index_job(user_id, job_id, cohort_id, assignments_text):
+    # Each submission is checked against the rest of the cohort through the LSH index
+    try:
+        return index_submissions(cohort_id, user_id, job_id, assignments_text)
+    except Exception as e:
+        logger.error(f"Error indexing submissions for similarity: {e}")
+        return 0
+
+def publish_job(groq_client, user_id, job_id, cohort_id, assignments_text, queued):
+    # Points the session at a job whose outcomes are recorded and flashes what needs attention
+    session['job_id'] = job_id
+    session['cohort_id'] = cohort_id
+    session['analysis_completed'] = True
+    session['published_jobs'] = (session.get('published_jobs', []) + [[cohort_id, job_id]])[-MAX_SESSION_JOBS:]
+    # Submissions are indexed per submitter, which stays the same across this session's uploads
+    similar = index_job(session.get('submitter_id', user_id), job_id, cohort_id, assignments_text)
+    if similar:
+        flash(f"⚠️ Found {similar} submission pair(s) with highly similar text in this cohort.", "warning")
+    
+    # Degraded mode: the LLM circuit was open, so some reports wait in the deferred queue
+    if queued:
+        start_draining(groq_client)
+        flash(f"⏳ The AI service is unavailable: {queued} report(s) were queued and will be completed automatically.", "warning")
+
+def resume():
+    # Finishes the user's latest analysis that a crashed or restarted worker left unfinished;
+    # tasks the journal has finished are not run (or paid for) again
+    user_id = session.get('user_id')
+    if not user_id:
+        flash("🛑 Session expired or invalid. Please upload the files again.", "error")
+        return redirect(url_for('home'))
+    try:
+        groq_client = current_app.extensions['groq_client']
+        job_ids = interrupted_runs(user_id)
+        result = resume_job(groq_client, job_ids[-1], INTERACTIVE) if job_ids else None
+        if result is None:
+            flash("🛑 No interrupted analysis to resume.", "error")
+            return redirect(url_for('home'))
+        run, queued = result
+        session['selected_tools'] = run.selected_tools
+        session['assignments_text'] = run.assignments_text
+        publish_job(groq_client, user_id, run.job_id, run.cohort_id, run.assignments_text, queued)
+        flash(f"✅ Analysis resumed: {len(run.tasks) - run.finished} unfinished report(s) completed.", "success")
+        return redirect(url_for('reports'))
+    except Exception as e:
+        logger.error(f"Error in resume: {e}")
+        flash(f"🛑 An error occurred while resuming the analysis: {e}", "error")
+        return redirect(url_for('home'))
+
 def download_reports():
     try:
         download_tool = request.values.get('download_tool')
@@ -798,127 +315,35 @@ def download_reports():
             flash("🛑 Session expired or invalid. Please upload the files again.", "error")
             return redirect(url_for('home'))
         
-        upload_folder = os.path.join('uploads', secure_filename(user_id))
-        reports_folder = os.path.join(upload_folder, 'reports')
-        
-        if not os.path.exists(reports_folder):
-            flash("🛑 Reports folder does not exist.", "error")
+        job_id = session.get('job_id')
+        if not job_id or not assignments:
+            flash("🛑 No reports available for download.", "error")
             return redirect(url_for('reports'))
         
-        if not assignments:
-            flash("🛑 No reports available for download.", "error")
+        if download_tool != 'all' and download_tool not in DOWNLOAD_GROUPS:
+            flash("🛑 Invalid download option selected.", "error")
+            logger.warning(f"Invalid download option selected: {download_tool}")
             return redirect(url_for('reports'))
         
-        # Initialize a buffer for the ZIP file
-        zip_buffer = io.BytesIO()
-        with ZipFile(zip_buffer, 'w') as zip_file:
+        records = job_reports(job_id, user_id=user_id, tools=download_tools(download_tool))
+        zip_bytes, missing = zip_reports(report_files(records, download_tool))
+        for pdf_filename, label in missing:
+            flash(f"🛑 {label} report file not found: {pdf_filename}", "error")
+        
+        if zip_bytes is None:
             if download_tool == 'all':
-                for assignment_name in assignments.keys():
-                    # Compliance Reports
-                    compliance_reports = session.get('compliance_reports', {}).get(assignment_name, {})
-                    for report_title, pdf_filename in compliance_reports.items():
-                        if isinstance(pdf_filename, str) and pdf_filename.endswith('.pdf'):
-                            pdf_path = os.path.join(reports_folder, pdf_filename)
-                            if os.path.exists(pdf_path):
-                                # Organize inside assignment folders
-                                zip_file.write(pdf_path, arcname=f"{assignment_name}/Compliance/{pdf_filename}")
-                            else:
-                                flash(f"🛑 Compliance report file not found: {pdf_filename}", "error")
-                                logger.error(f"Compliance report file not found: {pdf_filename}")
-                    
-                    # Grammar Reports
-                    grammar_report = session.get('grammar_reports', {}).get(assignment_name, None)
-                    if isinstance(grammar_report, str) and grammar_report.endswith('.pdf'):
-                        pdf_path = os.path.join(reports_folder, grammar_report)
-                        if os.path.exists(pdf_path):
-                            zip_file.write(pdf_path, arcname=f"{assignment_name}/Grammar/{grammar_report}")
-                        else:
-                            flash(f"🛑 Grammar report file not found: {grammar_report}", "error")
-                            logger.error(f"Grammar report file not found: {grammar_report}")
-                    
-                    # Critical Writing Reports
-                    critical_report = session.get('critical_writing_reports', {}).get(assignment_name, None)
-                    if isinstance(critical_report, str) and critical_report.endswith('.pdf'):
-                        pdf_path = os.path.join(reports_folder, critical_report)
-                        if os.path.exists(pdf_path):
-                            zip_file.write(pdf_path, arcname=f"{assignment_name}/Critical_Writing/{critical_report}")
-                        else:
-                            flash(f"🛑 Critical Writing report file not found: {critical_report}", "error")
-                            logger.error(f"Critical Writing report file not found: {critical_report}")
-                    
-                    # Reference Reports
-                    reference_report = session.get('reference_reports', {}).get(assignment_name, None)
-                    if isinstance(reference_report, str) and reference_report.endswith('.pdf'):
-                        pdf_path = os.path.join(reports_folder, reference_report)
-                        if os.path.exists(pdf_path):
-                            zip_file.write(pdf_path, arcname=f"{assignment_name}/Reference/{reference_report}")
-                        else:
-                            flash(f"🛑 Reference report file not found: {reference_report}", "error")
-                            logger.error(f"Reference report file not found: {reference_report}")
-            
+                flash("🛑 No reports available to compile.", "error")
             else:
-                for assignment_name in assignments.keys():
-                    if download_tool == 'compliance':
-                        compliance_reports = session.get('compliance_reports', {}).get(assignment_name, {})
-                        for report_title, pdf_filename in compliance_reports.items():
-                            if isinstance(pdf_filename, str) and pdf_filename.endswith('.pdf'):
-                                pdf_path = os.path.join(reports_folder, pdf_filename)
-                                if os.path.exists(pdf_path):
-                                    zip_file.write(pdf_path, arcname=pdf_filename)
-                                else:
-                                    flash(f"🛑 Compliance report file not found: {pdf_filename}", "error")
-                                    logger.error(f"Compliance report file not found: {pdf_filename}")
-                    
-                    elif download_tool == 'grammar':
-                        grammar_report = session.get('grammar_reports', {}).get(assignment_name, None)
-                        if isinstance(grammar_report, str) and grammar_report.endswith('.pdf'):
-                            pdf_path = os.path.join(reports_folder, grammar_report)
-                            if os.path.exists(pdf_path):
-                                zip_file.write(pdf_path, arcname=grammar_report)
-                            else:
-                                flash(f"🛑 Grammar report file not found: {grammar_report}", "error")
-                                logger.error(f"Grammar report file not found: {grammar_report}")
-                    
-                    elif download_tool == 'critical_writing':
-                        critical_report = session.get('critical_writing_reports', {}).get(assignment_name, None)
-                        if isinstance(critical_report, str) and critical_report.endswith('.pdf'):
-                            pdf_path = os.path.join(reports_folder, critical_report)
-                            if os.path.exists(pdf_path):
-                                zip_file.write(pdf_path, arcname=critical_report)
-                            else:
-                                flash(f"🛑 Critical Writing report file not found: {critical_report}", "error")
-                                logger.error(f"Critical Writing report file not found: {critical_report}")
-                    
-                    elif download_tool == 'reference':
-                        reference_report = session.get('reference_reports', {}).get(assignment_name, None)
-                        if isinstance(reference_report, str) and reference_report.endswith('.pdf'):
-                            pdf_path = os.path.join(reports_folder, reference_report)
-                            if os.path.exists(pdf_path):
-                                zip_file.write(pdf_path, arcname=reference_report)
-                            else:
-                                flash(f"🛑 Reference report file not found: {reference_report}", "error")
-                                logger.error(f"Reference report file not found: {reference_report}")
-                    else:
-                        flash("🛑 Invalid download option selected.", "error")
-                        logger.warning(f"Invalid download option selected: {download_tool}")
-        
-        if download_tool != 'all' and zip_buffer.tell() == 0:
-            flash("🛑 No reports available for the selected tool.", "error")
-            return redirect(url_for('reports'))
-        
-        if download_tool == 'all' and zip_buffer.tell() == 0:
-            flash("🛑 No reports available to compile.", "error")
+                flash("🛑 No reports available for the selected tool.", "error")
             return redirect(url_for('reports'))
         
-        zip_buffer.seek(0)
-        
         if download_tool == 'all':
             filename = 'All_Reports.zip'
         else:
             filename = f'{download_tool.capitalize()}_Reports.zip'
         
         return send_file(
-            zip_buffer,
+            io.BytesIO(zip_bytes),
             mimetype='application/zip',
             as_attachment=True,
             download_name=filename
@@ -929,13 +354,13 @@ def download_reports():
         flash(f"🛑 An error occurred while generating reports: {e}", "error")
         return redirect(url_for('reports'))
 
-@app.route('/view_report')
 def view_report():
     try:
+        report_id = request.args.get('report_id')
         assignment = request.args.get('assignment')
         report = request.args.get('report')
         
-        if not assignment or not report:
+        if not report_id and not (assignment and report):
             flash("🛑 Invalid report parameters.", "error")
             return redirect(url_for('reports'))
         
@@ -944,30 +369,20 @@ def view_report():
             flash("🛑 Session expired or invalid. Please upload the files again.", "error")
             return redirect(url_for('home'))
         
-        upload_folder = os.path.join('uploads', secure_filename(user_id))
-        reports_folder = os.path.join(upload_folder, 'reports')
-        
-        # Determine the report filename based on the report type
-        if "Compliance" in report:
-            report_filename = f"{assignment}_{report}.pdf"
-        elif report in ['Grammar_Check', 'Critical_Writing_Check', 'Reference_Check']:
-            report_filename = f"{assignment}_{report}.pdf"
-        else:
-            flash("🛑 Invalid Report Type.", "error")
-            logger.warning(f"Invalid report type requested: {report} for assignment: {assignment}")
+        record = requested_report(user_id, session.get('job_id'), report_id, assignment, report)
+        if record is None:
+            flash("🛑 Report not found.", "error")
+            logger.warning(f"Report not found: id={report_id} assignment={assignment} report={report}")
             return redirect(url_for('reports'))
-        
-        pdf_path = os.path.join(reports_folder, report_filename)
-        if not os.path.exists(pdf_path):
-            flash(f"🛑 Report file not found: {report_filename}", "error")
-            logger.error(f"Report file not found: {pdf_path}")
+        if record.status != STATUS_OK:
+            flash(record.error, "error")
             return redirect(url_for('reports'))
         
         return send_file(
-            pdf_path,
+            record.pdf_path,
             mimetype='application/pdf',
             as_attachment=False,
-            download_name=report_filename
+            download_name=os.path.basename(record.pdf_path)
         )
     
     except Exception as e:
@@ -975,11 +390,94 @@ def view_report():
         flash(f"🛑 An error occurred while viewing the report: {e}", "error")
         return redirect(url_for('reports'))
 
-@app.errorhandler(413)
+def session_jobs(cohort_id):
+    # Jobs this browser session published to the cohort; the cohort routes only show a cohort
+    # to its own submitters (an unknown cohort and someone else's look the same)
+    return {job_id for cohort, job_id in session.get('published_jobs', []) if cohort == cohort_id}
+
+def analytics(cohort_id):
+    # Aggregates are cached per cohort until new scores arrive
+    job_ids = session_jobs(cohort_id)
+    if not job_ids:
+        return jsonify(error="🛑 No scores recorded for this cohort."), 404
+    try:
+        result = cohort_analytics(cohort_id)
+    except Exception as e:
+        logger.error(f"Error in analytics for cohort {cohort_id}: {e}")
+        return jsonify(error=f"🛑 Error: {e}"), 500
+    if result is None:
+        return jsonify(error="🛑 No scores recorded for this cohort."), 404
+    return jsonify(submitter_view(result, job_ids))
+
+def similarity(cohort_id):
+    # Only pairs involving the session's own submissions, and only to the cohort's submitters
+    job_ids = session_jobs(cohort_id)
+    if not job_ids:
+        return jsonify(error="🛑 No submissions recorded for this cohort."), 404
+    try:
+        return jsonify(similarity_report(cohort_id, job_ids))
+    except Exception as e:
+        logger.error(f"Error in similarity for cohort {cohort_id}: {e}")
+        return jsonify(error=f"🛑 Error: {e}"), 500
+
+def metrics():
+    # Counters since startup, per process
+    llm = current_app.extensions['groq_client']
+    return jsonify(
+        llm_backends=llm.stats() if hasattr(llm, 'stats') else {},
+        llm_breaker=llm.breaker.stats() if hasattr(llm, 'breaker') else {},
+        llm_routes=route_stats(),
+        llm_flights=flight_stats(),
+        scheduler=scheduler_stats(),
+        pages=page_stats(),
+        ocr=ocr_stats(),
+    )
+
 def request_entity_too_large(error):
     flash("🛑 File too large. Maximum upload size is 16MB.", "error")
     return redirect(url_for('home'))
 
+ROUTES = [
+    ('/', home, ['GET']),
+    ('/tutorial', tutorial, ['GET']),
+    ('/reports', reports, ['GET']),
+    ('/process_files', process_files, ['POST']),
+    ('/analyze_tools', analyze_tools, ['POST']),
+    ('/resume', resume, ['POST']),
+    ('/download_reports', download_reports, ['POST']),
+    ('/view_report', view_report, ['GET']),
+    ('/cohort/<cohort_id>/analytics', analytics, ['GET']),
+    ('/cohort/<cohort_id>/similarity', similarity, ['GET']),
+    ('/metrics', metrics, ['GET']),
+]
+
+def create_app(config=None):
+    """Builds the Flask app; config is a mapping that overrides the defaults below."""
+    app = Flask(__name__)
+    app.jinja_options = {**app.jinja_options, **jinja_options('main')}
+    app.secret_key = os.urandom(24)  # In production, use a fixed secret key.
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB upload limit
+    app.config['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
+    app.config['LLM_BACKENDS'] = os.getenv("LLM_BACKENDS")  # JSON list of backends, see utils/llm_backends.py
+    app.config.update(config or {})
+    
+    # Clients connect on the first LLM call, so a missing key only fails the analysis routes
+    if not app.config['GROQ_API_KEY'] and not app.config['LLM_BACKENDS']:
+        logger.warning(MISSING_KEY_MESSAGE)
+    app.extensions['groq_client'] = build_balancer(app.config['LLM_BACKENDS'], app.config['GROQ_API_KEY'])
+    # Pages with no per-request state are rendered once per app: {template name: StaticPage}
+    app.extensions['static_pages'] = {}
+    
+    for rule, view, methods in ROUTES:
+        app.add_url_rule(rule, view_func=view, methods=methods)
+    app.before_request(start_timer)
+    app.after_request(compress_and_measure)
+    app.register_error_handler(413, request_entity_too_large)
+    app.cli.add_command(resume_command(app))
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     os.makedirs('uploads', exist_ok=True)
     app.run(debug=True, port=8000)
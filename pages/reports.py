@@ -1,26 +1,5 @@
 import streamlit as st
-from utils.pdf_generation_reportlab import generate_individual_pdf_report
-
-def get_reports_for_assignment(assignment_name):
-    reports = {}
-    # Compliance Reports
-    compliance_reports = st.session_state['compliance_reports'].get(assignment_name, {})
-    for key, report_content in compliance_reports.items():
-        reports[key] = report_content
-
-    # Grammar Report
-    if assignment_name in st.session_state['grammar_reports']:
-        reports['Grammar Check'] = st.session_state['grammar_reports'][assignment_name]
-
-    # Critical Writing Report
-    if assignment_name in st.session_state['critical_writing_reports']:
-        reports['Critical Writing Check'] = st.session_state['critical_writing_reports'][assignment_name]
-
-    # Reference Report
-    if assignment_name in st.session_state['reference_reports']:
-        reports['Reference Check'] = st.session_state['reference_reports'][assignment_name]
-
-    return reports
+from utils.report_service import assignment_reports, report_key, cached_pdf, render_report_pdf
 
 def view_reports():
     st.header("📑 View Reports")
@@ -34,7 +13,7 @@ def view_reports():
     for assignment_name in assignments.keys():
         st.subheader(f"📄 Assignment: {assignment_name}")
 
-        reports = get_reports_for_assignment(assignment_name)
+        reports = assignment_reports(st.session_state, assignment_name)
 
         if not reports:
             st.write("🚫 No reports available for this assignment.")
@@ -54,27 +33,9 @@ def download_reports():
         return
 
     assignments_text = st.session_state['assignments_text']
-    selected_tools = st.session_state['selected_tools']
-
-    for assignment_name, _ in assignments_text.items():
-        reports_dict = {}
 
-        # Compliance Reports
-        compliance_reports = st.session_state['compliance_reports'].get(assignment_name, {})
-        for key, report_content in compliance_reports.items():
-            reports_dict[key] = report_content
-
-        # Grammar Report
-        if assignment_name in st.session_state['grammar_reports']:
-            reports_dict['Grammar Check'] = st.session_state['grammar_reports'][assignment_name]
-
-        # Critical Writing Report
-        if assignment_name in st.session_state['critical_writing_reports']:
-            reports_dict['Critical Writing Check'] = st.session_state['critical_writing_reports'][assignment_name]
-
-        # Reference Report
-        if assignment_name in st.session_state['reference_reports']:
-            reports_dict['Reference Check'] = st.session_state['reference_reports'][assignment_name]
+    for assignment_name in assignments_text.keys():
+        reports_dict = assignment_reports(st.session_state, assignment_name)
 
         if not reports_dict:
             st.write(f"🚫 No reports available for {assignment_name}.")
@@ -90,17 +51,23 @@ def download_reports():
 
         if selected_report:
             report_content = reports_dict[selected_report]
+            key = report_key(selected_report, report_content)
+
+            # The PDF is only built when asked for; once built, reruns reuse the report service's cached bytes
+            pdf_bytes = cached_pdf(key)
+            if pdf_bytes is None and not st.button(f"🛠️ Prepare {selected_report} PDF", key=f"prepare_{assignment_name}_{key[:16]}"):
+                continue
             try:
-                pdf_bytes = generate_individual_pdf_report(
-                    selected_report,
-                    report_content
-                )
+                if pdf_bytes is None:
+                    with st.spinner("Building PDF..."):
+                        pdf_bytes = render_report_pdf(selected_report, report_content)
 
                 st.download_button(
                     label=f"📄 Download {selected_report}",
                     data=pdf_bytes,
                     file_name=f"{assignment_name}_{selected_report.replace(' ', '_')}.pdf",
-                    mime='application/pdf'
+                    mime='application/pdf',
+                    key=f"download_{assignment_name}_{key[:16]}"
                 )
             except Exception as e:
                 st.error(f"🛑 Error generating PDF for {selected_report} in {assignment_name}: {e}")
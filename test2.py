@@ -1,11 +1,48 @@
+import io
+import os
+import re
+import sys
+import shutil
+import subprocess
+import tempfile
+import time
 import unittest
-from main import app
+from main import app, create_app
+
+class StubClient:
+    """LLM client that answers every prompt with the same report and counts its calls."""
+    def __init__(self, answer="# Report\nGood work.\n## Score: 7/10"):
+        self.answer, self.calls = answer, 0
+
+    def get_groq_response(self, messages, **kwargs):
+        self.calls += 1
+        return self.answer
 
 class FlaskAppTestCase(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
 
+    def analysis_app(self, llm_client, essay=b'text'):
+        """A Flask app on llm_client and a test client whose session has uploaded essay."""
+        app = create_app({'GROQ_API_KEY': 'test'})
+        app.extensions['groq_client'] = llm_client
+        client = app.test_client()
+        self.upload(client, essay)
+        return app, client
+
+    def upload(self, client, essay=b'text'):
+        """Posts an essay, brief and module file; returns the upload's user_id (removed after the test)."""
+        client.post('/process_files', content_type='multipart/form-data', data={
+            'assignment_file': (io.BytesIO(essay), 'essay.txt'),
+            'assessment_brief_file': (io.BytesIO(b'brief'), 'brief.txt'),
+            'module_material_files': (io.BytesIO(b'module'), 'module.txt'),
+        })
+        with client.session_transaction() as session:
+            user_id = session['user_id']
+        self.addCleanup(shutil.rmtree, os.path.join('uploads', user_id), True)
+        return user_id
+
     def test_home_page(self):
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
@@ -16,6 +53,719 @@ class FlaskAppTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 302)  # Redirect due to flash
         # Further assertions can be made by following the redirect
 
+    def test_tutorial_conditional_get(self):
+        response = self.app.get('/tutorial', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        etag = response.headers.get('ETag')
+        response = self.app.get('/tutorial', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_app_without_api_key(self):
+        client = create_app({'GROQ_API_KEY': None}).test_client()
+        self.assertEqual(client.get('/').status_code, 200)
+
+    def test_cold_import_skips_heavy_backends(self):
+        code = "import sys, main; print(','.join(m for m in ('pdfplumber', 'docx', 'pptx', 'reportlab', 'groq', 'numpy', 'pandas') if m in sys.modules))"
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                env=dict(os.environ, GROQ_API_KEY=''))
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_analysis_records_reports(self):
+        app, client = self.analysis_app(StubClient())
+        response = client.post('/analyze_tools', data={'critical_writing_check': 'on'})
+        self.assertEqual(response.status_code, 302)
+        page = client.get('/reports').get_data(as_text=True)
+        self.assertIn('Score: 7/10', page)
+        report_id = re.search(r'report_id=(\d+)', page).group(1)
+        response = client.get(f'/view_report?report_id={report_id}')
+        self.assertEqual(response.mimetype, 'application/pdf')
+        with client.session_transaction() as session:
+            cohort_id = session['cohort_id']
+        stats = client.get(f'/cohort/{cohort_id}/analytics').get_json()
+        self.assertEqual(stats['tools']['Critical Writing Check']['median'], 7.0)
+        self.assertEqual(client.get('/cohort/unknown/analytics').status_code, 404)
+        # Another session cannot read the cohort by guessing its id
+        self.assertEqual(app.test_client().get(f'/cohort/{cohort_id}/analytics').status_code, 404)
+        self.assertEqual(client.get(f'/cohort/{cohort_id}/similarity').status_code, 200)
+        self.assertEqual(app.test_client().get(f'/cohort/{cohort_id}/similarity').status_code, 404)
+        # A resubmission from the same session replaces its scores instead of counting twice
+        self.upload(client, b'text, revised')
+        client.post('/analyze_tools', data={'critical_writing_check': 'on'})
+        resubmitted = client.get(f'/cohort/{cohort_id}/analytics').get_json()
+        self.assertEqual(resubmitted['tools']['Critical Writing Check']['count'], stats['tools']['Critical Writing Check']['count'])
+
+    def test_asgi_app_serves_the_full_flow(self):
+        import asyncio
+        from werkzeug.datastructures import FileStorage
+        from asgi import create_app as create_asgi_app
+
+        class AsyncStubClient:
+            async def get_groq_response(self, messages, **kwargs):
+                return "# Report\nGood work.\n## Score: 7/10"
+
+        app = create_asgi_app({'GROQ_API_KEY': 'test'})
+        app.extensions['groq_client'] = AsyncStubClient()
+
+        async def scenario():
+            async with app.test_app() as test_app:
+                client = test_app.test_client()
+                await client.post('/process_files', files={
+                    'assignment_file': FileStorage(io.BytesIO(b'text'), 'essay.txt'),
+                    'assessment_brief_file': FileStorage(io.BytesIO(b'brief'), 'brief.txt'),
+                    'module_material_files': FileStorage(io.BytesIO(b'module'), 'module.txt'),
+                })
+                async with client.session_transaction() as session:
+                    self.addCleanup(shutil.rmtree, os.path.join('uploads', session['user_id']), True)
+                response = await client.post('/analyze_tools', form={'critical_writing_check': 'on'})
+                self.assertEqual(response.status_code, 302)
+                page = await (await client.get('/reports')).get_data(as_text=True)
+                self.assertIn('Score: 7/10', page)
+                report_id = re.search(r'report_id=(\d+)', page).group(1)
+                response = await client.get(f'/view_report?report_id={report_id}')
+                self.assertEqual(response.mimetype, 'application/pdf')
+                response = await client.post('/download_reports', form={'download_tool': 'all'})
+                self.assertEqual(response.mimetype, 'application/zip')
+                async with client.session_transaction() as session:
+                    return session['job_id']
+
+        job_id = asyncio.run(scenario())
+        # The async app has the same resume command as the Flask app
+        self.assertIn('not resumable', app.test_cli_runner().invoke(args=['resume', job_id]).output)
+
+    def test_criteria_scores_ignore_quoted_fractions(self):
+        from utils.report_store import parse_criteria
+        report = (
+            "## Argument Structure\nThe essay claims 3/4 of firms fail.\n> \"Only 1/5 agreed\"\nScore: 1.5/2\n"
+            "## Evidence\n- **Use of Sources**: 1/2\n- The author notes 4/5 stakeholders agreed: see page 3.\n"
+            "## Score Breakdown\n- Clarity 1/2\n| Originality | 2/2 | Good |\n## Score: 7/10\n"
+        )
+        self.assertEqual(parse_criteria(report), {
+            'Argument Structure': (1.5, 2.0), 'Use of Sources': (1.0, 2.0), 'Clarity': (1.0, 2.0), 'Originality': (2.0, 2.0),
+        })
+
+    def test_prompt_templates_render_fields_and_version(self):
+        from utils.prompt_registry import PromptTemplate, get_prompt, prompt_versions
+        from utils.storage import content_hash
+        template = PromptTemplate('demo', 'Review for $5 of effort.\n${essay}\nBrief: ${brief}')
+        self.assertEqual(template.fields, ('essay', 'brief'))
+        self.assertEqual(template.render(essay='Essay.', brief='Brief.'), 'Review for $5 of effort.\nEssay.\nBrief: Brief.')
+        self.assertEqual(template.messages(essay='E', brief='B'), [{'role': 'user', 'content': 'Review for $5 of effort.\nE\nBrief: B'}])
+        with self.assertRaises(KeyError):
+            template.render(essay='Essay.')
+        # The version names the template and changes with any edit to its text
+        self.assertEqual(template.version, f"demo@{content_hash(template.text)[:12]}")
+        self.assertNotEqual(PromptTemplate('demo', template.text + ' ').version, template.version)
+        self.assertEqual(prompt_versions()['grammar_check'], get_prompt('grammar_check').version)
+
+    def test_course_digests_are_built_once_per_content(self):
+        import asyncio
+        from utils import storage
+        from utils.course_digest import brief_digest, module_digest, module_digest_async
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        self.addCleanup(setattr, storage, 'DATA_DIR', storage.DATA_DIR)
+        storage.DATA_DIR = folder
+
+        class StubClient:
+            calls = 0
+
+            def get_groq_response(self, messages, **kwargs):
+                StubClient.calls += 1
+                return f'- Digest {StubClient.calls}'
+
+        class AsyncStubClient:
+            async def get_groq_response(self, messages, **kwargs):
+                raise AssertionError('a cached digest needs no LLM call')
+
+        client = StubClient()
+        self.assertEqual(brief_digest(client, 'Write 2000 words on pricing.'), '- Digest 1')
+        self.assertEqual(brief_digest(client, 'Write 2000 words on pricing.'), '- Digest 1')
+        self.assertEqual(brief_digest(client, 'Write 3000 words on pricing.'), '- Digest 2')
+        modules = {'week1.pdf': 'Segmentation groups customers.', 'week2.pdf': 'Pricing and elasticity.'}
+        self.assertEqual(module_digest(client, modules), '- Digest 3')
+        self.assertEqual(module_digest(client, dict(reversed(modules.items()))), '- Digest 3')
+        self.assertEqual(asyncio.run(module_digest_async(AsyncStubClient(), modules)), '- Digest 3')
+        self.assertEqual(StubClient.calls, 3)
+
+    def test_grammar_drafts_are_scoped_to_the_submitter(self):
+        from utils.analysis import plan_tasks, tool_selection
+        selected_tools = tool_selection({'grammar_check': 'on'})[0]
+
+        def draft_id(scope):
+            task, = plan_tasks({'essay.docx': 'Text.'}, selected_tools, {}, {}, draft_scope=scope)
+            return task.kwargs.get('draft_id')
+
+        self.assertEqual(draft_id(('cohort', 'alice')), draft_id(('cohort', 'alice')))
+        self.assertNotEqual(draft_id(('cohort', 'alice')), draft_id(('cohort', 'bob')))
+        self.assertNotEqual(draft_id(('cohort', 'alice')), draft_id(('other cohort', 'alice')))
+        self.assertIsNone(draft_id(None))
+
+    def test_grammar_resubmission_reviews_changed_paragraphs(self):
+        from tools.grammar_check import grammar_check, DRAFTS_NAMESPACE
+        from utils.storage import _namespace_path
+
+        class StubClient:
+            def __init__(self):
+                self.prompts = []
+
+            def get_groq_response(self, messages, **kwargs):
+                prompt = messages[-1]['content']
+                self.prompts.append(prompt)
+                return '\n'.join(f'### P{n}\n- Wordy sentence.' for n in re.findall(r'\[P(\d+)\]\n', prompt))
+
+        draft_id = os.urandom(8).hex()
+        self.addCleanup(lambda: os.remove(_namespace_path(DRAFTS_NAMESPACE, draft_id)))
+        client = StubClient()
+        paragraphs = ['Pricing shapes demand.', 'Demand shapes supply.', 'Supply shapes pricing.']
+        grammar_check(client, '\n\n'.join(paragraphs), draft_id=draft_id)
+        self.assertIn('[P1]', client.prompts[0])
+        paragraphs[2] = 'Supply chains shape pricing.'
+        report = grammar_check(client, '\n\n'.join(paragraphs), draft_id=draft_id)
+        # Only the changed paragraph is reviewed, with its neighbour as context
+        self.assertIn('[P3]\nSupply chains shape pricing.', client.prompts[1])
+        self.assertIn('[P2 - context only, do not review]', client.prompts[1])
+        self.assertNotIn('Pricing shapes demand.', client.prompts[1])
+        self.assertIn('Reviewed 1 new or changed paragraph(s); reused findings for 2 unchanged paragraph(s).', report)
+        self.assertEqual(report.count('- Wordy sentence.'), 3)
+        # An unchanged resubmission needs no LLM call at all
+        grammar_check(client, '\n\n'.join(paragraphs), draft_id=draft_id)
+        self.assertEqual(len(client.prompts), 2)
+
+    def test_grammar_review_without_paragraph_headings_is_not_clean(self):
+        from tools.grammar_check import grammar_check, DRAFTS_NAMESPACE
+        from utils.storage import _namespace_path
+        draft_id = os.urandom(8).hex()
+        self.addCleanup(lambda: os.remove(_namespace_path(DRAFTS_NAMESPACE, draft_id)))
+        text = 'Pricing shapes demand.\n\nDemand shapes supply.'
+        report = grammar_check(StubClient('Paragraph two is wordy; tighten it.'), text, draft_id=draft_id)
+        self.assertIn('Paragraph two is wordy; tighten it.', report)
+        self.assertIn('No findings were returned for paragraph(s) 1, 2', report)
+        self.assertNotIn('No sentence structure or clarity issues found.', report)
+        self.assertNotIn('Score:', report)
+        # A paragraph the model skips is retried on the next run instead of being cached as clean
+        client = StubClient('### P1\n- No issues found.')
+        report = grammar_check(client, text, draft_id=draft_id)
+        self.assertIn('No findings were returned for paragraph(s) 2;', report)
+        grammar_check(client, text, draft_id=draft_id)
+        self.assertEqual(client.calls, 2)
+
+    def test_grammar_score_saturates(self):
+        from tools.grammar_check import grammar_score, HALF_SCORE_DENSITY
+        essay = [' '.join(['word'] * 100)] * 10
+        self.assertEqual(grammar_score(essay, 0), 10.0)
+        self.assertEqual(grammar_score(essay, int(HALF_SCORE_DENSITY * 10)), 5.0)
+        # One slip in a short answer is not a failing grade
+        self.assertGreaterEqual(grammar_score([' '.join(['word'] * 20)], 1), 8.0)
+        scores = [grammar_score(essay, issues) for issues in (0, 10, 50, 200, 1000)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertGreater(scores[-1], 0.0)
+
+    def test_grammar_prefilter(self):
+        from tools.grammar_rules import run_prefilter
+        messages = [f.message for f in run_prefilter('The the studnets wrote teh essay. the results were clear.')]
+        self.assertIn('Repeated word "The".', messages)
+        self.assertIn('"teh" should be "the".', messages)
+        self.assertIn('"studnets" may be misspelt (did you mean: students?).', messages)
+        self.assertIn('Sentence starts with lowercase "the".', messages)
+        self.assertEqual(run_prefilter('The students analysed the data. Their findings were persuasive.'), [])
+        self.assertEqual(run_prefilter('The U.S. economy grew, e.g. exports rose by 5 p.m. figures.'), [])
+
+    def test_grammar_spelling_accepts_british_forms_and_suggests_listed_words(self):
+        from tools.grammar_rules import run_prefilter, edit_candidates, known, WORDLIST
+        self.assertEqual(run_prefilter('The organisation realised it must prioritise customers and analyse their behaviour.'), [])
+        self.assertTrue(known('organising') and known('organizing'))
+        # Suggestions are listed words (or their plain plurals), never guessed inflections
+        self.assertNotIn('theoried', edit_candidates('theorid'))
+        self.assertEqual(edit_candidates('studnets'), ['students'])
+        self.assertTrue(all(c in WORDLIST or c[:-1] in WORDLIST for c in edit_candidates('reserch')))
+
+    def test_reference_check_supported_style_is_local(self):
+        from tools.reference_check import reference_check, LOCAL_VERSION
+
+        class NoLLM:
+            def get_groq_response(self, messages, **kwargs):
+                raise AssertionError('supported styles are checked without the LLM')
+
+        text = (
+            'Pricing shapes demand (Kotler, 2019). Porter (1985) argues otherwise (Smith, 2020).\n\n'
+            'References\n'
+            'Kotler, P. (2019). Marketing management. Pearson.\n'
+            'Porter, M. E. (1985). Competitive advantage. Free Press.\n'
+            'Jones, A. (2018). Unused source. Routledge.\n'
+        )
+        report = reference_check(NoLLM(), text, '', 'APA')
+        self.assertEqual(report.prompt_version, LOCAL_VERSION)
+        self.assertIn('Found 3 reference list entries and 3 in-text citations.', report)
+        self.assertIn('Citation with no matching reference: (Smith, 2020)', report)
+        self.assertIn('Reference never cited in the text: Jones, A. (2018)', report)
+
+    def test_pdf_cache_is_pruned(self):
+        from utils import report_service
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        self.addCleanup(setattr, report_service, 'PDF_CACHE_DIR', report_service.PDF_CACHE_DIR)
+        report_service.PDF_CACHE_DIR = folder
+        now = time.time()
+        for name, age in (('stale', 90), ('old', 30), ('read', 20), ('new', 10)):
+            path = os.path.join(folder, f'{name}.pdf')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (now - age, now - age))
+        # Reading a cached PDF makes it the most recently used
+        self.assertEqual(report_service.cached_pdf('read'), b'x' * 100)
+        self.assertEqual(report_service.prune_pdf_cache(max_bytes=200, max_age=60), 2)
+        self.assertEqual(sorted(os.listdir(folder)), ['new.pdf', 'read.pdf'])
+
+    def test_similar_submissions_are_paired(self):
+        from utils.similarity import index_submissions, similarity_report
+        path = os.path.join(tempfile.mkdtemp(), 'similarity.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        essay = ' '.join(f'word{i % 97} topic{i}' for i in range(400))
+        other = ' '.join(f'other{i}' for i in range(400))
+        self.assertEqual(index_submissions('cohort', 'u1', 'job1', {'a.docx': essay, 'b.docx': other}, path=path), 0)
+        copied = essay.replace('topic10 ', 'subject10 ')
+        self.assertEqual(index_submissions('cohort', 'u2', 'job2', {'c.docx': copied}, path=path), 1)
+        # The same submitter uploading the same file again is not a new submission
+        self.assertEqual(index_submissions('cohort', 'u2', 'job3', {'c.docx': copied}, path=path), 0)
+        pair = similarity_report('cohort', path=path)['pairs'][0]
+        self.assertEqual((pair['first']['assignment'], pair['second']['assignment']), ('a.docx', 'c.docx'))
+        self.assertTrue(pair['excerpts'])
+        # Another student's verbatim copy under the same name is paired with both
+        self.assertEqual(index_submissions('cohort', 'u4', 'job4', {'c.docx': copied}, path=path), 2)
+        pair = similarity_report('cohort', path=path)['pairs'][0]
+        self.assertEqual((pair['first']['job_id'], pair['second']['job_id'], pair['similarity']), ('job2', 'job4', 1.0))
+        # A submitter's view lists only their own pairs and does not identify the other job
+        pairs = similarity_report('cohort', {'job1'}, path=path)['pairs']
+        self.assertEqual([(p['first']['job_id'], p['second']['job_id']) for p in pairs], [('job1', None), ('job1', None)])
+
+    def test_module_dedup_keeps_one_copy(self):
+        from utils.module_dedup import dedup_modules
+        footer = 'Introduction to Marketing, Week 3, University of Somewhere'
+        reading = 'Kotler, P. (2019) Principles of Marketing. Pearson.'
+        result = dedup_modules({
+            'deck.pptx': '\n'.join([footer + ' 1', reading, 'Segmentation groups customers by need.', footer + ' 2']),
+            'handout.pdf': '\n'.join([reading, 'Pricing strategy and elasticity.']),
+        })
+        self.assertEqual(result.text.count('Kotler'), 1)
+        self.assertIn('[also in: handout.pdf]', result.text)
+        # The footer repeated within the deck is dropped without a note pointing at the deck itself
+        self.assertNotIn('[also in: deck.pptx]', result.text)
+        self.assertEqual(result.removed_paragraphs, 2)
+        self.assertGreater(result.removed_tokens, 0)
+
+    def test_normalization_strips_page_furniture(self):
+        from utils.text_normalization import normalize_pages
+        pages = [
+            ('BUS101 Module Handbook\nPricing strategy and the e\ufb03cient market hypoth-\nesis.\nMore on prices.\nPage 1 of 3', []),
+            # pdfplumber returns table cells in the page text and again as a table
+            ('BUS101 Module Handbook\nSegmentation.\nCriterion Weight\nAnalysis 40%\nPage 2 of 3',
+             [[['Criterion', 'Weight'], ['Analysis', '40%']]]),
+            ('BUS101 Module Handbook\nBranding and positioning.\nBrand equity.\nPage 3 of 3', []),
+        ]
+        result = normalize_pages(pages)
+        self.assertNotIn('Handbook', result.text)
+        self.assertNotIn('Page 2', result.text)
+        self.assertIn('efficient market hypothesis', result.text)
+        self.assertEqual(result.text.count('Criterion'), 1)
+        self.assertGreater(result.saved_tokens, 0)
+
+    def test_scanned_pdf_pages_are_ocrd_once(self):
+        from reportlab.pdfgen import canvas
+        from utils import ocr, storage, file_processing
+        from utils.file_processing import pdf_pages
+        # Tesseract is optional: the recogniser is stubbed and runs inline instead of in the worker pool
+        recognised = []
+
+        class InlinePool:
+            def map(self, func, *iterables):
+                return list(map(func, *iterables))
+
+        def recognise(png_bytes, language):
+            recognised.append(png_bytes)
+            return 'Scanned handout on pricing strategy and demand.', 0.01
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        for module, name, value in ((file_processing, 'ocr_available', lambda: True), (ocr, '_recognise', recognise),
+                                    (ocr, '_get_pool', InlinePool), (storage, 'DATA_DIR', folder)):
+            self.addCleanup(setattr, module, name, getattr(module, name))
+            setattr(module, name, value)
+
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer)
+        pdf.drawString(72, 720, 'Segmentation groups customers by their needs and behaviour.')
+        pdf.showPage()
+        pdf.rect(72, 600, 200, 100, fill=1)  # A scan: an image with no text layer
+        pdf.showPage()
+        pdf.save()
+        self.assertTrue(ocr.needs_ocr('  12 \n'))
+        self.assertFalse(ocr.needs_ocr('Segmentation groups customers by their needs.'))
+
+        for engine, calls in (('pdfium', 1), ('pdfium', 1), ('pdfplumber', 2)):
+            pages = pdf_pages(buffer.getvalue(), engine)
+            self.assertIn('Segmentation groups customers', pages[0][0])
+            self.assertEqual(pages[1][0], 'Scanned handout on pricing strategy and demand.')
+            # Only the scanned page goes to OCR; a page image seen before is served from the cache
+            self.assertEqual(len(recognised), calls)
+        self.assertEqual(len(os.listdir(os.path.join(folder, ocr.OCR_NAMESPACE))), 2)
+
+    def test_extractors_dispatch_on_content(self):
+        from utils.file_processing import extract_all_text, sniff_content_type, COST_HEAVY, EXTRACTORS
+        files = {
+            'essay.pdf': b'Plain text saved with the wrong extension.',
+            'notes.md': b'# Notes\nSee [the handbook](https://example.org).',
+            'essay.rtf': b'{\\rtf1{\\fonttbl{\\f0 Arial;}}\\f0 Caf\\\'e9 society\\par}',
+        }
+        self.assertEqual(sniff_content_type(files['essay.pdf'], 'essay.pdf'), 'text/plain')
+        self.assertEqual(EXTRACTORS['application/pdf'].cost, COST_HEAVY)
+        paths = {}
+        for name, data in files.items():
+            path = os.path.join(tempfile.mkdtemp(), name)
+            self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths[name] = path
+        text = extract_all_text(paths)
+        self.assertEqual(text['essay.pdf'], 'Plain text saved with the wrong extension.')
+        self.assertEqual(text['notes.md'], '# Notes\nSee the handbook.')
+        self.assertEqual(text['essay.rtf'], 'Caf\u00e9 society')
+
+    def test_ooxml_streaming_keeps_order_groups_and_notes(self):
+        import io
+        import docx
+        from pptx import Presentation
+        from pptx.util import Inches
+        from utils.file_processing import docx_pages, pptx_pages, extract_tables_from_docx
+        doc = docx.Document()
+        doc.add_paragraph('Before the rubric')
+        table = doc.add_table(rows=1, cols=2)
+        table.cell(0, 0).text, table.cell(0, 1).text = 'Criterion', 'Weight'
+        doc.add_paragraph('After the rubric')
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        self.assertEqual(docx_pages(buffer.getvalue()), [('Before the rubric\nCriterion\tWeight\nAfter the rubric\n', [])])
+        self.assertEqual(extract_tables_from_docx(buffer.getvalue()), [[['Criterion', 'Weight']]])
+
+        prs = Presentation()
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = 'Segmentation'
+        group = slide.shapes.add_group_shape()
+        group.shapes.add_textbox(0, 0, Inches(1), Inches(1)).text_frame.text = 'Grouped caption'
+        slide.notes_slide.notes_text_frame.text = 'Mention the case study'
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        self.assertEqual(pptx_pages(buffer.getvalue()), [('Segmentation\nGrouped caption\nSpeaker notes:\nMention the case study\n', [])])
+        self.assertIn('Error extracting text from DOCX', docx_pages(b'not a zip')[0][0])
+
+    def test_pdf_engines_agree_and_keep_tables(self):
+        import io
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+        from utils.file_processing import pdf_pages, extract_tables_from_pdf
+        from utils.text_normalization import normalize_pages
+        table = Table([['Criterion', 'Weight'], ['Analysis', '40%']])
+        table.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)]))
+        style = getSampleStyleSheet()['Normal']
+        buffer = io.BytesIO()
+        SimpleDocTemplate(buffer).build([
+            Paragraph('Segmentation comes before targeting.', style), PageBreak(),
+            Paragraph('The rubric weights analysis most.', style), table,
+        ])
+        fast, layout = pdf_pages(buffer.getvalue(), 'pdfium'), pdf_pages(buffer.getvalue(), 'pdfplumber')
+        self.assertEqual(normalize_pages(fast).text, normalize_pages(layout).text)
+        self.assertEqual([tables for _, tables in fast], [[], [[['Criterion', 'Weight'], ['Analysis', '40%']]]])
+        self.assertEqual(extract_tables_from_pdf(buffer.getvalue()), [[['Criterion', 'Weight'], ['Analysis', '40%']]])
+
+    def test_router_falls_back_on_rate_limits_only_where_it_pays(self):
+        from utils.model_router import routed_response, choose_route, DEFAULT_MODEL, ROUTING_POLICY
+
+        class ProviderError(Exception):
+            def __init__(self, status_code, message):
+                super().__init__(message)
+                self.status_code = status_code
+
+        class StubClient:
+            def __init__(self, errors):
+                self.errors, self.calls = errors, []
+
+            def get_groq_response(self, messages, model, temperature, max_tokens):
+                self.calls.append(model)
+                if model in self.errors:
+                    raise self.errors[model]
+                return f'Answer from {model}'
+
+        messages = [{'role': 'user', 'content': 'Essay text.'}]
+        rate_limited = {DEFAULT_MODEL: ProviderError(429, 'Rate limit reached')}
+        # Every tool starts on the 8B model; tiers differ in how much output a call may buy
+        self.assertEqual({choose_route(tool, messages).model for tool in ('grammar_check', 'critical_writing_check', 'assessment_compliance')}, {DEFAULT_MODEL})
+        self.assertEqual(choose_route('assessment_compliance', messages, 5000).max_tokens, ROUTING_POLICY['fast'].max_output_tokens)
+        # A rate-limited graded report is retried on the 70B model; cheaper tools do not escalate
+        client = StubClient(rate_limited)
+        self.assertEqual(routed_response(client, messages, tool='critical_writing_check'), 'Answer from llama-3.3-70b-versatile')
+        self.assertEqual(client.calls, [DEFAULT_MODEL, 'llama-3.3-70b-versatile'])
+        client = StubClient(rate_limited)
+        with self.assertRaises(ProviderError):
+            routed_response(client, messages, tool='grammar_check')
+        self.assertEqual(client.calls, [DEFAULT_MODEL])
+        # A context-length error is not retried on a model whose window is no larger
+        client = StubClient({DEFAULT_MODEL: ProviderError(400, 'Please reduce the length: maximum context length exceeded')})
+        with self.assertRaises(ProviderError):
+            routed_response(client, messages, tool='critical_writing_check')
+        self.assertEqual(client.calls, [DEFAULT_MODEL])
+
+    def test_llm_balancer_spreads_and_fails_over(self):
+        from utils.llm_backends import build_balancer
+        from utils.llm_stand_in import StandInServer
+        from utils.model_router import routed_response
+        servers = [StandInServer().start(), StandInServer().start(), StandInServer(fail_status=429).start()]
+        for server in servers:
+            self.addCleanup(server.stop)
+        balancer = build_balancer([
+            {'kind': 'openai', 'name': 'heavy', 'base_url': servers[0].url, 'weight': 2},
+            {'kind': 'openai', 'name': 'light', 'base_url': servers[1].url},
+            {'kind': 'openai', 'name': 'limited', 'base_url': servers[2].url, 'weight': 3},
+        ])
+        for n in range(9):
+            self.assertIn('Stand-in answer', routed_response(balancer, [{'role': 'user', 'content': f'essay {n}'}]))
+        stats = balancer.stats()
+        self.assertEqual(stats['limited']['errors'], 1)
+        self.assertGreater(stats['limited']['cooldown'], 0)
+        self.assertEqual((stats['heavy']['calls'], stats['light']['calls']), (6, 3))
+
+    def test_identical_llm_requests_share_one_call(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.llm_backends import build_balancer
+        from utils.llm_stand_in import StandInServer
+        from utils.single_flight import _claim, _land, flight_stats, prompt_key, single_flight
+        server = StandInServer(latency=0.3).start()
+        self.addCleanup(server.stop)
+        balancer = build_balancer([{'kind': 'openai', 'base_url': server.url}])
+        before = flight_stats()
+        prompt = f'Review essay {os.urandom(4).hex()}'
+        with ThreadPoolExecutor(4) as pool:
+            answers = list(pool.map(lambda spaces: balancer.get_groq_response(
+                [{'role': 'user', 'content': prompt.replace(' ', spaces)}]), [' ', '  ', ' \n', ' ']))
+        self.assertEqual(len(set(answers)), 1)
+        self.assertEqual(server.calls, 1)
+        self.assertEqual(flight_stats()['coalesced'] - before['coalesced'], 3)
+
+        # A flight led by another worker process: this one waits for its answer instead of calling
+        key = prompt_key([{'role': 'user', 'content': prompt}], 'other-model', 0.5, 1024)
+        self.assertTrue(_claim(key, 'other-process', None))
+        threading.Timer(0.2, _land, (key, 'other-process', None, 'Shared answer')).start()
+        self.assertEqual(single_flight(key, lambda: self.fail('should not call upstream')), 'Shared answer')
+        self.assertEqual(flight_stats()['coalesced_shared'] - before['coalesced_shared'], 1)
+        self.assertIn('llm_flights', self.app.get('/metrics').get_json())
+
+    def test_cancelled_async_leader_hands_over_its_flight(self):
+        import asyncio
+        from utils.database import connect
+        from utils.single_flight import single_flight_async
+        path = os.path.join(tempfile.mkdtemp(), 'flights.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        key = os.urandom(8).hex()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return f'Answer {len(calls)}'
+
+        async def scenario():
+            leader = asyncio.create_task(single_flight_async(key, call, path))
+            await asyncio.sleep(0.05)
+            follower = asyncio.create_task(single_flight_async(key, call, path))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            # The abandoned flight is landed at once, not left running until FLIGHT_TIMEOUT
+            status = await asyncio.to_thread(
+                lambda: connect(path).execute('SELECT status FROM llm_flights WHERE key = ?', (key,)).fetchone()[0])
+            self.assertEqual(status, 'failed')
+            return await follower
+
+        self.assertEqual(asyncio.run(scenario()), 'Answer 2')
+        self.assertEqual(len(calls), 2)
+
+    def test_scheduler_prefers_interactive_and_shares_fairly(self):
+        import threading
+        import time
+        from utils.scheduler import Scheduler, scheduling, BATCH, INTERACTIVE
+        scheduler = Scheduler('test', 1)
+        order, threads = [], []
+        blocker = threading.Event()
+
+        def work(priority, tenant, label):
+            with scheduling(priority, tenant), scheduler.slot():
+                order.append(label)
+                blocker.wait()
+
+        def queue(priority, tenant, label):
+            depth = scheduler.stats()['classes'][priority]['queued']
+            thread = threading.Thread(target=work, args=(priority, tenant, label))
+            thread.start()
+            threads.append(thread)
+            while scheduler.stats()['classes'][priority]['queued'] == depth and label not in order:
+                time.sleep(0.01)
+
+        queue(BATCH, 'big', 'running')
+        for n in range(3):
+            queue(BATCH, 'big', f'big{n}')
+        queue(BATCH, 'small', 'small0')
+        queue(INTERACTIVE, 'teacher', 'teacher0')
+        self.assertEqual(scheduler.stats()['classes'][BATCH]['queued'], 4)
+        blocker.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, ['running', 'teacher0', 'small0', 'big0', 'big1', 'big2'])
+        self.assertEqual(scheduler.stats()['running'], 0)
+
+    def test_interrupted_job_resumes_without_repeating_llm_calls(self):
+        from utils import run_journal
+        from utils.analysis import Task, tool_selection, run_checkpointed
+        from utils.prompt_registry import ToolResult
+        from utils.report_store import find_report
+        client_llm = StubClient()
+        app, client = self.analysis_app(client_llm)
+        with client.session_transaction() as session:
+            user_id = session['user_id']
+        reports_folder = os.path.join('uploads', user_id, 'reports')
+        os.makedirs(reports_folder, exist_ok=True)
+
+        # A job dies after one finished task and one paid-for answer that never became a PDF
+        job_id = os.urandom(8).hex()
+        assignments = {'essay.txt': 'First essay.', 'other.txt': 'Second essay.'}
+        tasks = [Task(name, 'Critical Writing Check', (text,), {}) for name, text in assignments.items()]
+        selected_tools = tool_selection({'critical_writing_check': 'on'})[0]
+        run_journal.start_run(job_id, user_id, job_id, reports_folder, selected_tools, assignments, tasks)
+        run_checkpointed(client_llm, job_id, tasks[0], reports_folder)
+        run_journal.record_response(run_journal.task_id(job_id, tasks[1]), ToolResult('# Report\n## Score: 6/10', 'v1'))
+        self.assertEqual(client_llm.calls, 1)
+
+        self.addCleanup(setattr, run_journal, 'STALE_SECONDS', run_journal.STALE_SECONDS)
+        run_journal.STALE_SECONDS = -1  # The worker counts as gone at once
+        self.assertEqual(client.post('/resume').status_code, 302)
+        self.assertEqual(client_llm.calls, 1)
+        self.assertEqual(find_report(job_id, 'other.txt', 'Critical Writing Check').score, 6.0)
+        self.assertIn('Score: 6/10', client.get('/reports').get_data(as_text=True))
+        output = app.test_cli_runner().invoke(args=['resume', job_id]).output
+        self.assertIn('not resumable', output)
+
+    def test_journal_heartbeats_and_fences_out_lost_workers(self):
+        import time
+        from utils import run_journal
+        from utils.analysis import Task, tool_selection
+        from utils.database import connect
+        path = os.path.join(tempfile.mkdtemp(), 'journal.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        job_id, task = os.urandom(8).hex(), Task('essay.txt', 'Critical Writing Check', ('Essay.',), {})
+        tasks = [task, Task('essay.txt', 'Grammar Check', ('Essay.',), {})]
+        selected_tools = tool_selection({'critical_writing_check': 'on', 'grammar_check': 'on'})[0]
+        run_journal.start_run(job_id, 'user', job_id, 'reports', selected_tools, {'essay.txt': 'Essay.'}, tasks, path=path)
+        db = connect(path)
+        # The essay is journaled once for the job, not once per task and again in the header
+        self.assertEqual(db.execute('SELECT COUNT(*) FROM run_texts WHERE job_id = ?', (job_id,)).fetchone()[0], 1)
+        run = run_journal.claim_run(job_id, Task, force=True, path=path)
+        self.assertEqual((run.tasks, run.assignments_text), (tasks, {'essay.txt': 'Essay.'}))
+        beat = lambda: db.execute('SELECT heartbeat_at FROM analysis_runs WHERE job_id = ?', (job_id,)).fetchone()[0]
+
+        # A long task keeps its job alive between checkpoints
+        self.addCleanup(setattr, run_journal, 'HEARTBEAT_SECONDS', run_journal.HEARTBEAT_SECONDS)
+        run_journal.HEARTBEAT_SECONDS = 0.05
+        started = beat()
+        with run_journal.heartbeat(job_id, path):
+            time.sleep(0.3)
+        self.assertGreater(beat(), started)
+
+        # Another worker claims the job: this one may no longer write to it
+        with db:
+            db.execute('UPDATE analysis_runs SET owner = ? WHERE job_id = ?', ('other-worker', job_id))
+        tid = run_journal.task_id(job_id, task)
+        with self.assertRaises(run_journal.RunLost):
+            run_journal.record_response(tid, 'Late answer', path=path)
+        self.assertIsNone(run_journal.journaled_response(tid, path=path))
+        with self.assertRaises(run_journal.RunLost):
+            run_journal.finish_run(job_id, path=path)
+
+        # Its results are rolled back with the fenced finish instead of overwriting the new owner's
+        from utils.analysis import Outcome, save_outcomes
+        from utils.report_store import find_report
+        job_id = os.urandom(8).hex()
+        run_journal.start_run(job_id, 'user', job_id, 'reports', selected_tools, {'essay.txt': 'Essay.'}, [task])
+        with connect() as main_db:
+            main_db.execute('UPDATE analysis_runs SET owner = ? WHERE job_id = ?', ('other-worker', job_id))
+        outcome = Outcome(task, 'essay.pdf', None, 'v1', 7.0, {}, 'hash', 0.1, 0.1)
+        with self.assertRaises(run_journal.RunLost):
+            save_outcomes('user', job_id, {'essay.txt': 'Essay.'}, selected_tools, [outcome], job_id)
+        self.assertIsNone(find_report(job_id, 'essay.txt', 'Critical Writing Check'))
+
+    def test_report_markdown_renders_without_markers(self):
+        import pypdfium2
+        from utils.report_markdown import parse_report, report_html
+        from utils.pdf_generation_reportlab import generate_individual_pdf_report
+        report = ('# Feedback\nThe **thesis** is *clear* & <focused>.\n\n- Strong **evidence**\n  - Cite `Kotler`\n'
+                  '2. Second point\n\n| Criterion | Score |\n|---|---|\n| Analysis | 7/10 |\n\n## Score: 7/10')
+        blocks = parse_report(report)
+        self.assertIs(parse_report(report), blocks)  # Cached by content hash
+        self.assertEqual([b.kind for b in blocks], ['heading', 'paragraph', 'bullets', 'numbered', 'table', 'score'])
+        self.assertEqual(blocks[1].tone, 'success')
+        self.assertEqual(blocks[2].items[1][0], 1)
+        self.assertIn('<strong>thesis</strong>', report_html(report))
+        text = pypdfium2.PdfDocument(generate_individual_pdf_report('Critical Writing', report))[0].get_textpage().get_text_range()
+        self.assertIn('The thesis is clear & <focused>.', text)
+        self.assertIn('Score: 7.0/10', text)
+        for marker in ('#', '**', '| Analysis', '`'):
+            self.assertNotIn(marker, text)
+
+    def test_open_circuit_degrades_and_drains(self):
+        import time
+        from utils.circuit_breaker import CircuitOpenError, OPEN
+        from utils.llm_backends import build_balancer
+        from utils.llm_stand_in import StandInServer
+        from utils.report_store import find_report
+        from utils.task_queue import queued_count
+        server = StandInServer(fail_status=503).start()
+        self.addCleanup(server.stop)
+        balancer = build_balancer([{'kind': 'openai', 'base_url': server.url}])
+        balancer.breaker.open_seconds = 2.0
+        for n in range(5):
+            with self.assertRaises(Exception):
+                balancer.get_groq_response([{'role': 'user', 'content': f'essay {n}'}])
+        self.assertEqual(balancer.breaker.state, OPEN)
+        calls = server.calls
+        with self.assertRaises(CircuitOpenError):
+            balancer.get_groq_response([{'role': 'user', 'content': 'essay'}])
+        self.assertEqual(server.calls, calls)
+
+        app, client = self.analysis_app(balancer, f'Draft {os.urandom(4).hex()} has a teh typo.'.encode())
+        client.post('/analyze_tools', data={'grammar_check': 'on', 'critical_writing_check': 'on'})
+        with client.session_transaction() as session:
+            job_id = session['job_id']
+        self.assertEqual(find_report(job_id, 'essay.txt', 'Grammar Check').status, 'ok')  # Local-only report
+        self.assertEqual(find_report(job_id, 'essay.txt', 'Critical Writing Check').status, 'queued')
+        self.assertIn('queued', client.get('/reports').get_data(as_text=True))
+
+        # The service recovers: the drainer's probe closes the circuit and the queue runs
+        server.fail_status = None
+        deadline = time.monotonic() + 20
+        while queued_count() and time.monotonic() < deadline:
+            time.sleep(0.2)
+        self.assertEqual(queued_count(), 0)
+        self.assertEqual(find_report(job_id, 'essay.txt', 'Critical Writing Check').status, 'ok')
+
+    def test_unserved_model_does_not_trip_the_breaker(self):
+        from utils.circuit_breaker import CLOSED
+        from utils.llm_backends import build_balancer, BackendUnavailable
+        balancer = build_balancer([{'kind': 'openai', 'base_url': 'http://127.0.0.1:9/v1', 'models': ['served-model']}])
+        for n in range(10):
+            with self.assertRaises(BackendUnavailable):
+                balancer.get_groq_response([{'role': 'user', 'content': f'essay {n}'}], model='unserved-model')
+        self.assertEqual(balancer.breaker.state, CLOSED)
+        self.assertEqual(balancer.breaker.stats()['window_calls'], 0)
+
     # Add more tests as needed
 
 if __name__ == '__main__':
@@ -0,0 +1,368 @@
+import re
+from collections import namedtuple
+
+# Deterministic citation engine: finds the reference list, parses it into records, matches
+# in-text citations against an index of those records and validates every entry against a
+# small per-style grammar.
+
+Reference = namedtuple("Reference", ["raw", "number", "authors", "year", "title", "doi", "url"])
+Citation = namedtuple("Citation", ["text", "authors", "year", "number"])
+
+SUPPORTED_STYLES = ("APA", "Harvard", "IEEE", "MLA", "Chicago")
+NUMERIC_STYLES = ("IEEE",)
+
+_NAME = r"[A-Z][A-Za-z'’\-]+"
+_YEAR = r"(?:1[5-9]\d{2}|20\d{2})[a-z]?|n\.d\."
+
+_SECTION_HEADING = re.compile(
+    r"^\s*(?:\d+(?:\.\d+)*\.?\s+)?(references?|reference list|bibliography|works cited|"
+    r"literature cited|sources|(?:essential |recommended |further |core )?reading(?: list)?)\s*:?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_SECTION_END = re.compile(r"^\s*(appendix|appendices|table of contents)\b.*$", re.IGNORECASE | re.MULTILINE)
+_ENTRY_START = re.compile(rf"^(\[\d+\]|\d+\.\s|{_NAME},|{_NAME}\s(?:[A-Z]\.\s?)+|[A-Z]\.\s?(?:[A-Z]\.\s?)*{_NAME})")
+
+_YEAR_IN_PARENS = re.compile(rf"\(({_YEAR})(?:,[^)]*)?\)")
+_BARE_YEAR = re.compile(rf"\b({_YEAR})(?=[.,;\s)])")
+_DOI = re.compile(r"\b(?:https?://(?:dx\.)?doi\.org/|doi:\s?)?(10\.\d{4,9}/\S+?)[.,;]?(?=\s|$)", re.IGNORECASE)
+_URL = re.compile(r"https?://\S+?(?=[.,;]?(?:\s|$))")
+_SURNAME_INITIALS = re.compile(rf"({_NAME}(?:\s{_NAME})*),\s*(?:[A-Z]\.\s?-?)+")
+_SURNAME_FIRSTNAME = re.compile(rf"^({_NAME}),\s+[A-Z][a-z]+")
+_INITIALS_SURNAME = re.compile(rf"(?:[A-Z]\.\s?-?)+\s?({_NAME})")
+_NUMBER = re.compile(r"^\s*(?:\[(\d+)\]|(\d+)\.\s)")
+
+_PARENTHETICAL = re.compile(r"\(([^()]*?(?:\d{4}[a-z]?|n\.d\.)[^()]*)\)")
+_CITATION_PART = re.compile(rf"({_NAME}(?:\s(?:et al\.?|(?:and|&)\s{_NAME}))?)(?:,)?\s+({_YEAR})")
+_NARRATIVE = re.compile(rf"\b({_NAME})(?:\s+et al\.?|\s+(?:and|&)\s+{_NAME})?\s+\(({_YEAR})[^)]*\)")
+_NUMERIC_CITATION = re.compile(r"\[(\d+(?:\s*[-–,]\s*\d+)*)\]")
+_MLA_CITATION = re.compile(rf"\(({_NAME})(?:\s(?:and|&)\s{_NAME}|\set al\.)?\s(\d+(?:[-–]\d+)?)\)")
+
+# Per-style grammars: (description of the rule, compiled pattern, whether it must match).
+STYLE_GRAMMARS = {
+    "APA": [
+        ("Authors as 'Surname, I.'", re.compile(rf"^{_NAME}(?:\s{_NAME})*,\s(?:[A-Z]\.\s?)+"), True),
+        ("Year in parentheses after the authors, followed by a full stop", re.compile(rf"\(({_YEAR})(?:,\s[A-Z][a-z]+(?:\s\d{{1,2}})?)?\)\."), True),
+        ("'&' (not 'and') before the final author", re.compile(rf",?\sand\s{_NAME},\s[A-Z]\."), False),
+        ("DOIs written as https://doi.org/...", re.compile(r"\bdoi:\s?10\.", re.IGNORECASE), False),
+    ],
+    "Harvard": [
+        ("Authors as 'Surname, I.'", re.compile(rf"^{_NAME}(?:\s{_NAME})*,\s(?:[A-Z]\.\s?)+"), True),
+        ("Year after the authors", re.compile(rf"^[^()]*?(?:\(({_YEAR})\)|\s({_YEAR})\.)"), True),
+        ("'and' (not '&') between authors", re.compile(r"\s&\s"), False),
+    ],
+    "IEEE": [
+        ("Entries numbered as [n]", re.compile(r"^\[\d+\]\s"), True),
+        ("Authors as 'I. Surname'", re.compile(rf"^\[\d+\]\s(?:[A-Z]\.\s?-?)+\s?{_NAME}"), True),
+        ("Titles in double quotation marks", re.compile(r"[\"“][^\"”]+[\"”]"), True),
+        ("No parenthesised year after the authors", re.compile(rf"^\[\d+\][^\"“]*\(({_YEAR})\)"), False),
+    ],
+    "MLA": [
+        ("First author as 'Surname, Firstname'", re.compile(rf"^{_NAME},\s[A-Z][a-z]+"), True),
+        ("No parenthesised year after the authors", re.compile(rf"^[^.]*\.\s?\(({_YEAR})\)"), False),
+        ("Entry ends with a full stop", re.compile(r"\.\s*$"), True),
+    ],
+    "Chicago": [
+        ("First author as 'Surname, Firstname'", re.compile(rf"^{_NAME},\s[A-Z][a-z]+"), True),
+        ("Year present", re.compile(rf"\b({_YEAR})\b"), True),
+        ("Entry ends with a full stop", re.compile(r"\.\s*$"), True),
+    ],
+}
+
+# Author-date styles expect the list in alphabetical order by first author.
+ALPHABETICAL_STYLES = ("APA", "Harvard", "MLA", "Chicago")
+
+
+def normalize_style(reference_style):
+    """Maps a user-supplied style name onto one of SUPPORTED_STYLES, or None."""
+    if not reference_style:
+        return None
+    lowered = reference_style.strip().lower()
+    for style in SUPPORTED_STYLES:
+        if lowered.startswith(style.lower()):
+            return style
+    return None
+
+
+def find_reference_sections(text):
+    """Returns (body_text, [section_text, ...]) for every reference/reading list heading."""
+    headings = list(_SECTION_HEADING.finditer(text))
+    if not headings:
+        return text, []
+    sections = []
+    for pos, heading in enumerate(headings):
+        end = headings[pos + 1].start() if pos + 1 < len(headings) else len(text)
+        section_end = _SECTION_END.search(text, heading.end(), end)
+        sections.append(text[heading.end():section_end.start() if section_end else end])
+    return text[:headings[0].start()], sections
+
+
+def split_entries(section_text):
+    """Splits a reference section into raw entries, joining wrapped lines."""
+    entries = []
+    for line in section_text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if not entries or _ENTRY_START.match(line):
+            entries.append(line)
+        else:
+            entries[-1] = f"{entries[-1]} {line}"
+    return [entry for entry in entries if _BARE_YEAR.search(entry) or _NUMBER.match(entry)]
+
+
+def parse_entry(raw):
+    """Parses one raw reference into a Reference record."""
+    number_match = _NUMBER.match(raw)
+    number = int(number_match.group(1) or number_match.group(2)) if number_match else None
+    body = raw[number_match.end():].strip() if number_match else raw
+
+    year_match = _YEAR_IN_PARENS.search(body) or _BARE_YEAR.search(body)
+    year = year_match.group(1) if year_match else None
+    author_part = body[:year_match.start()] if year_match else body.split(".")[0]
+
+    if number is not None:
+        author_part = re.split(r"[\"“]", body)[0]
+        authors = _INITIALS_SURNAME.findall(author_part) or _SURNAME_INITIALS.findall(author_part)
+    else:
+        authors = _SURNAME_INITIALS.findall(author_part)
+        if not authors:
+            first = _SURNAME_FIRSTNAME.match(author_part)
+            authors = [first.group(1)] if first else re.findall(rf"^({_NAME})", author_part)
+        authors += re.findall(rf"(?:and|&)\s+[A-Z][a-z]+\s+({_NAME})", author_part)
+
+    title_match = re.search(r"[\"“]([^\"”]+)[\"”]", body)
+    if title_match:
+        title = title_match.group(1).strip(" ,.")
+    elif year_match:
+        title = body[year_match.end():].strip(" ).").split(". ")[0]
+    else:
+        title = ""
+
+    doi = _DOI.search(body)
+    url = _URL.search(body)
+    return Reference(raw, number, [a.split()[-1] for a in authors], year, title,
+                     doi.group(1) if doi else None, url.group(0) if url else None)
+
+
+def extract_citations(body_text, style):
+    """Finds in-text citations in the body of the assignment."""
+    citations = []
+    if style in NUMERIC_STYLES:
+        for match in _NUMERIC_CITATION.finditer(body_text):
+            for number in _expand_numbers(match.group(1)):
+                citations.append(Citation(match.group(0), [], None, number))
+        return citations
+
+    for match in _PARENTHETICAL.finditer(body_text):
+        for part in match.group(1).split(";"):
+            cited = _CITATION_PART.search(part)
+            if cited:
+                citations.append(Citation(f"({part.strip()})", _citation_surnames(cited.group(1)), cited.group(2), None))
+    for match in _NARRATIVE.finditer(body_text):
+        citations.append(Citation(match.group(0), _citation_surnames(match.group(0).split("(")[0]), match.group(2), None))
+    if style == "MLA":
+        for match in _MLA_CITATION.finditer(body_text):
+            citations.append(Citation(match.group(0), [match.group(1)], None, None))
+    return citations
+
+
+def _expand_numbers(spec):
+    numbers = []
+    for piece in re.split(r"\s*,\s*", spec):
+        bounds = re.split(r"\s*[-–]\s*", piece)
+        if len(bounds) == 2 and bounds[0].isdigit() and bounds[1].isdigit():
+            numbers.extend(range(int(bounds[0]), int(bounds[1]) + 1))
+        elif piece.isdigit():
+            numbers.append(int(piece))
+    return numbers
+
+
+def _citation_surnames(text):
+    return [name for name in re.findall(_NAME, text) if name not in ("And",)]
+
+
+class ReferenceIndex:
+    """Index of parsed references by (surname, year), surname and number."""
+
+    def __init__(self, references):
+        self.references = references
+        self.by_author_year = {}
+        self.by_author = {}
+        self.by_number = {}
+        for ref in references:
+            if ref.number is not None:
+                self.by_number[ref.number] = ref
+            if ref.authors:
+                surname = ref.authors[0].lower()
+                self.by_author.setdefault(surname, []).append(ref)
+                if ref.year:
+                    self.by_author_year.setdefault((surname, ref.year.lower()), []).append(ref)
+
+    def lookup(self, citation):
+        if citation.number is not None:
+            return self.by_number.get(citation.number)
+        if not citation.authors:
+            return None
+        surname = citation.authors[0].lower()
+        if citation.year:
+            matches = self.by_author_year.get((surname, citation.year.lower()))
+        else:
+            matches = self.by_author.get(surname)
+        return matches[0] if matches else None
+
+
+def validate_entry(reference, style):
+    """Returns the list of style-rule descriptions the entry violates."""
+    issues = []
+    for description, pattern, must_match in STYLE_GRAMMARS.get(style, []):
+        if bool(pattern.search(reference.raw)) != must_match:
+            issues.append(description)
+    if not reference.year and style != "IEEE":
+        issues.append("Missing publication year")
+    return issues
+
+
+def analyze_references(assignment_text, module_text, style):
+    """Runs the full local pipeline and returns a dict of structured findings."""
+    body, sections = find_reference_sections(assignment_text)
+    references = [parse_entry(raw) for section in sections[-1:] for raw in split_entries(section)]
+    index = ReferenceIndex(references)
+
+    citations = extract_citations(body, style)
+    unmatched = [c for c in citations if index.lookup(c) is None]
+    cited = {id(index.lookup(c)) for c in citations}
+    uncited = [ref for ref in references if id(ref) not in cited]
+
+    formatting = []
+    for ref in references:
+        issues = validate_entry(ref, style)
+        if issues:
+            formatting.append((ref, issues))
+
+    consistency = []
+    if style in ALPHABETICAL_STYLES:
+        surnames = [ref.authors[0].lower() for ref in references if ref.authors]
+        if surnames != sorted(surnames):
+            consistency.append("Reference list is not in alphabetical order by first author.")
+    if style in NUMERIC_STYLES:
+        numbers = [ref.number for ref in references if ref.number is not None]
+        if numbers != list(range(1, len(numbers) + 1)):
+            consistency.append("Reference numbers are not sequential from [1].")
+    numbered = sum(1 for ref in references if ref.number is not None)
+    if 0 < numbered < len(references):
+        consistency.append(f"{numbered} of {len(references)} entries are numbered; the list mixes styles.")
+    if sum(1 for ref in references if ref.doi) and any(ref.doi is None and ref.url for ref in references):
+        consistency.append("Some online sources give a DOI and others only a URL; use DOIs where available.")
+
+    _, module_sections = find_reference_sections(module_text or "")
+    module_refs = [parse_entry(raw) for section in module_sections for raw in split_entries(section)]
+    missing_readings = []
+    seen = set()
+    for ref in module_refs:
+        if not ref.authors:
+            continue
+        key = (ref.authors[0].lower(), (ref.year or "").lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        if not index.by_author_year.get(key) and not index.by_author.get(key[0]):
+            missing_readings.append(ref)
+
+    return {
+        "style": style,
+        "has_reference_list": bool(sections),
+        "references": references,
+        "citations": citations,
+        "unmatched_citations": unmatched,
+        "uncited_references": uncited,
+        "formatting_issues": formatting,
+        "consistency_issues": consistency,
+        "missing_module_readings": missing_readings,
+    }
+
+
+def score_findings(findings):
+    """Derives a 0-10 score from the structured findings."""
+    references = findings["references"]
+    citations = findings["citations"]
+    if not references:
+        return 2.0 if citations else 0.0
+    score = 10.0
+    score -= 4.0 * len(findings["formatting_issues"]) / len(references)
+    if citations:
+        score -= 3.0 * len(findings["unmatched_citations"]) / len(citations)
+    else:
+        score -= 3.0
+    score -= 2.0 * len(findings["uncited_references"]) / len(references)
+    score -= 1.0 if findings["consistency_issues"] else 0.0
+    return round(max(score, 0.0), 1)
+
+
+def _bullets(lines, empty, limit=20):
+    if not lines:
+        return f"- {empty}"
+    shown = [f"- {line}" for line in lines[:limit]]
+    if len(lines) > limit:
+        shown.append(f"- ...and {len(lines) - limit} more.")
+    return "\n".join(shown)
+
+
+def _short(text, width=90):
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def format_report(findings):
+    """Formats the structured findings as the Markdown reference check report."""
+    style = findings["style"]
+    if not findings["has_reference_list"]:
+        completeness = "- No reference list was found (expected a 'References' or 'Bibliography' heading)."
+    else:
+        completeness = _bullets(
+            [f"Module reading not cited: {_short(ref.raw)}" for ref in findings["missing_module_readings"]],
+            "All readings listed in the module materials are cited.",
+        )
+    formatting = _bullets(
+        [f"{_short(ref.raw)} — {'; '.join(issues)}" for ref, issues in findings["formatting_issues"]],
+        f"All {len(findings['references'])} entries follow the {style} pattern.",
+    )
+    in_text = _bullets(
+        [f"Citation with no matching reference: {c.text}" for c in findings["unmatched_citations"]]
+        + [f"Reference never cited in the text: {_short(ref.raw)}" for ref in findings["uncited_references"]],
+        f"All {len(findings['citations'])} in-text citations match the reference list.",
+    )
+    consistency = _bullets(findings["consistency_issues"], "Referencing is consistent throughout.")
+
+    return f"""# Reference Check Report ({style})
+
+Found {len(findings['references'])} reference list entries and {len(findings['citations'])} in-text citations.
+
+## 📚 Completeness of Required References
+
+{completeness}
+
+## 📝 Formatting Accuracy
+
+{formatting}
+
+## 🔗 In-Text Citations
+
+{in_text}
+
+## 🔄 Consistency of Style
+
+{consistency}
+
+## 📊 Score: {score_findings(findings)}/10
+"""
+
+
+def summarize_for_prompt(findings, limit=40):
+    """Compact plain-text summary of the findings for an LLM prompt."""
+    lines = [f"Reference list entries ({len(findings['references'])}):"]
+    lines += [f"- {ref.raw}" for ref in findings["references"][:limit]]
+    lines.append(f"In-text citations found: {len(findings['citations'])}")
+    lines += [f"- Unmatched citation: {c.text}" for c in findings["unmatched_citations"][:limit]]
+    lines += [f"- Uncited reference: {_short(ref.raw)}" for ref in findings["uncited_references"][:limit]]
+    lines += [f"- Module reading not cited: {_short(ref.raw)}" for ref in findings["missing_module_readings"][:limit]]
+    lines += [f"- {issue}" for issue in findings["consistency_issues"]]
+    return "\n".join(lines)
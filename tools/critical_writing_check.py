@@ -1,28 +1,18 @@
 from utils.groq_integration import GroqClient
+from utils.model_router import declare_tool, routed_response, routed_response_async
+from utils.prompt_registry import get_prompt, ToolResult
 
-def critical_writing_check(groq_client, assignment_text):
-    prompt = f"""
-Evaluate the following assignment for critical analysis and writing quality. For each category below, provide specific feedback and suggestions. Highlight areas where the argument could be strengthened, where more critical thinking is needed, or where the writing could be clearer and more concise. 
-
-Instructions:
-
-1. **Argument Structure**: Analyze the coherence and logical flow of arguments. Identify gaps or areas needing improvement.
-2. **Critical Analysis**: Evaluate the depth of analysis. Highlight any areas where more critical thinking or insight is required.
-3. **Evidence and Support**: Assess the quality and relevance of evidence used to support arguments. Note where stronger or additional evidence could improve the argument.
-4. **Clarity and Conciseness**: Check for readability, clear expression, and conciseness. Suggest rephrasing for overly complex or verbose sentences.
-5. **Grammar and Syntax**: Identify grammatical errors or awkward syntax that may impede readability.
+TOOL = declare_tool("critical_writing_check", output_tokens=1500, quality="high")
 
-Instructions:
-
-- Provide the report in Markdown format.
-- Use clear headings and bullet points under each category.
-- Include an overall score out of 10 at the end, with individual scores for each category out of 2.
-
-Assignment:
-{assignment_text}
+def critical_writing_check(groq_client, assignment_text):
+    template = get_prompt("critical_writing_check")
+    messages = template.messages(assignment_text=assignment_text)
+    response = routed_response(groq_client, messages, tool=TOOL)
+    return ToolResult(response, template.version)
 
-Provide a detailed critical writing report.
-"""
-    messages = [{"role": "user", "content": prompt}]
-    response = groq_client.get_groq_response(messages)
-    return response
+async def critical_writing_check_async(groq_client, assignment_text):
+    """critical_writing_check for the async LLM client."""
+    template = get_prompt("critical_writing_check")
+    messages = template.messages(assignment_text=assignment_text)
+    response = await routed_response_async(groq_client, messages, tool=TOOL)
+    return ToolResult(response, template.version)
@@ -1,24 +1,183 @@
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+
 from utils.groq_integration import GroqClient
+from utils.model_router import declare_tool, routed_response, routed_response_async
+from utils.prompt_registry import get_prompt, ToolResult
+from utils.storage import content_hash, load_json, save_json
+from utils.circuit_breaker import DEGRADED_NOTE
+from tools.grammar_rules import run_prefilter, format_findings
+
+DRAFTS_NAMESPACE = "grammar_drafts"
+CONTEXT_PARAGRAPHS = 1  # Unchanged neighbours sent with each changed paragraph
+NO_ISSUES = "- No issues found."
+HALF_SCORE_DENSITY = 5.0  # Issues per 100 words that score 5/10
+MIN_SCORED_WORDS = 100  # Shorter texts are scored per 100 words, so one slip cannot sink a short answer
+
+TOOL = declare_tool("grammar_check", output_tokens=1500, temperature=0.3)
+
+_PARAGRAPH_HEADING = re.compile(r"^#{1,6}\s*\[?P(\d+)\]?.*$", re.MULTILINE)
+
+def split_paragraphs(text):
+    """Splits extracted text into paragraphs (blank-line separated, else one per line)."""
+    blocks = re.split(r"\n\s*\n", text) if re.search(r"\n\s*\n", text) else text.split("\n")
+    return [block.strip() for block in blocks if block.strip()]
+
+def changed_paragraphs(paragraphs, previous_hashes, cached_findings):
+    """Returns the indices of paragraphs that differ from the previous draft or lack cached findings."""
+    hashes = [content_hash(p) for p in paragraphs]
+    changed = set()
+    matcher = SequenceMatcher(None, previous_hashes, hashes, autojunk=False)
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        for j in range(j1, j2):
+            if tag != 'equal' or hashes[j] not in cached_findings:
+                changed.add(j)
+    return sorted(changed)
+
+def _with_context(indices, total):
+    """Adds CONTEXT_PARAGRAPHS neighbours around each changed paragraph."""
+    window = set()
+    for i in indices:
+        window.update(range(max(0, i - CONTEXT_PARAGRAPHS), min(total, i + CONTEXT_PARAGRAPHS + 1)))
+    return sorted(window)
+
+def _parse_findings(response):
+    """Splits a paragraph-tagged LLM response into {paragraph index: findings}."""
+    findings = {}
+    matches = list(_PARAGRAPH_HEADING.finditer(response))
+    for pos, match in enumerate(matches):
+        end = matches[pos + 1].start() if pos + 1 < len(matches) else len(response)
+        body = response[match.end():end].strip()
+        findings[int(match.group(1)) - 1] = body or NO_ISSUES
+    return findings
+
+def _tag_paragraphs(paragraphs, review, window):
+    """Renders the paragraphs in window with [P<n>] markers for the review prompt."""
+    tagged = []
+    for i in window:
+        marker = f"[P{i + 1}]" if i in review else f"[P{i + 1} - context only, do not review]"
+        tagged.append(f"{marker}\n{paragraphs[i]}")
+    return "\n\n".join(tagged)
+
+def grammar_score(paragraphs, issue_count):
+    """Maps the issue density (issues per 100 words) onto a saturating 0-10 scale: 10 with no
+    issues, 5 at HALF_SCORE_DENSITY, and approaching (never reaching) 0 as issues pile up."""
+    words = max(sum(len(paragraph.split()) for paragraph in paragraphs), MIN_SCORED_WORDS)
+    density = 100.0 * issue_count / words
+    return round(10.0 * HALF_SCORE_DENSITY / (HALF_SCORE_DENSITY + density), 1)
+
+def _assemble_report(paragraphs, mechanical, mechanical_count, findings, reviewed, reused, pending=0, unreviewed=(), unparsed=None):
+    sections = []
+    for i, paragraph in enumerate(paragraphs):
+        paragraph_findings = findings.get(i)
+        if not paragraph_findings or paragraph_findings.lstrip("- ").lower().startswith("no issues found"):
+            continue
+        excerpt = paragraph if len(paragraph) <= 80 else paragraph[:77] + "..."
+        sections.append(f"### Paragraph {i + 1}\n\n> {excerpt}\n\n{paragraph_findings}")
+    flagged = len(sections)
+    if unparsed:
+        # The model ignored the paragraph headings: keep its feedback rather than dropping it
+        sections.append(f"### Unattributed feedback\n\n{unparsed}")
+    if unreviewed:
+        listed = ", ".join(str(i + 1) for i in unreviewed)
+        sections.append(f"### Not reviewed\n\nNo findings were returned for paragraph(s) {listed}; they will be reviewed again on the next submission.")
+
+    summary = f"Reviewed {reviewed} new or changed paragraph(s); reused findings for {reused} unchanged paragraph(s)."
+    body = "\n\n".join(sections) if sections else "No sentence structure or clarity issues found."
+    if pending:
+        # Degraded mode: no score until the review of the pending paragraphs has run
+        summary = f"{DEGRADED_NOTE}\n\n{pending} paragraph(s) await review; reused findings for {reused} unchanged paragraph(s)."
+        return f"# Grammar and Language Quality Report\n\n{summary}\n\n{mechanical}\n\n## Sentence Structure and Clarity\n\n{body}"
+    if unreviewed:
+        # An incomplete review is not scored, so it cannot pass for a clean one
+        return f"# Grammar and Language Quality Report\n\n{summary}\n\n{mechanical}\n\n## Sentence Structure and Clarity\n\n{body}"
+    # Each flagged paragraph counts as one issue alongside the mechanical findings
+    score = grammar_score(paragraphs, mechanical_count + flagged)
+    return (
+        f"# Grammar and Language Quality Report\n\n{summary}\n\n{mechanical}\n\n"
+        f"## Sentence Structure and Clarity\n\n{body}\n\n## 📊 Score: {score:g}/10"
+    )
+
+_Review = namedtuple("_Review", ["paragraphs", "mechanical", "mechanical_count", "template", "findings", "review", "messages"])
+
+def _prepare(assignment_text, draft_id):
+    """Runs the local pre-pass and the draft diff; messages is None when nothing needs the LLM."""
+    paragraphs = split_paragraphs(assignment_text)
+    prefilter_findings = run_prefilter(assignment_text, paragraphs)
+    mechanical = format_findings(prefilter_findings)
+    template = get_prompt("grammar_check")
+    draft = load_json(DRAFTS_NAMESPACE, draft_id, default={}) if draft_id else {}
+    # Findings produced by a different version of the prompt are not reused.
+    if draft.get("version") != template.version:
+        draft = {}
+    cached_findings = draft.get("findings", {})
+
+    review = changed_paragraphs(paragraphs, draft.get("paragraphs", []), cached_findings)
+    findings = {
+        i: cached_findings[content_hash(p)]
+        for i, p in enumerate(paragraphs)
+        if i not in review and content_hash(p) in cached_findings
+    }
+    messages = None
+    if review:
+        tagged = _tag_paragraphs(paragraphs, set(review), _with_context(review, len(paragraphs)))
+        messages = template.messages(paragraphs=tagged)
+    return _Review(paragraphs, mechanical, len(prefilter_findings), template, findings, review, messages)
 
-def grammar_check(groq_client, assignment_text):
-    prompt = f"""
-Evaluate the following assignment for grammar and language quality. For each category below, provide specific feedback and suggestions. Highlight areas where grammar could be improved, where the language could be clearer, and identify any errors.
+def _finish(state, response, draft_id):
+    """Merges the LLM response into the cached findings, stores the draft and builds the report."""
+    paragraphs, findings, review = state.paragraphs, state.findings, state.review
+    unreviewed, unparsed = [], None
+    if response is not None:
+        parsed = _parse_findings(response)
+        for i in review:
+            if i in parsed:
+                findings[i] = parsed[i]
+            else:
+                unreviewed.append(i)
+        if not parsed:
+            unparsed = response.strip() or None
 
-Instructions:
+    if draft_id:
+        hashes = [content_hash(p) for p in paragraphs]
+        save_json(DRAFTS_NAMESPACE, draft_id, {
+            "version": state.template.version,
+            "paragraphs": hashes,
+            # Paragraphs the model skipped are left uncached so the next run retries them.
+            "findings": {hashes[i]: text for i, text in findings.items()},
+        })
 
-1. **Spelling**: Identify any spelling mistakes or incorrect word usage.
-2. **Punctuation**: Check for missing or incorrect punctuation marks that may impact readability.
-3. **Sentence Structure**: Evaluate the structure of sentences, highlighting any overly complex, fragmented, or run-on sentences.
-4. **Language Clarity**: Suggest rephrasing for sentences that are unclear, verbose, or could benefit from simpler language.
+    report = _assemble_report(
+        paragraphs, state.mechanical, state.mechanical_count, findings, len(review) - len(unreviewed),
+        len(paragraphs) - len(review), unreviewed=unreviewed, unparsed=unparsed,
+    )
+    return ToolResult(report, state.template.version)
 
-- Provide your report in Markdown format.
-- Use clear headings and bullet points under each category.
+def grammar_check(groq_client, assignment_text, draft_id=None):
+    """
+    Paragraph-level grammar check. Mechanical issues are found locally by the grammar_rules
+    pre-pass; only the stylistic review goes to the LLM. When draft_id identifies a previous
+    submission of the same assignment, only new or changed paragraphs (plus a little context)
+    are sent and the stored findings are reused for everything else.
+    """
+    state = _prepare(assignment_text, draft_id)
+    response = routed_response(groq_client, state.messages, tool=TOOL) if state.messages else None
+    return _finish(state, response, draft_id)
 
-Assignment:
-{assignment_text}
+async def grammar_check_async(groq_client, assignment_text, draft_id=None):
+    """grammar_check for the async LLM client."""
+    state = _prepare(assignment_text, draft_id)
+    response = await routed_response_async(groq_client, state.messages, tool=TOOL) if state.messages else None
+    return _finish(state, response, draft_id)
 
-Provide a detailed grammar and language quality report.
-"""
-    messages = [{"role": "user", "content": prompt}]
-    response = groq_client.get_groq_response(messages)
-    return response
+def grammar_check_local(assignment_text, draft_id=None):
+    """Degraded-mode grammar report (LLM unavailable): the local pre-pass and cached paragraph findings, unscored."""
+    state = _prepare(assignment_text, draft_id)
+    if not state.review:
+        return _finish(state, None, draft_id)
+    report = _assemble_report(
+        state.paragraphs, state.mechanical, state.mechanical_count, state.findings, 0,
+        len(state.paragraphs) - len(state.review), pending=len(state.review),
+    )
+    return ToolResult(report, state.template.version)
@@ -0,0 +1,245 @@
+import os
+import re
+from collections import namedtuple
+
+# Deterministic pre-pass for mechanical grammar and spelling issues. Everything here is
+# compiled once at import time so a full assignment is scanned in a few milliseconds.
+
+Finding = namedtuple("Finding", ["category", "message", "excerpt"])
+
+MAX_FINDINGS_PER_CATEGORY = 15
+
+# Common misspellings -> correction. Kept small on purpose; it covers the errors that
+# turn up again and again in student writing.
+MISSPELLINGS = {
+    "accomodate": "accommodate", "acheive": "achieve", "accross": "across",
+    "adress": "address", "agressive": "aggressive", "apparantly": "apparently",
+    "arguement": "argument", "assesment": "assessment", "basicly": "basically",
+    "becuase": "because", "begining": "beginning", "beleive": "believe",
+    "buisness": "business", "calender": "calendar", "catagory": "category",
+    "cieling": "ceiling", "collegue": "colleague", "comittee": "committee",
+    "commited": "committed", "completly": "completely", "concious": "conscious",
+    "consistant": "consistent", "definately": "definitely", "definatly": "definitely",
+    "dependant": "dependent", "desicion": "decision", "developement": "development",
+    "diffrent": "different", "dilemna": "dilemma", "dissapoint": "disappoint",
+    "embarass": "embarrass", "enviroment": "environment", "equiptment": "equipment",
+    "existance": "existence", "experiance": "experience", "facinating": "fascinating",
+    "finaly": "finally", "foriegn": "foreign", "fourty": "forty", "freind": "friend",
+    "goverment": "government", "gaurd": "guard", "happend": "happened",
+    "harrass": "harass", "hierachy": "hierarchy", "immediatly": "immediately",
+    "independant": "independent", "indispensible": "indispensable", "influance": "influence",
+    "knowlege": "knowledge", "liase": "liaise", "liason": "liaison", "libary": "library",
+    "lisence": "licence", "maintainance": "maintenance", "managment": "management",
+    "millenium": "millennium", "mispell": "misspell", "neccessary": "necessary",
+    "necessery": "necessary", "noticable": "noticeable", "occassion": "occasion",
+    "occured": "occurred", "occurence": "occurrence", "occuring": "occurring",
+    "ommit": "omit", "oppurtunity": "opportunity", "orginal": "original",
+    "paralel": "parallel", "parliment": "parliament", "particulary": "particularly",
+    "perseverence": "perseverance", "persue": "pursue", "posession": "possession",
+    "prefered": "preferred", "prescence": "presence", "privelege": "privilege",
+    "probaly": "probably", "proffesional": "professional", "profesional": "professional",
+    "publically": "publicly", "recieve": "receive", "recieved": "received",
+    "recomend": "recommend", "reccomend": "recommend", "refered": "referred",
+    "relevent": "relevant", "religous": "religious", "repetion": "repetition",
+    "resistence": "resistance", "responsability": "responsibility", "rythm": "rhythm",
+    "seperate": "separate", "seperately": "separately", "sieze": "seize",
+    "signficant": "significant", "similiar": "similar", "sucess": "success",
+    "succesful": "successful", "successfull": "successful", "supercede": "supersede",
+    "suprise": "surprise", "tendancy": "tendency", "therefor": "therefore",
+    "threshhold": "threshold", "tommorow": "tomorrow", "tounge": "tongue",
+    "truely": "truly", "unforseen": "unforeseen", "untill": "until",
+    "usefull": "useful", "wierd": "weird", "wich": "which", "whith": "with",
+    "writen": "written", "alot": "a lot", "teh": "the", "thier": "their",
+    "recieving": "receiving", "acknowlege": "acknowledge",
+    "critisism": "criticism", "criticaly": "critically", "evidance": "evidence",
+    "litterature": "literature", "methodolgy": "methodology",
+    "paradigme": "paradigm", "refrence": "reference", "refrences": "references",
+    "reseach": "research", "reserach": "research", "statment": "statement",
+    "stratergy": "strategy", "strategie": "strategy", "theoritical": "theoretical",
+}
+
+ABBREVIATIONS = frozenset({
+    "e.g", "i.e", "etc", "al", "cf", "vs", "fig", "no", "vol", "pp", "p", "ed", "eds",
+    "dr", "mr", "mrs", "ms", "prof", "approx", "ch", "sec", "inc", "ltd", "co", "corp",
+    "jr", "sr", "st", "dept", "est", "ca", "op", "cit", "ibid", "viz", "para", "govt",
+})
+# Dotted initialisms such as "U.S", "U.K", "a.m" or "Ph.D" (the final "." is the match's)
+_INITIALISM = re.compile(r"^(?:[A-Za-z]{1,2}\.)+[A-Za-z]{1,2}$")
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z']+")
+
+_REGEX_RULES = [
+    ("Repeated Words", re.compile(r"\b([A-Za-z]+)[ \t]+\1\b", re.IGNORECASE),
+     lambda m: f'Repeated word "{m.group(1)}".'),
+    ("Spacing", re.compile(r"(?<=\S) {2,}(?=\S)"),
+     lambda m: "Multiple spaces between words."),
+    ("Spacing", re.compile(r"(?<=\w) +([,;:!?]|\.(?!\.))"),
+     lambda m: f'Space before "{m.group(1)}".'),
+    ("Spacing", re.compile(r"(?<=[a-z])([,;:])(?=[A-Za-z])"),
+     lambda m: f'Missing space after "{m.group(1)}".'),
+    ("Spacing", re.compile(r"(?<=[a-z]{2})\.(?=[A-Z][a-z])"),
+     lambda m: 'Missing space after ".".'),
+    ("Punctuation", re.compile(r"([!?,;])\1+"),
+     lambda m: f'Repeated "{m.group(1)}".'),
+    ("Articles", re.compile(r"\b(a) (?!(?:uni|use|usu|eu|one|once)\w*)(?=[aeiou]\w)"),
+     lambda m: f'"{m.group(1)}" before a vowel sound; use "an".'),
+    ("Articles", re.compile(r"\b(an) (?=[bcdfgjklmnpqrstvwxz]\w)"),
+     lambda m: f'"{m.group(1)}" before a consonant sound; use "a".'),
+]
+
+_SENTENCE_START = re.compile(r"(\S+)[.!?]\s+([a-z]\w*)")
+
+_QUOTE_PAIRS = [("(", ")"), ("[", "]"), ("“", "”")]
+
+
+# Base forms of general and academic English (British and American spellings), bundled so
+# suggestions work without a system dictionary; inflected forms are matched by known().
+BUNDLED_WORDLIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordlist.txt")
+
+# (suffix, replacement) pairs tried when a word is not in the list itself, longest first
+_INFLECTIONS = (
+    ("ations", "e"), ("ation", "e"), ("ments", ""), ("ment", ""), ("ness", ""), ("ally", ""),
+    ("ies", "y"), ("ied", "y"), ("ily", "y"), ("ier", "y"), ("iest", "y"), ("ing", ""), ("ing", "e"),
+    ("est", ""), ("est", "e"), ("ers", ""), ("ers", "e"), ("es", ""), ("ed", ""), ("ed", "e"),
+    ("er", ""), ("er", "e"), ("ly", ""), ("al", ""), ("s", ""),
+)
+# Possessives and contractions: "authors'", "firm's", "don't", "they're"
+_CLITIC = re.compile(r"(?:'s|'|n't|'re|'ll|'ve|'d|'m)$")
+# British and American verb endings are equivalent: "organise"/"organize", "analyse"/"analyze"
+_ISE = re.compile(r"(?<=[a-z]{3})([iy])s(e|es|ed|ing|er|ers|ation|ations)$")
+_IZE = re.compile(r"(?<=[a-z]{3})([iy])z(e|es|ed|ing|er|ers|ation|ations)$")
+# A regular plural (or third person) "-s" is safe to propose for any listed word whose plural takes no "-es"
+_PLURAL = re.compile(r"(?<![sxz])(?<!ch)(?<!sh)(?<![^aeiou]y)s$")
+
+
+def _load_wordlist():
+    """Loads the bundled word list, plus SPELLING_WORDLIST or the system one if present."""
+    words = set()
+    for path in (BUNDLED_WORDLIST, os.getenv("SPELLING_WORDLIST", "/usr/share/dict/words")):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                words.update(line.strip().lower() for line in f if line.strip().isalpha())
+        except OSError:
+            pass
+    return frozenset(words)
+
+WORDLIST = _load_wordlist()
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def _spellings(word):
+    """word and its -ise/-ize (and -yse/-yze) counterpart."""
+    return {word, _ISE.sub(r"\1z\2", word), _IZE.sub(r"\1s\2", word)}
+
+
+def _inflection_of(word, vocabulary):
+    # True if stripping a regular suffix from word leaves a listed stem
+    for suffix, replacement in _INFLECTIONS:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            if stem + replacement in vocabulary:
+                return True
+            # A doubled final consonant: "stopped", "planning", "biggest"
+            if not replacement and stem[-1] == stem[-2] and stem[:-1] in vocabulary:
+                return True
+    return False
+
+
+def known(word, vocabulary=WORDLIST):
+    """True if word, in either the -ise or -ize spelling, is in the vocabulary or is a regular
+    inflection of a listed stem ("stopped", "studies", "organisations")."""
+    word = _CLITIC.sub("", word) if "'" in word else word
+    return any(form in vocabulary or _inflection_of(form, vocabulary) for form in _spellings(word))
+
+
+def _listed(word, vocabulary):
+    # Suggestions are listed words, or their plain "-s" plurals; never a guessed inflection
+    return word in vocabulary or (_PLURAL.search(word) is not None and word[:-1] in vocabulary)
+
+
+def edit_candidates(word, vocabulary=WORDLIST):
+    """Returns the listed words (and their plain plurals) within edit distance 1 of word."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    edits = set()
+    for left, right in splits:
+        if right:
+            edits.add(left + right[1:])
+            edits.update(left + c + right[1:] for c in _LETTERS)
+        if len(right) > 1:
+            edits.add(left + right[1] + right[0] + right[2:])
+        edits.update(left + c + right for c in _LETTERS)
+    return sorted(edit for edit in edits if _listed(edit, vocabulary))
+
+
+def _excerpt(text, start, end, width=30):
+    snippet = text[max(0, start - width):min(len(text), end + width)]
+    return " ".join(snippet.split())
+
+
+def _spelling_findings(text):
+    findings = []
+    seen = set()
+    for match in _WORD.finditer(text):
+        word = match.group(0)
+        lower = word.lower()
+        if lower in seen:
+            continue
+        if lower in MISSPELLINGS:
+            seen.add(lower)
+            findings.append(Finding("Spelling", f'"{word}" should be "{MISSPELLINGS[lower]}".',
+                                    _excerpt(text, match.start(), match.end())))
+        elif WORDLIST and word.islower() and len(word) > 3 and not known(lower):
+            seen.add(lower)
+            candidates = edit_candidates(lower)
+            if candidates:
+                findings.append(Finding("Spelling", f'"{word}" may be misspelt (did you mean: {", ".join(candidates[:3])}?).',
+                                        _excerpt(text, match.start(), match.end())))
+    return findings
+
+
+def _balance_findings(paragraph):
+    findings = []
+    for opening, closing in _QUOTE_PAIRS:
+        if paragraph.count(opening) != paragraph.count(closing):
+            findings.append(Finding("Punctuation", f'Unbalanced "{opening}{closing}".', _excerpt(paragraph, 0, 0, 60)))
+    if paragraph.count('"') % 2:
+        findings.append(Finding("Punctuation", "Unbalanced double quotes.", _excerpt(paragraph, 0, 0, 60)))
+    return findings
+
+
+def run_prefilter(text, paragraphs=None):
+    """Runs every deterministic rule over text and returns a list of Findings."""
+    findings = []
+    for category, pattern, describe in _REGEX_RULES:
+        for match in pattern.finditer(text):
+            findings.append(Finding(category, describe(match), _excerpt(text, match.start(), match.end())))
+
+    for match in _SENTENCE_START.finditer(text):
+        before = match.group(1).lstrip("([\"'“‘").rstrip(".")
+        if before.lower() in ABBREVIATIONS or _INITIALISM.match(before) or any(c.isdigit() for c in before):
+            continue
+        findings.append(Finding("Capitalisation", f'Sentence starts with lowercase "{match.group(2)}".',
+                                _excerpt(text, match.start(2), match.end(2))))
+
+    findings.extend(_spelling_findings(text))
+    for paragraph in paragraphs if paragraphs is not None else text.split("\n"):
+        findings.extend(_balance_findings(paragraph))
+    return findings
+
+
+def format_findings(findings):
+    """Formats prefilter findings as a Markdown section grouped by category."""
+    if not findings:
+        return "## Mechanical Issues (automated check)\n\nNo mechanical issues found."
+
+    grouped = {}
+    for finding in findings:
+        grouped.setdefault(finding.category, []).append(finding)
+
+    sections = ["## Mechanical Issues (automated check)"]
+    for category, items in grouped.items():
+        lines = [f"- {item.message} — “{item.excerpt}”" for item in items[:MAX_FINDINGS_PER_CATEGORY]]
+        if len(items) > MAX_FINDINGS_PER_CATEGORY:
+            lines.append(f"- ...and {len(items) - MAX_FINDINGS_PER_CATEGORY} more.")
+        sections.append(f"### {category} ({len(items)})\n\n" + "\n".join(lines))
+    return "\n\n".join(sections)
@@ -1,27 +1,46 @@
 from utils.groq_integration import GroqClient
+from utils.model_router import declare_tool, routed_response, routed_response_async
+from utils.prompt_registry import get_prompt, ToolResult
+from utils.circuit_breaker import DEGRADED_NOTE
+from tools.citation_engine import analyze_references, format_report, normalize_style, summarize_for_prompt
 
-def reference_check(groq_client, assignment_text, module_text, reference_style):
-    prompt = f"""
-Analyze the references in the following assignment based on the required referencing style ({reference_style}). Check for the following:
-
-1. **Completeness of Required References**: Ensure all necessary citations from the module materials are included. List any missing references that are essential for supporting the arguments.
-2. **Formatting Accuracy**: Verify that all references adhere to the specified style ({reference_style}), checking for consistent formatting in author names, publication dates, titles, and source information.
-3. **In-Text Citations**: Check that all in-text citations match the reference list and are correctly formatted.
-4. **Consistency of Style**: Ensure consistency in referencing throughout the document, noting any variations in style or incomplete references.
+TOOL = declare_tool("reference_check", output_tokens=1200, temperature=0.2)
 
-Instructions:
+# Reports built entirely by the citation engine carry this version instead of a prompt hash.
+LOCAL_VERSION = "citation_engine@1"
 
-- Provide your report in Markdown format.
-- Use clear headings and bullet points under each category.
-- If any specific corrections are required, include examples.
+def _prepare(assignment_text, module_text, reference_style):
+    """Runs the citation engine; returns (local report or None, template, messages)."""
+    style = normalize_style(reference_style)
+    findings = analyze_references(assignment_text, module_text, style or reference_style)
+    if style:
+        return ToolResult(format_report(findings), LOCAL_VERSION), None, None
+    template = get_prompt("reference_check")
+    messages = template.messages(reference_style=reference_style, findings=summarize_for_prompt(findings))
+    return None, template, messages
 
-Module Materials:
-{module_text}
+def reference_check(groq_client, assignment_text, module_text, reference_style):
+    """
+    Checks references with the local citation engine. Supported styles are reported without
+    an LLM call; other styles send only the parsed findings to the LLM.
+    """
+    local_report, template, messages = _prepare(assignment_text, module_text, reference_style)
+    if local_report is not None:
+        return local_report
+    response = routed_response(groq_client, messages, tool=TOOL)
+    return ToolResult(response, template.version)
 
-Assignment:
-{assignment_text}
+async def reference_check_async(groq_client, assignment_text, module_text, reference_style):
+    """reference_check for the async LLM client."""
+    local_report, template, messages = _prepare(assignment_text, module_text, reference_style)
+    if local_report is not None:
+        return local_report
+    response = await routed_response_async(groq_client, messages, tool=TOOL)
+    return ToolResult(response, template.version)
 
-Provide a detailed and structured reference check report.
-"""
-    response = groq_client.get_groq_response([{"role": "user", "content": prompt}])
-    return response
+def reference_check_local(assignment_text, module_text, reference_style):
+    """Degraded-mode reference report (LLM unavailable): the citation engine's findings on their own."""
+    style = normalize_style(reference_style)
+    findings = analyze_references(assignment_text, module_text, style or reference_style)
+    report = format_report(findings)
+    return ToolResult(report if style else f"{DEGRADED_NOTE}\n\n{report}", LOCAL_VERSION)
@@ -0,0 +1,535 @@
+# utils/analysis.py
+
+import io
+import json
+import os
+import time
+import asyncio
+import logging
+import threading
+from zipfile import ZipFile
+from collections import namedtuple
+
+from utils.report_service import render_report_pdf
+from utils.report_store import (
+    save_reports, get_report, find_report, parse_score, parse_criteria, STATUS_OK, STATUS_ERROR, STATUS_QUEUED,
+)
+from utils.cohort_analytics import save_scores
+from utils.database import transaction
+from utils.storage import content_hash
+from utils.module_dedup import dedup_modules
+from utils.course_digest import brief_digest, brief_digest_async, module_digest, module_digest_async
+from utils.circuit_breaker import CircuitOpenError
+from utils.scheduler import PDF_SCHEDULER, BATCH, scheduling
+from utils.run_journal import (
+    task_id, journaled_outcome, journaled_response, record_response, record_outcome, finish_run, claim_run, heartbeat,
+    RunLost,
+)
+from utils.task_queue import defer_tasks, queued_count, claim_deferred, release_deferred, finish_deferred
+from tools.compliance_checks import (
+    check_assessment_compliance, check_assessment_compliance_async,
+    check_module_compliance, check_module_compliance_async,
+)
+from tools.grammar_check import grammar_check, grammar_check_async, grammar_check_local
+from tools.critical_writing_check import critical_writing_check, critical_writing_check_async
+from tools.reference_check import reference_check, reference_check_async, reference_check_local
+
+# The analysis pipeline shared by the Flask app (main.py) and the async app (asgi.py):
+# plan one task per (assignment, report), run it, write its PDF and record the outcome
+# in the report repository the routes read from.
+#
+# Degraded mode: when the LLM circuit is open (utils/circuit_breaker.py) a task fails fast;
+# it gets the tool's local-only report where there is one (LOCAL_TOOLS) or a queued
+# placeholder, and its LLM part goes to the deferred task queue, which a background drainer
+# runs once calls get through again.
+#
+# LLM calls and PDF renders wait for slots from the schedulers in utils/scheduler.py; the
+# routes run their tasks in the interactive class, the deferred queue in the batch class.
+#
+# Jobs are checkpointed in the run journal (utils/run_journal.py): run_checkpointed skips
+# tasks the journal has finished and reuses LLM answers it already holds, which is how
+# resume_job picks up a job whose worker died. A worker whose job was claimed by another
+# gets RunLost from its next checkpoint and stops.
+
+logger = logging.getLogger(__name__)
+
+# Report title -> (PDF heading, filename suffix)
+REPORT_TYPES = {
+    "Assessment Brief Compliance": ("Assessment Brief Compliance", "Assessment_Brief_Compliance"),
+    "Module Materials Compliance": ("Module Materials Compliance", "Module_Materials_Compliance"),
+    "Grammar Check": ("Grammar_Check", "Grammar_Check"),
+    "Critical Writing Check": ("Critical_Writing_Check", "Critical_Writing_Check"),
+    "Reference Check": ("Reference_Check", "Reference_Check"),
+}
+
+# Report title -> (sync tool, async tool)
+TOOLS = {
+    "Assessment Brief Compliance": (check_assessment_compliance, check_assessment_compliance_async),
+    "Module Materials Compliance": (check_module_compliance, check_module_compliance_async),
+    "Grammar Check": (grammar_check, grammar_check_async),
+    "Critical Writing Check": (critical_writing_check, critical_writing_check_async),
+    "Reference Check": (reference_check, reference_check_async),
+}
+
+# Report title -> tool that works without the LLM, for degraded mode
+LOCAL_TOOLS = {
+    "Grammar Check": grammar_check_local,
+    "Reference Check": reference_check_local,
+}
+
+NO_STYLE_MESSAGE = "🛑 No reference style provided."
+QUEUED_MESSAGE = "⏳ The AI service is unavailable right now; this report is queued and will be completed automatically."
+DRAIN_BACKOFF = 5.0  # Seconds between drain attempts when the queue makes no progress
+NO_TEXT_MESSAGE = "No text could be extracted from the assignment."
+
+Task = namedtuple("Task", ["assignment", "title", "args", "kwargs"])
+Outcome = namedtuple("Outcome", [
+    "task", "pdf_path", "error", "prompt_version", "score", "criteria", "content_hash", "llm_seconds", "pdf_seconds",
+    "deferred",  # Reports folder the task's LLM part is queued to run into later; None when it ran
+], defaults=(None,))
+
+
+def tool_selection(form):
+    """Reads the analysis form into selected_tools; returns (selected_tools, error message or None)."""
+    compliance_check = "compliance_check" in form
+    reference_check_option = "reference_check" in form
+    selected_compliance_checks = []
+    if compliance_check:
+        if "assessment_brief_compliance" in form:
+            selected_compliance_checks.append("assessment_brief")
+        if "module_materials_compliance" in form:
+            selected_compliance_checks.append("module_materials")
+        if not selected_compliance_checks:
+            return None, "🛑 Please select at least one compliance check option."
+    selected_tools = {
+        "compliance_checks": selected_compliance_checks,
+        "grammar_check": "grammar_check" in form,
+        "critical_writing_check": "critical_writing_check" in form,
+        "reference_check": reference_check_option,
+        "reference_style": form.get("reference_style") if reference_check_option else None,
+    }
+    if not any([compliance_check, selected_tools["grammar_check"], selected_tools["critical_writing_check"], reference_check_option]):
+        return None, "🛑 Please select at least one tool to analyze."
+    return selected_tools, None
+
+
+def _wants_brief(selected_tools, briefs_text):
+    return "assessment_brief" in selected_tools["compliance_checks"] and bool(briefs_text)
+
+
+def _wants_module(selected_tools, modules_text):
+    return "module_materials" in selected_tools["compliance_checks"] and bool(modules_text)
+
+
+def course_context(groq_client, selected_tools, briefs_text, modules_text, upload_folder):
+    """Builds the course-level digests the compliance checks use; (None, None) parts fall back to raw text."""
+    brief_checklist = module_concepts = None
+    if _wants_brief(selected_tools, briefs_text):
+        try:
+            brief_name, brief_text = next(iter(briefs_text.items()))
+            brief_checklist = brief_digest(groq_client, brief_text, {brief_name: os.path.join(upload_folder, brief_name)})
+        except Exception as e:
+            logger.error(f"Error building brief digest, falling back to the full brief: {e}")
+    if _wants_module(selected_tools, modules_text):
+        try:
+            module_concepts = module_digest(groq_client, modules_text)
+        except Exception as e:
+            logger.error(f"Error building module digest, falling back to the full materials: {e}")
+    return brief_checklist, module_concepts
+
+
+async def course_context_async(groq_client, selected_tools, briefs_text, modules_text, upload_folder):
+    """course_context for the async LLM client; both digests are built concurrently."""
+
+    async def brief():
+        try:
+            brief_name, brief_text = next(iter(briefs_text.items()))
+            return await brief_digest_async(groq_client, brief_text, {brief_name: os.path.join(upload_folder, brief_name)})
+        except Exception as e:
+            logger.error(f"Error building brief digest, falling back to the full brief: {e}")
+
+    async def module():
+        try:
+            return await module_digest_async(groq_client, modules_text)
+        except Exception as e:
+            logger.error(f"Error building module digest, falling back to the full materials: {e}")
+
+    async def skip():
+        return None
+
+    return tuple(await asyncio.gather(
+        brief() if _wants_brief(selected_tools, briefs_text) else skip(),
+        module() if _wants_module(selected_tools, modules_text) else skip(),
+    ))
+
+
+def draft_key(draft_scope, assignment_name):
+    """Grammar draft id of a submitter's file within a cohort; None (no draft reuse) without a scope."""
+    if not draft_scope:
+        return None
+    return content_hash(json.dumps([*draft_scope, assignment_name]))
+
+
+def plan_tasks(assignments_text, selected_tools, briefs_text, modules_text, brief_checklist=None, module_concepts=None,
+               draft_scope=None):
+    """Lists one Task per (assignment, selected report).
+
+    draft_scope is (cohort id, submitter id): a file's previous grammar draft is only looked up
+    among the same submitter's uploads to the same cohort."""
+    # Slides, handouts and reading lists repeat each other; prompts get one copy of each paragraph
+    combined_module_text = dedup_modules(modules_text).text
+    tasks = []
+    for assignment_name, assignment_text in assignments_text.items():
+        if "assessment_brief" in selected_tools["compliance_checks"]:
+            # Assuming the first assessment brief corresponds to the assignment
+            brief_text = brief_checklist or next(iter(briefs_text.values()), "")
+            tasks.append(Task(assignment_name, "Assessment Brief Compliance", (assignment_text, brief_text), {}))
+        if "module_materials" in selected_tools["compliance_checks"]:
+            module_text = module_concepts or combined_module_text
+            tasks.append(Task(assignment_name, "Module Materials Compliance", (assignment_text, module_text), {}))
+        if selected_tools["grammar_check"]:
+            # Resubmissions of the same file only re-check changed paragraphs
+            draft_id = draft_key(draft_scope, assignment_name)
+            tasks.append(Task(assignment_name, "Grammar Check", (assignment_text,), {"draft_id": draft_id} if draft_id else {}))
+        if selected_tools["critical_writing_check"]:
+            tasks.append(Task(assignment_name, "Critical Writing Check", (assignment_text,), {}))
+        if selected_tools["reference_check"] and selected_tools["reference_style"]:
+            tasks.append(Task(
+                assignment_name, "Reference Check", (assignment_text, combined_module_text),
+                {"reference_style": selected_tools["reference_style"]},
+            ))
+    return tasks
+
+
+def write_report_pdf(reports_folder, assignment_name, title, content):
+    """Renders a report to <reports_folder>/<assignment>_<suffix>.pdf and returns its path."""
+    pdf_title, suffix = REPORT_TYPES[title]
+    pdf_bytes = render_report_pdf(pdf_title, str(content))
+    pdf_path = os.path.abspath(os.path.join(reports_folder, f"{assignment_name}_{suffix}.pdf"))
+    with open(pdf_path, "wb") as f:
+        f.write(pdf_bytes)
+    return pdf_path
+
+
+def _failed(task, e):
+    logger.error(f"Error in {task.title} for {task.assignment}: {e}")
+    return Outcome(task, None, f"🛑 Error: {e}", None, None, None, None, None, None)
+
+
+def _succeeded(task, response, pdf_path, started, llm_done):
+    return Outcome(
+        task, pdf_path, None, getattr(response, "prompt_version", None), parse_score(response),
+        parse_criteria(response), content_hash(str(response)), llm_done - started, time.perf_counter() - llm_done,
+    )
+
+
+def degraded_outcome(task, reports_folder, reason):
+    """Outcome for a task the LLM could not take: the local-only report if the tool has one, queued either way."""
+    logger.warning(f"{task.title} for {task.assignment} deferred: {reason}")
+    local_tool = LOCAL_TOOLS.get(task.title)
+    if local_tool is not None:
+        try:
+            response = local_tool(*task.args, **task.kwargs)
+            pdf_path = write_report_pdf(reports_folder, task.assignment, task.title, response)
+            return Outcome(
+                task, pdf_path, None, getattr(response, "prompt_version", None), parse_score(response),
+                parse_criteria(response), content_hash(str(response)), None, None, reports_folder,
+            )
+        except Exception as e:
+            logger.error(f"Error in local {task.title} for {task.assignment}: {e}")
+    return Outcome(task, None, QUEUED_MESSAGE, None, None, None, None, None, None, reports_folder)
+
+
+def run_task(groq_client, task, reports_folder, tid=None):
+    """Runs one task and writes its PDF; errors become '🛑 Error: ...' outcomes.
+
+    With a journal task id, an LLM answer checkpointed earlier is reused and a new one is checkpointed."""
+    # Nothing to grade (e.g. a scan OCR could not read): fail without spending an LLM call
+    if not task.args[0].strip():
+        return _failed(task, NO_TEXT_MESSAGE)
+    try:
+        started = time.perf_counter()
+        response = journaled_response(tid) if tid else None
+        if response is None:
+            response = TOOLS[task.title][0](groq_client, *task.args, **task.kwargs)
+            if tid:
+                record_response(tid, response)
+        llm_done = time.perf_counter()
+        with PDF_SCHEDULER.slot():
+            pdf_path = write_report_pdf(reports_folder, task.assignment, task.title, response)
+        return _succeeded(task, response, pdf_path, started, llm_done)
+    except CircuitOpenError as e:
+        return degraded_outcome(task, reports_folder, str(e))
+    except RunLost:
+        raise
+    except Exception as e:
+        return _failed(task, e)
+
+
+async def run_task_async(groq_client, task, reports_folder, executor=None, tid=None):
+    """run_task for the async LLM client; the PDF is rendered on executor."""
+    # Nothing to grade (e.g. a scan OCR could not read): fail without spending an LLM call
+    if not task.args[0].strip():
+        return _failed(task, NO_TEXT_MESSAGE)
+    try:
+        started = time.perf_counter()
+        response = await asyncio.to_thread(journaled_response, tid) if tid else None
+        if response is None:
+            response = await TOOLS[task.title][1](groq_client, *task.args, **task.kwargs)
+            if tid:
+                await asyncio.to_thread(record_response, tid, response)
+        llm_done = time.perf_counter()
+        async with PDF_SCHEDULER.slot_async():
+            pdf_path = await asyncio.get_running_loop().run_in_executor(
+                executor, write_report_pdf, reports_folder, task.assignment, task.title, str(response)
+            )
+        return _succeeded(task, response, pdf_path, started, llm_done)
+    except CircuitOpenError as e:
+        return await asyncio.get_running_loop().run_in_executor(executor, degraded_outcome, task, reports_folder, str(e))
+    except RunLost:
+        raise
+    except Exception as e:
+        return _failed(task, e)
+
+
+def run_checkpointed(groq_client, job_id, task, reports_folder):
+    """run_task for a journaled job: a task the journal has finished is replayed, not run again."""
+    tid = task_id(job_id, task)
+    fields = journaled_outcome(tid)
+    if fields is not None:
+        return Outcome(task, *fields)
+    with heartbeat(job_id):
+        outcome = run_task(groq_client, task, reports_folder, tid)
+    record_outcome(tid, list(outcome[1:]))
+    return outcome
+
+
+async def run_checkpointed_async(groq_client, job_id, task, reports_folder, executor=None):
+    """run_checkpointed for the async LLM client."""
+    tid = task_id(job_id, task)
+    fields = await asyncio.to_thread(journaled_outcome, tid)
+    if fields is not None:
+        return Outcome(task, *fields)
+    with heartbeat(job_id):
+        outcome = await run_task_async(groq_client, task, reports_folder, executor, tid)
+    await asyncio.to_thread(record_outcome, tid, list(outcome[1:]))
+    return outcome
+
+
+def resume_job(groq_client, job_id, priority=BATCH, force=False):
+    """Claims an interrupted job and runs its unfinished tasks; returns (run, queued count), or None
+    if the job is finished, unknown or still running elsewhere."""
+    run = claim_run(job_id, Task, force)
+    if run is None:
+        return None
+    logger.info(f"Resuming job {job_id}: {run.finished}/{len(run.tasks)} task(s) already done")
+    with scheduling(priority, run.user_id):
+        outcomes = [run_checkpointed(groq_client, job_id, task, run.reports_folder) for task in run.tasks]
+    queued = save_outcomes(
+        run.user_id, job_id, run.assignments_text, run.selected_tools, outcomes, run.cohort_id, run.submitter_id
+    )
+    return run, queued
+
+
+async def resume_job_async(groq_client, job_id, priority=BATCH, force=False, executor=None):
+    """resume_job for the async LLM client; the unfinished tasks run concurrently."""
+    run = await asyncio.to_thread(claim_run, job_id, Task, force)
+    if run is None:
+        return None
+    logger.info(f"Resuming job {job_id}: {run.finished}/{len(run.tasks)} task(s) already done")
+    with scheduling(priority, run.user_id):
+        outcomes = await asyncio.gather(*(
+            run_checkpointed_async(groq_client, job_id, task, run.reports_folder, executor) for task in run.tasks
+        ))
+    queued = await asyncio.to_thread(
+        save_outcomes, run.user_id, job_id, run.assignments_text, run.selected_tools, outcomes, run.cohort_id,
+        run.submitter_id,
+    )
+    return run, queued
+
+
+def save_outcomes(user_id, job_id, assignments_text, selected_tools, outcomes, cohort_id=None, submitter_id=None):
+    """Records a job's outcomes (and reports that could not run) in the report repository,
+    and their scores in the cohort's score store under submitter_id (default user_id)."""
+    submitter_id = submitter_id or user_id
+    records = [_report_record(outcome) for outcome in outcomes]
+    if selected_tools["reference_check"] and not selected_tools["reference_style"]:
+        for assignment_name in assignments_text:
+            logger.warning(f"No reference style provided for Reference Check in {assignment_name}.")
+            records.append({"assignment": assignment_name, "tool": "Reference Check", "status": STATUS_ERROR, "error": NO_STYLE_MESSAGE})
+    for record in records:
+        record.update(user_id=user_id, job_id=job_id)
+    deferred = [(outcome.task, outcome.deferred) for outcome in outcomes if outcome.deferred]
+    # One transaction, closed by the fenced finish_run: a worker that lost the job to another
+    # (RunLost) writes nothing over its successor's results
+    with transaction():
+        save_reports(records)
+        save_scores(cohort_id or job_id, submitter_id, job_id, outcomes)
+        if deferred:
+            defer_tasks(user_id, submitter_id, job_id, cohort_id or job_id, deferred)
+        finish_run(job_id)
+    return len(deferred)
+
+
+def _report_record(outcome):
+    if outcome.deferred and not outcome.pdf_path:
+        status = STATUS_QUEUED
+    else:
+        status = STATUS_ERROR if outcome.error else STATUS_OK
+    return {
+        "assignment": outcome.task.assignment,
+        "tool": outcome.task.title,
+        "status": status,
+        "prompt_version": outcome.prompt_version,
+        "score": outcome.score,
+        "content_hash": outcome.content_hash,
+        "pdf_path": outcome.pdf_path,
+        "error": outcome.error,
+        "llm_seconds": outcome.llm_seconds,
+        "pdf_seconds": outcome.pdf_seconds,
+    }
+
+
+def _settle(item, outcome):
+    """Replaces a deferred task's placeholder report with its outcome; False if it has to wait again."""
+    if outcome.deferred:
+        release_deferred(item.id)
+        return False
+    record = _report_record(outcome)
+    record.update(user_id=item.user_id, job_id=item.job_id)
+    save_reports([record])
+    save_scores(item.cohort_id or item.job_id, item.submitter_id, item.job_id, [outcome])
+    finish_deferred(item.id)
+    logger.info(f"Deferred {item.task.title} for {item.task.assignment} completed after {item.attempts} retry(ies)")
+    return True
+
+
+def run_deferred(groq_client, limit=1):
+    """Runs up to limit queued tasks, oldest first, in the batch class; returns how many completed."""
+    completed = 0
+    for item in claim_deferred(Task, limit):
+        with scheduling(BATCH, item.user_id):
+            outcome = run_task(groq_client, item.task, item.reports_folder)
+        if _settle(item, outcome):
+            completed += 1
+    return completed
+
+
+async def run_deferred_async(groq_client, limit=1, executor=None):
+    """run_deferred for the async LLM client."""
+    completed = 0
+    for item in await asyncio.to_thread(claim_deferred, Task, limit):
+        with scheduling(BATCH, item.user_id):
+            outcome = await run_task_async(groq_client, item.task, item.reports_folder, executor)
+        if await asyncio.to_thread(_settle, item, outcome):
+            completed += 1
+    return completed
+
+
+def _next_drain_wait(groq_client, completed):
+    breaker = getattr(groq_client, "breaker", None)
+    wait = breaker.retry_in() if breaker is not None else 0.0
+    return wait if wait else (0.0 if completed else DRAIN_BACKOFF)
+
+
+def _drain(groq_client):
+    while queued_count():
+        try:
+            completed = run_deferred(groq_client)
+        except Exception as e:
+            logger.error(f"Error running deferred tasks: {e}")
+            completed = 0
+        time.sleep(_next_drain_wait(groq_client, completed))
+
+
+_drain_lock = threading.Lock()
+_drainer = None  # Thread (Flask) or asyncio.Task (ASGI) running the deferred queue
+
+
+def start_draining(groq_client):
+    """Starts this process's background thread that runs the deferred queue until it is empty."""
+    global _drainer
+    with _drain_lock:
+        if _drainer is None or not _drainer.is_alive():
+            _drainer = threading.Thread(target=_drain, args=(groq_client,), name="deferred-llm-tasks", daemon=True)
+            _drainer.start()
+
+
+async def _drain_async(groq_client, executor):
+    while await asyncio.to_thread(queued_count):
+        try:
+            completed = await run_deferred_async(groq_client, executor=executor)
+        except Exception as e:
+            logger.error(f"Error running deferred tasks: {e}")
+            completed = 0
+        await asyncio.sleep(_next_drain_wait(groq_client, completed))
+
+
+def start_draining_async(groq_client, executor=None):
+    """start_draining for the async app: the drainer is a task on the running event loop."""
+    global _drainer
+    if _drainer is None or _drainer.done():
+        _drainer = asyncio.get_running_loop().create_task(_drain_async(groq_client, executor))
+
+
+def reports_by_assignment(records):
+    """Groups report records as {assignment: [records]} in report order."""
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record.assignment, []).append(record)
+    return grouped
+
+
+def requested_report(user_id, job_id, report_id=None, assignment=None, report=None):
+    """The report a view request points at: by id, or by (assignment, report type) in the user's current job."""
+    if report_id:
+        return get_report(int(report_id), user_id=user_id) if str(report_id).isdigit() else None
+    if job_id and assignment and report:
+        record = find_report(job_id, assignment, report.replace("_", " "))
+        return record if record is not None and record.user_id == user_id else None
+    return None
+
+
+# download_tool -> (report titles, archive folder, label)
+DOWNLOAD_GROUPS = {
+    "compliance": (("Assessment Brief Compliance", "Module Materials Compliance"), "Compliance", "Compliance"),
+    "grammar": (("Grammar Check",), "Grammar", "Grammar"),
+    "critical_writing": (("Critical Writing Check",), "Critical_Writing", "Critical Writing"),
+    "reference": (("Reference Check",), "Reference", "Reference"),
+}
+
+
+def download_tools(download_tool):
+    """Report titles a download option covers."""
+    groups = DOWNLOAD_GROUPS.values() if download_tool == "all" else [DOWNLOAD_GROUPS[download_tool]]
+    return [title for titles, _, _ in groups for title in titles]
+
+
+def report_files(records, download_tool):
+    """Lists (pdf path, archive name, label) for every generated report among records."""
+    folders = {title: (folder, label) for titles, folder, label in DOWNLOAD_GROUPS.values() for title in titles}
+    files = []
+    for record in records:
+        if record.status != STATUS_OK or not record.pdf_path:
+            continue
+        folder, label = folders[record.tool]
+        pdf_filename = os.path.basename(record.pdf_path)
+        arcname = f"{record.assignment}/{folder}/{pdf_filename}" if download_tool == "all" else pdf_filename
+        files.append((record.pdf_path, arcname, label))
+    return files
+
+
+def zip_reports(files):
+    """Zips the listed reports; returns (zip bytes or None if nothing was found, [(filename, label)] missing)."""
+    buffer = io.BytesIO()
+    missing = []
+    written = 0
+    with ZipFile(buffer, "w") as zip_file:
+        for pdf_path, arcname, label in files:
+            try:
+                zip_file.write(pdf_path, arcname=arcname)
+                written += 1
+            except FileNotFoundError:
+                missing.append((os.path.basename(pdf_path), label))
+                logger.error(f"{label} report file not found: {pdf_path}")
+    return (buffer.getvalue() if written else None), missing
@@ -0,0 +1,133 @@
+# utils/circuit_breaker.py
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+# Circuit breaker for the LLM path. While the provider is failing or crawling, every call
+# would otherwise wait out its own timeout; once enough recent calls have failed or been
+# slow, the breaker opens and calls fail at once with CircuitOpenError. After a rest period
+# it lets a probe call through (half-open): a healthy probe closes it, a bad one reopens it.
+# The analysis pipeline treats CircuitOpenError as the signal for degraded mode.
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+WINDOW_SECONDS = 60.0  # Calls older than this no longer count
+MIN_CALLS = 5  # Calls in the window before the rates below are trusted
+ERROR_RATE = 0.5  # Share of failed calls that opens the breaker
+SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", "45"))
+SLOW_RATE = 0.5  # Share of slow calls that opens the breaker
+OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))  # Rest before the first probe
+HALF_OPEN_PROBES = 1  # Concurrent probe calls while half-open
+
+# Heads reports built without the LLM while the breaker is open
+DEGRADED_NOTE = "> ⏳ Automatic checks only: the AI review is queued and this report will be replaced when the service is back."
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the breaker is open."""
+    def __init__(self, retry_in):
+        super().__init__(f"LLM service unavailable (circuit open, next probe in {retry_in:.0f}s)")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Closed -> open on error or slow-call rate -> half-open probes -> closed (or open again)."""
+    def __init__(self, name="llm", open_seconds=OPEN_SECONDS, slow_call_seconds=SLOW_CALL_SECONDS):
+        self.name = name
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.trips = 0
+        self.rejected = 0
+        self._calls = deque()  # (finished at, failed, slow)
+        self._lock = threading.Lock()
+
+    def _refresh(self, now):
+        if self.state == OPEN and now >= self.opened_at + self.open_seconds:
+            self.state = HALF_OPEN
+            self.probes = 0
+        while self._calls and self._calls[0][0] < now - WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._calls.clear()
+        logger.warning(f"Circuit {self.name} opened ({reason}); failing fast for {self.open_seconds:.0f}s")
+
+    def retry_in(self):
+        """Seconds until calls are let through again (0 when they are now)."""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            if self.state == OPEN:
+                return self.opened_at + self.open_seconds - now
+            return 0.0
+
+    def before_call(self):
+        """Lets a call through (reserving a probe when half-open) or raises CircuitOpenError."""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self.probes < HALF_OPEN_PROBES:
+                self.probes += 1
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.opened_at + self.open_seconds - now) if self.state == OPEN else 1.0
+        raise CircuitOpenError(retry_in)
+
+    def record(self, seconds, failed):
+        """Records a finished call that before_call let through."""
+        now = time.monotonic()
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            self._refresh(now)
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+                if failed or slow:
+                    self._open(now, f"probe {'failed' if failed else f'took {seconds:.0f}s'}")
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuit {self.name} closed after a healthy probe")
+                return
+            if self.state == OPEN:
+                return  # A call started before the breaker opened
+            self._calls.append((now, failed, slow))
+            total = len(self._calls)
+            if total < MIN_CALLS:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures >= ERROR_RATE * total:
+                self._open(now, f"{failures}/{total} calls failed")
+            elif slow_calls >= SLOW_RATE * total:
+                self._open(now, f"{slow_calls}/{total} calls slower than {self.slow_call_seconds:.0f}s")
+
+    def release(self):
+        """Gives back a call that before_call let through but that says nothing about the
+        provider's health (no backend was tried): its probe is freed and nothing is recorded."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+
+    def stats(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "window_calls": len(self._calls),
+                "window_failures": sum(1 for _, f, _ in self._calls if f),
+            }
@@ -0,0 +1,54 @@
+# utils/cli.py
+
+import asyncio
+import logging
+
+import click
+
+from utils.run_journal import interrupted_runs
+from utils.analysis import resume_job, resume_job_async
+from utils.similarity import index_submissions
+
+# Command-line tools shared by the Flask app (main.py) and the Quart app (asgi.py). Each
+# command closes over its app instead of relying on the framework's app context, so the same
+# command runs under `flask --app main` and `quart --app asgi`. For the async app, the jobs
+# are resumed in one asyncio.run, outside any event loop.
+
+logger = logging.getLogger(__name__)
+
+
+def _report(job_id, result):
+    if result is None:
+        click.echo(f"{job_id}: not resumable (finished, unknown or still running; see --force)")
+        return
+    run, queued = result
+    # Each submission is checked against the rest of the cohort through the LSH index
+    try:
+        index_submissions(run.cohort_id, run.submitter_id, job_id, run.assignments_text)
+    except Exception as e:
+        logger.error(f"Error indexing submissions for similarity: {e}")
+    click.echo(f"{job_id}: {len(run.tasks) - run.finished} task(s) run, {run.finished} replayed from the journal"
+               + (f", {queued} queued until the AI service is back" if queued else ""))
+
+
+async def _resume_all_async(groq_client, job_ids, force):
+    for job_id in job_ids or await asyncio.to_thread(interrupted_runs, force=force):
+        result = await resume_job_async(groq_client, job_id, force=force)
+        await asyncio.to_thread(_report, job_id, result)
+
+
+def resume_command(app, asynchronous=False):
+    """The `resume` command for app; asynchronous when the app's LLM client is the async one."""
+    @click.command('resume')
+    @click.argument('job_ids', nargs=-1)
+    @click.option('--force', is_flag=True, help='Also take over jobs that still look active (e.g. right after a restart).')
+    def command(job_ids, force):
+        """Resumes interrupted analysis jobs: JOB_IDS, or every job whose worker went quiet."""
+        groq_client = app.extensions['groq_client']
+        if asynchronous:
+            asyncio.run(_resume_all_async(groq_client, job_ids, force))
+            return
+        for job_id in job_ids or interrupted_runs(force=force):
+            _report(job_id, resume_job(groq_client, job_id, force=force))
+
+    return command
@@ -0,0 +1,201 @@
+# utils/cohort_analytics.py
+
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from utils.database import connect, register_schema, transaction
+from utils.storage import content_hash
+
+# Numeric score store and cohort statistics. Scores are parsed out of the report text once,
+# when a job is saved, into one row per (submission, tool, criterion); analytics load a
+# cohort's rows as columns and aggregate them with pandas. A cohort is every submission
+# graded against the same assessment brief.
+#
+# numpy/pandas are imported on first use so they stay out of the apps' cold start.
+#
+# Rows are keyed by the submitter (the browser session's submitter id, which survives the
+# fresh user id of each upload), so a resubmission replaces the earlier scores instead of
+# counting the same student twice.
+#
+# Aggregates are anonymous; outliers name submissions, so submitters only see their own
+# (submitter_view).
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS scores (
+    cohort_id TEXT NOT NULL,
+    submitter_id TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    criterion TEXT NOT NULL,
+    score REAL NOT NULL,
+    out_of REAL NOT NULL,
+    job_id TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (cohort_id, submitter_id, assignment, tool, criterion)
+);
+""")
+
+OVERALL = ""  # criterion of a report's overall score
+CORRELATED_TOOLS = ("Grammar Check", "Critical Writing Check")
+OUTLIER_IQR_FACTOR = 1.5
+OUTLIER_MIN_SPREAD = 1.0  # Scores are coarse; an IQR of 0 would make every other score an outlier
+OUTLIER_LIMIT = 50  # Per tool, most extreme first
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cohort_key(briefs_text, job_id):
+    """Cohort id for a job: the hash of its assessment brief(s), or the job itself without one."""
+    if not briefs_text:
+        return job_id
+    return content_hash("\n".join(text for _, text in sorted(briefs_text.items())))[:16]
+
+
+def save_scores(cohort_id, submitter_id, job_id, outcomes, path=None):
+    """Stores the overall and per-criterion scores of successful outcomes; a resubmission by the
+    same submitter replaces the rows of each (assignment, tool) it scored."""
+    now = time.time()
+    rows, replaced = [], set()
+    for outcome in outcomes:
+        if outcome.error:
+            continue
+        task = outcome.task
+        scores = dict(outcome.criteria or {})
+        if outcome.score is not None:
+            scores[OVERALL] = (outcome.score, 10.0)
+        if scores:
+            replaced.add((cohort_id, submitter_id, task.assignment, task.title))
+        for criterion, (score, out_of) in scores.items():
+            rows.append((cohort_id, submitter_id, task.assignment, task.title, criterion, score, out_of, job_id, now))
+    if not rows:
+        return
+    with transaction(path) as conn:
+        # Criteria the new report no longer has must not linger from the previous one
+        conn.executemany(
+            "DELETE FROM scores WHERE cohort_id = ? AND submitter_id = ? AND assignment = ? AND tool = ?", replaced
+        )
+        conn.executemany("INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def _version(conn, cohort_id):
+    # A resubmission deletes rows and may reuse their rowids, so writes are told apart by time
+    return conn.execute("SELECT COUNT(*), MAX(saved_at) FROM scores WHERE cohort_id = ?", (cohort_id,)).fetchone()
+
+
+def _number(value, digits=3):
+    value = float(value)
+    return None if math.isnan(value) else round(value, digits)
+
+
+def _tool_stats(overall):
+    grouped = overall.groupby("tool", observed=True)["score"]
+    stats = grouped.agg(["count", "mean", "median", "std", "min", "max"])
+    quartiles = grouped.quantile([0.25, 0.75]).unstack()
+    stats["q1"], stats["q3"] = quartiles[0.25], quartiles[0.75]
+    return {
+        tool: {name: (int(value) if name == "count" else _number(value)) for name, value in row.items()}
+        for tool, row in stats.iterrows()
+    }, quartiles
+
+
+def _criterion_stats(criteria):
+    criteria = criteria.assign(normalised=10.0 * criteria["score"] / criteria["out_of"])
+    stats = criteria.groupby(["tool", "criterion"], observed=True).agg(
+        count=("score", "size"), mean=("score", "mean"), median=("score", "median"),
+        out_of=("out_of", "max"), mean_of_10=("normalised", "mean"),
+    )
+    breakdown = {}
+    for (tool, criterion), row in stats.iterrows():
+        breakdown.setdefault(tool, {})[criterion] = {
+            "count": int(row["count"]), "mean": _number(row["mean"]), "median": _number(row["median"]),
+            "out_of": _number(row["out_of"]), "mean_of_10": _number(row["mean_of_10"]),
+        }
+    return breakdown
+
+
+def _outliers(overall, quartiles):
+    import numpy as np
+
+    frame = overall.join(quartiles, on="tool")
+    spread = np.maximum(frame[0.75] - frame[0.25], OUTLIER_MIN_SPREAD) * OUTLIER_IQR_FACTOR
+    low, high = frame[0.25] - spread, frame[0.75] + spread
+    distance = np.where(frame["score"] < low, low - frame["score"], np.where(frame["score"] > high, frame["score"] - high, 0.0))
+    flagged = frame.assign(distance=distance, side=np.where(frame["score"] < low, "low", "high"))
+    flagged = flagged[flagged["distance"] > 0].sort_values("distance", ascending=False)
+    outliers = {}
+    for tool, rows in flagged.groupby("tool", observed=True, sort=False):
+        outliers[tool] = [
+            {"assignment": assignment, "score": _number(score), "side": side, "job_id": job_id}
+            for assignment, score, side, job_id in rows[["assignment", "score", "side", "job_id"]].head(OUTLIER_LIMIT).itertuples(index=False)
+        ]
+    return outliers
+
+
+def _correlation(overall, tools=CORRELATED_TOOLS):
+    paired = overall[overall["tool"].isin(tools)].pivot_table(
+        index="submission", columns="tool", values="score", aggfunc="last", observed=True
+    )
+    if any(tool not in paired.columns for tool in tools):
+        return {"tools": list(tools), "n": 0, "pearson": None}
+    paired = paired[list(tools)].dropna()
+    pearson = paired[tools[0]].corr(paired[tools[1]]) if len(paired) >= 3 else float("nan")
+    return {"tools": list(tools), "n": int(len(paired)), "pearson": _number(pearson)}
+
+
+def _compute(cohort_id, rows):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows, columns=["submitter_id", "assignment", "tool", "criterion", "score", "out_of", "job_id"])
+    # Few distinct tools/criteria: categorical columns group on integer codes
+    frame = frame.astype({"tool": "category", "criterion": "category"})
+    frame["submission"] = frame.groupby(["submitter_id", "assignment"], sort=False).ngroup()
+    is_overall = frame["criterion"] == OVERALL
+    overall, criteria = frame[is_overall], frame[~is_overall]
+    tools, quartiles = _tool_stats(overall)
+    return {
+        "cohort_id": cohort_id,
+        "submissions": int(frame["submission"].max()) + 1,
+        "tools": tools,
+        "criteria": _criterion_stats(criteria),
+        "outliers": _outliers(overall, quartiles),
+        "correlation": _correlation(overall),
+    }
+
+
+def cohort_analytics(cohort_id, path=None):
+    """Score distributions, per-criterion breakdowns, outliers and the grammar/critical-writing
+    correlation for a cohort; None if it has no scores. Cached until the cohort's scores change."""
+    conn = connect(path)
+    version = _version(conn, cohort_id)
+    if not version[0]:
+        return None
+    key = (path, cohort_id)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+    rows = conn.execute(
+        "SELECT submitter_id, assignment, tool, criterion, score, out_of, job_id FROM scores WHERE cohort_id = ?", (cohort_id,)
+    ).fetchall()
+    result = _compute(cohort_id, rows)
+    with _cache_lock:
+        _cache[key] = (version, result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def submitter_view(result, job_ids):
+    """A cohort's analytics as shown to a submitter: the aggregates, and only the outliers among their own jobs."""
+    outliers = {}
+    for tool, rows in result["outliers"].items():
+        own = [{k: v for k, v in row.items() if k != "job_id"} for row in rows if row["job_id"] in job_ids]
+        if own:
+            outliers[tool] = own
+    return {**result, "outliers": outliers}
@@ -0,0 +1,122 @@
+# utils/course_digest.py
+
+import re
+import json
+import asyncio
+import logging
+
+from utils.file_processing import extract_tables
+from utils.model_router import declare_tool, routed_response, routed_response_async
+from utils.prompt_registry import get_prompt
+from utils.storage import content_hash, load_json, save_json
+from utils.module_dedup import dedup_modules
+
+# Course-level preprocessing: the assessment brief and the module pack are the same for
+# every student on a course, so they are condensed once into compact digests stored under
+# the content hash of their sources, and the per-student prompts carry the digests instead.
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_NAMESPACE = "course_digests"
+MODULE_CHUNK_CHARS = 60000  # ~15k tokens per summarisation call
+
+BRIEF_TOOL = declare_tool("brief_digest", output_tokens=900, temperature=0.2)
+MODULE_TOOL = declare_tool("module_digest", output_tokens=1200, temperature=0.2)
+
+_RUBRIC_HEADER = re.compile(r"criteri|weight|marks?\b|%|learning outcome|grade|band|distinction|excellent", re.IGNORECASE)
+
+
+def rubric_lines(tables, max_descriptor=160):
+    """Turns rubric-like tables into one compact line per criterion."""
+    lines = []
+    for table in tables:
+        if len(table) < 2 or not any(_RUBRIC_HEADER.search(cell) for cell in table[0]):
+            continue
+        header = table[0]
+        for row in table[1:]:
+            cells = [" ".join(cell.split()) for cell in row]
+            if not cells or not cells[0]:
+                continue
+            extras = [
+                f"{header[i]}: {cell[:max_descriptor]}"
+                for i, cell in enumerate(cells[1:], start=1)
+                if cell and i < len(header) and header[i]
+            ]
+            lines.append(f"- {cells[0]}" + (f" ({'; '.join(extras[:2])})" if extras else ""))
+    return lines
+
+
+def _cached(key):
+    cached = load_json(DIGESTS_NAMESPACE, key)
+    return cached["digest"] if cached else None
+
+
+def _store(key, digest, source_chars):
+    save_json(DIGESTS_NAMESPACE, key, {"digest": digest})
+    logger.info(f"Course digest {key[:20]} built: {source_chars} -> {len(digest)} characters")
+    return digest
+
+
+def _brief_request(brief_text, brief_files):
+    template = get_prompt("brief_digest")
+    key = f"brief:{content_hash(template.version + brief_text)}"
+    return template, key
+
+
+def _brief_messages(template, brief_text, brief_files):
+    tables = [table for file_tables in extract_tables(brief_files).values() for table in file_tables] if brief_files else []
+    rubric = "\n".join(rubric_lines(tables)) or "(no rubric tables found)"
+    return template.messages(rubric=rubric, brief_text=brief_text)
+
+
+def _module_request(module_texts):
+    template = get_prompt("module_digest")
+    key = f"module:{content_hash(template.version + json.dumps(module_texts, sort_keys=True))}"
+    combined = dedup_modules(module_texts).text
+    chunks = [combined[i:i + MODULE_CHUNK_CHARS] for i in range(0, len(combined), MODULE_CHUNK_CHARS)] or [""]
+    return template, key, combined, chunks
+
+
+def brief_digest(groq_client, brief_text, brief_files=None):
+    """Returns the requirement checklist for an assessment brief, building it on first use.
+
+    brief_files is anything extract_tables accepts; its rubric tables are parsed locally.
+    """
+    template, key = _brief_request(brief_text, brief_files)
+    digest = _cached(key)
+    if digest is None:
+        messages = _brief_messages(template, brief_text, brief_files)
+        digest = _store(key, routed_response(groq_client, messages, tool=BRIEF_TOOL), len(brief_text))
+    return digest
+
+
+async def brief_digest_async(groq_client, brief_text, brief_files=None):
+    """brief_digest for the async LLM client."""
+    template, key = _brief_request(brief_text, brief_files)
+    digest = _cached(key)
+    if digest is None:
+        messages = await asyncio.get_running_loop().run_in_executor(None, _brief_messages, template, brief_text, brief_files)
+        digest = _store(key, await routed_response_async(groq_client, messages, tool=BRIEF_TOOL), len(brief_text))
+    return digest
+
+
+def module_digest(groq_client, module_texts):
+    """Returns the concept/reading digest for a module pack ({filename: text}), building it on first use."""
+    template, key, combined, chunks = _module_request(module_texts)
+    digest = _cached(key)
+    if digest is None:
+        parts = [routed_response(groq_client, template.messages(module_text=chunk), tool=MODULE_TOOL) for chunk in chunks]
+        digest = _store(key, "\n\n".join(parts), len(combined))
+    return digest
+
+
+async def module_digest_async(groq_client, module_texts):
+    """module_digest for the async LLM client; chunks are summarised concurrently."""
+    template, key, combined, chunks = await asyncio.get_running_loop().run_in_executor(None, _module_request, module_texts)
+    digest = _cached(key)
+    if digest is None:
+        parts = await asyncio.gather(*(
+            routed_response_async(groq_client, template.messages(module_text=chunk), tool=MODULE_TOOL) for chunk in chunks
+        ))
+        digest = _store(key, "\n\n".join(parts), len(combined))
+    return digest
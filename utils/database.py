@@ -0,0 +1,77 @@
+# utils/database.py
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils.storage import DATA_DIR
+
+# One SQLite file for the server-side tables (reports, scores, ...). Each module declares
+# its own schema and registers it here; connections are per thread and run in WAL mode so
+# request threads can read while an analysis job is writing.
+#
+# Writers use transaction(). Nested transaction() blocks on the same connection join the
+# outermost one, so several modules' writes can be made atomic by wrapping them in one block.
+
+DB_PATH = os.getenv("QA_DB_PATH", os.path.join(DATA_DIR, "qa.sqlite3"))
+
+_local = threading.local()
+_schemas = []
+_schema_lock = threading.Lock()
+
+
+def register_schema(statements):
+    """Adds CREATE ... IF NOT EXISTS statements that every new connection applies."""
+    with _schema_lock:
+        _schemas.append(statements)
+
+
+def connect(path=None):
+    """Returns this thread's connection to path (default DB_PATH), creating tables on first use."""
+    path = path or DB_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    entry = connections.get(path)
+    if entry is None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        entry = connections[path] = [conn, 0, 0]
+    conn, applied, _ = entry
+    if applied < len(_schemas):
+        # Schemas registered since this connection was opened (modules imported later)
+        with _schema_lock:
+            for statements in _schemas[applied:]:
+                conn.executescript(statements)
+            entry[1] = len(_schemas)
+    return conn
+
+
+@contextmanager
+def transaction(path=None):
+    """Runs the block in one write transaction (BEGIN IMMEDIATE) on this thread's connection to
+    path and yields the connection; a block nested in another on the same connection joins it."""
+    conn = connect(path)
+    entry = _local.connections[path or DB_PATH]
+    if entry[2]:
+        entry[2] += 1
+        try:
+            yield conn
+        finally:
+            entry[2] -= 1
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    entry[2] = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        entry[2] = 0
@@ -1,79 +1,566 @@
 # utils/file_processing.py
 
 import io
-import pdfplumber
-import docx
-from pptx import Presentation
+import os
+import re
+import logging
+import zipfile
+import threading
+import itertools
+import posixpath
+from collections import namedtuple
 
-def extract_text_from_pdf(file_bytes):
-    """Extracts text from a PDF file, including any tables."""
-    text = ""
+from utils.text_normalization import normalize_pages, table_rows_text
+from utils.ocr import needs_ocr, ocr_available, render_page, render_pdfium_page, ocr_images
+
+logger = logging.getLogger(__name__)
+
+# pdfplumber, python-docx and python-pptx are imported inside the functions that use them:
+# together they dominate import time, and most processes (web workers, tests) never parse a file.
+# Files are dispatched on their sniffed content type (see EXTRACTORS at the end), not on
+# the extension the browser sent.
+#
+# DOCX and PPTX are read by streaming their XML parts straight out of the zip (see _ooxml_lines):
+# no object model is built, text comes out in body order, and grouped shapes, tables and
+# speaker notes are included. python-docx/python-pptx remain the fallback if streaming fails.
+#
+# PDF text goes through a pluggable engine (PDF_ENGINES, chosen by the PDF_ENGINE setting).
+# The default, "pdfium", reads the text layer natively with pypdfium2 and hands only the pages
+# that carry ruling lines, where a table may be, to pdfplumber's much slower layout analysis.
+# "pdfplumber" is the old behaviour: every page through pdfplumber.
+
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pdfium")
+TABLE_MIN_PATHS = 3  # Vector paths on a page before it may hold a ruled table worth pdfplumber's time
+
+_pdfium_lock = threading.Lock()  # PDFium is not thread-safe
+
+def _apply_ocr(pages, scanned):
+    """Replaces the text of scanned pages, given as [(page index, page image)], with their OCR text."""
+    if scanned:
+        for (index, _), ocr_text in zip(scanned, ocr_images([image for _, image in scanned])):
+            pages[index] = (ocr_text, pages[index][1])
+
+def _pdfplumber_page(page, scanned, index):
+    page_text = page.extract_text() or ""
+    if needs_ocr(page_text) and ocr_available():
+        scanned.append((index, render_page(page)))
+    return page_text, page.extract_tables()
+
+def pdfplumber_pages(file_bytes):
+    """pdfplumber engine: layout text and tables for every page."""
+    import pdfplumber
+    pages = []
+    scanned = []  # (page index, page image)
     try:
         with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
             for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
-
-                # Extract tables as text
-                tables = page.extract_tables()
-                for table in tables:
-                    table_text = "\n".join(["\t".join([str(cell) for cell in row]) for row in table])
-                    text += table_text + "\n"
+                pages.append(_pdfplumber_page(page, scanned, len(pages)))
+        _apply_ocr(pages, scanned)
     except Exception as e:
-        text += f"\nError extracting text from PDF: {e}\n"
-    return text
+        pages.append((f"\nError extracting text from PDF: {e}\n", []))
+    return pages
 
-def extract_text_from_docx(file_bytes):
-    """Extracts text from a DOCX file, including any tables."""
-    text = ""
+def pdfium_scan(file_bytes, render_scans=True):
+    """Reads a PDF with pypdfium2: (page texts, indexes of pages with ruling lines, [(index, scan image)])."""
+    import pypdfium2
+    import pypdfium2.raw as pdfium_c
+    texts, ruled, scanned = [], [], []
+    with _pdfium_lock:
+        pdf = pypdfium2.PdfDocument(file_bytes)
+        try:
+            for index, page in enumerate(pdf):
+                textpage = page.get_textpage()
+                text = textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+                textpage.close()
+                paths = page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH])
+                if sum(1 for _ in itertools.islice(paths, TABLE_MIN_PATHS)) >= TABLE_MIN_PATHS:
+                    ruled.append(index)
+                elif render_scans and needs_ocr(text) and ocr_available():
+                    scanned.append((index, render_pdfium_page(page)))
+                texts.append(text)
+                page.close()
+        finally:
+            pdf.close()
+    return texts, ruled, scanned
+
+def pdfium_pages(file_bytes):
+    """pdfium engine: native text for every page, pdfplumber only for the pages that may hold tables."""
+    try:
+        texts, ruled, scanned = pdfium_scan(file_bytes)
+    except Exception as e:
+        logger.warning(f"PDFium could not read the PDF ({e}), falling back to pdfplumber")
+        return pdfplumber_pages(file_bytes)
+    pages = [(text, []) for text in texts]
+    try:
+        if ruled:
+            import pdfplumber
+            with pdfplumber.open(io.BytesIO(file_bytes), pages=[index + 1 for index in ruled]) as pdf:
+                for index, page in zip(ruled, pdf.pages):
+                    pages[index] = _pdfplumber_page(page, scanned, index)
+        _apply_ocr(pages, scanned)
+    except Exception as e:
+        pages.append((f"\nError extracting text from PDF: {e}\n", []))
+    return pages
+
+PDF_ENGINES = {}  # name -> pages function
+
+def register_pdf_engine(name, pages):
+    """Adds (or replaces) a PDF engine: pages(file_bytes) -> [(page text, [table rows, ...])]."""
+    PDF_ENGINES[name] = pages
+
+register_pdf_engine("pdfium", pdfium_pages)
+register_pdf_engine("pdfplumber", pdfplumber_pages)
+
+def pdf_pages(file_bytes, engine=None):
+    """Extracts a PDF as [(page text, [table rows, ...])], one entry per page, with the configured engine.
+
+    Pages without a usable text layer (scans) are rendered and OCRed in the OCR worker pool.
+    """
+    engine = engine or PDF_ENGINE
+    if engine not in PDF_ENGINES:
+        logger.warning(f"Unknown PDF engine {engine!r}, using pdfplumber")
+        engine = "pdfplumber"
+    return PDF_ENGINES[engine](file_bytes)
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+def _ooxml_lines(stream, ns, body_only=False):
+    """Streams an OOXML part into (lines, tables), in document order.
+
+    ns is the namespace of the text elements (w: for Word, a: for DrawingML). Tables are kept
+    in place as one tab-separated line per row. body_only keeps just the body placeholder,
+    which is where the notes are on a notes slide.
+    """
+    from xml.etree.ElementTree import iterparse
+    lines, tables = [], []
+    paragraphs = []  # Open paragraphs; text boxes nest them
+    open_tables = []  # [row: [cell: [paragraph text]]]
+    tab_stops = 0  # Tab elements inside tab stop definitions are not text
+    placeholder = None
+    body = None
+
+    def place(text):
+        if open_tables and open_tables[-1] and open_tables[-1][-1]:
+            open_tables[-1][-1][-1].append(text)
+        else:
+            lines.append(text)
+
+    for event, element in iterparse(stream, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if tag == ns + "p":
+                paragraphs.append([])
+            elif tag == ns + "tbl":
+                open_tables.append([])
+            elif tag == ns + "tr" and open_tables:
+                open_tables[-1].append([])
+            elif tag == ns + "tc" and open_tables and open_tables[-1]:
+                open_tables[-1][-1].append([])
+            elif tag in (ns + "tabs", ns + "tabLst"):
+                tab_stops += 1
+            elif tag == _P + "sp":
+                placeholder = None
+            elif tag == ns + "body":
+                body = element
+            continue
+        if tag == ns + "t":
+            if paragraphs:
+                paragraphs[-1].append(element.text or "")
+        elif tag == ns + "tab":
+            if paragraphs and not tab_stops:
+                paragraphs[-1].append("\t")
+        elif tag in (ns + "br", ns + "cr"):
+            if paragraphs:
+                paragraphs[-1].append("\n")
+        elif tag in (ns + "tabs", ns + "tabLst"):
+            tab_stops -= 1
+        elif tag == _P + "ph":
+            placeholder = element.get("type")
+        elif tag == ns + "p" and paragraphs:
+            text = "".join(paragraphs.pop())
+            if not body_only or placeholder == "body":
+                place(text)
+        elif tag == ns + "tbl" and open_tables:
+            rows = [["\n".join(cell).strip() for cell in row] for row in open_tables.pop()]
+            tables.append(rows)
+            place(table_rows_text([[cell.replace("\n", " ") for cell in row] for row in rows]))
+        element.clear()
+        if body is not None and tag in (ns + "p", ns + "tbl") and not paragraphs and not open_tables:
+            body.clear()  # Drop finished top-level blocks so memory stays flat on long documents
+    return lines, tables
+
+def _ooxml_rels(archive, part):
+    """{relationship id: (relationship type, part name)} for a part of an OOXML zip."""
+    from xml.etree import ElementTree
+    folder, name = posixpath.split(part)
+    try:
+        root = ElementTree.fromstring(archive.read(posixpath.join(folder, "_rels", name + ".rels")))
+    except KeyError:
+        return {}
+    return {
+        rel.get("Id"): (rel.get("Type", "").rsplit("/", 1)[-1], posixpath.normpath(posixpath.join(folder, rel.get("Target", ""))).lstrip("/"))
+        for rel in root.iter(_RELATIONSHIP) if rel.get("TargetMode") != "External"
+    }
+
+def docx_stream(file_bytes):
+    """Streams a DOCX's main document part: (body-ordered text, tables)."""
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive, archive.open("word/document.xml") as stream:
+        lines, tables = _ooxml_lines(stream, _W)
+    return "".join(line + "\n" for line in lines), tables
+
+def pptx_stream(file_bytes):
+    """Streams a PPTX: ([(slide text, [])] in presentation order, tables).
+
+    Each slide's text covers every shape, grouped ones included, followed by its speaker notes.
+    """
+    from xml.etree import ElementTree
+    pages, tables = [], []
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+        parts = _ooxml_rels(archive, "ppt/presentation.xml")
+        presentation = ElementTree.fromstring(archive.read("ppt/presentation.xml"))
+        for slide_id in presentation.iter(_P + "sldId"):
+            slide = parts[slide_id.get(_R + "id")][1]
+            with archive.open(slide) as stream:
+                lines, slide_tables = _ooxml_lines(stream, _A)
+            tables.extend(slide_tables)
+            for kind, notes in _ooxml_rels(archive, slide).values():
+                if kind != "notesSlide":
+                    continue
+                with archive.open(notes) as stream:
+                    note_lines = [line for line in _ooxml_lines(stream, _A, body_only=True)[0] if line.strip()]
+                if note_lines:
+                    lines += ["Speaker notes:"] + note_lines
+            pages.append(("".join(line + "\n" for line in lines), []))
+    return pages, tables
+
+def docx_pages(file_bytes):
+    """Extracts a DOCX as a single page, in body order, tables included."""
+    try:
+        return [(docx_stream(file_bytes)[0], [])]
+    except Exception as e:
+        logger.warning(f"Streaming DOCX extraction failed ({e}), falling back to python-docx")
+        return docx_pages_fallback(file_bytes)
+
+def pptx_pages(file_bytes):
+    """Extracts a PPTX with one page per slide: all its shapes and its speaker notes."""
+    try:
+        return pptx_stream(file_bytes)[0]
+    except Exception as e:
+        logger.warning(f"Streaming PPTX extraction failed ({e}), falling back to python-pptx")
+        return pptx_pages_fallback(file_bytes)
+
+def docx_pages_fallback(file_bytes):
+    """Extracts a DOCX with python-docx as a single page: its paragraphs and its tables."""
+    import docx
     try:
         doc = docx.Document(io.BytesIO(file_bytes))
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = "\t".join(cell.text for cell in row.cells)
-                text += row_text + "\n"
+        text = "".join(para.text + "\n" for para in doc.paragraphs)
+        tables = [[[cell.text for cell in row.cells] for row in table.rows] for table in doc.tables]
+        return [(text, tables)]
     except Exception as e:
-        text += f"\nError extracting text from DOCX: {e}\n"
-    return text
+        return [(f"\nError extracting text from DOCX: {e}\n", [])]
 
-def extract_text_from_pptx(file_bytes):
-    """Extracts text from a PPTX file, including all slides and shapes."""
-    text = ""
+def pptx_pages_fallback(file_bytes):
+    """Extracts a PPTX with python-pptx, one page per slide (the text of its top-level shapes)."""
+    from pptx import Presentation
+    pages = []
     try:
         prs = Presentation(io.BytesIO(file_bytes))
         for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
+            pages.append(("".join(shape.text + "\n" for shape in slide.shapes if hasattr(shape, "text")), []))
     except Exception as e:
-        text += f"\nError extracting text from PPTX: {e}\n"
-    return text
+        pages.append((f"\nError extracting text from PPTX: {e}\n", []))
+    return pages
 
-def extract_all_text(files):
-    """Extracts text from a list of uploaded files, handling PDF, DOCX, and PPTX formats."""
-    extracted_text = {}
+def _decode_text(file_bytes):
+    if file_bytes.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return file_bytes.decode("utf-16")
+    try:
+        return file_bytes.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return file_bytes.decode("cp1252", errors="replace")
+
+def text_pages(file_bytes):
+    """Extracts a plain-text file as a single page."""
+    return [(_decode_text(file_bytes), [])]
+
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+
+def markdown_pages(file_bytes):
+    """Extracts a Markdown file as a single page; link and image targets are dropped, their text kept."""
+    text = _HTML_COMMENT.sub("", _decode_text(file_bytes))
+    return [(_MD_LINK.sub(r"\1", _MD_IMAGE.sub(r"\1", text)), [])]
+
+_ODT_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+_ODT_TABLE = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+
+def _odt_text(element):
+    parts = [element.text or ""]
+    for child in element:
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "s":
+            parts.append(" " * int(child.get(f"{{{_ODT_TEXT}}}c", "1")))
+        elif tag == "tab":
+            parts.append("\t")
+        elif tag == "line-break":
+            parts.append("\n")
+        else:
+            parts.append(_odt_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+def _odt_blocks(element, paragraphs, tables):
+    for child in element:
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag in ("p", "h"):
+            paragraphs.append(_odt_text(child))
+        elif tag == "table":
+            tables.append([
+                [_odt_text(cell).strip() for cell in row if cell.tag == f"{{{_ODT_TABLE}}}table-cell"]
+                for row in child.iter(f"{{{_ODT_TABLE}}}table-row")
+            ])
+        else:
+            _odt_blocks(child, paragraphs, tables)
+
+def odt_pages(file_bytes):
+    """Extracts an OpenDocument text file as a single page: its paragraphs and its tables."""
+    from xml.etree import ElementTree
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+            root = ElementTree.fromstring(archive.read("content.xml"))
+        paragraphs, tables = [], []
+        _odt_blocks(root, paragraphs, tables)
+        return [("".join(paragraph + "\n" for paragraph in paragraphs), tables)]
+    except Exception as e:
+        return [(f"\nError extracting text from ODT: {e}\n", [])]
+
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)", re.IGNORECASE | re.DOTALL)
+# Groups whose content is metadata, not document text
+_RTF_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "header", "headerl", "headerr",
+    "footer", "footerl", "footerr", "listtable", "listoverridetable", "rsidtbl", "generator",
+    "xmlnstbl", "latentstyles", "themedata", "colorschememapping", "datastore", "filetbl", "revtbl", "fldinst",
+}
+_RTF_BREAKS = {"par": "\n", "line": "\n", "sect": "\n", "page": "\n", "row": "\n", "tab": "\t", "cell": "\t"}
+
+def rtf_to_text(rtf):
+    """Strips RTF markup, keeping the document text (\\uN and \\'hh escapes decoded)."""
+    out = []
+    stack = []
+    ignorable = False
+    unicode_skip = 1  # \ucN: fallback characters that follow each \uN
+    skip = 0
+    for match in _RTF_TOKEN.finditer(rtf):
+        word, arg, hexcode, symbol, brace, char = match.groups()
+        if brace:
+            skip = 0
+            if brace == "{":
+                stack.append((unicode_skip, ignorable))
+            elif stack:
+                unicode_skip, ignorable = stack.pop()
+        elif symbol:
+            skip = 0
+            if symbol == "*":
+                ignorable = True
+            elif not ignorable and symbol in "{}\\":
+                out.append(symbol)
+            elif not ignorable and symbol == "~":
+                out.append(" ")
+        elif word:
+            skip = 0
+            word = word.lower()
+            if word in _RTF_DESTINATIONS:
+                ignorable = True
+            elif ignorable:
+                continue
+            elif word in _RTF_BREAKS:
+                out.append(_RTF_BREAKS[word])
+            elif word == "uc":
+                unicode_skip = int(arg or 1)
+            elif word == "u" and arg:
+                out.append(chr(int(arg) % 0x10000))
+                skip = unicode_skip
+        elif hexcode or char:
+            if skip:
+                skip -= 1
+            elif not ignorable:
+                out.append(bytes([int(hexcode, 16)]).decode("cp1252", errors="replace") if hexcode else char)
+    return "".join(out)
+
+def rtf_pages(file_bytes):
+    """Extracts an RTF file as a single page."""
+    return [(rtf_to_text(file_bytes.decode("latin-1")), [])]
+
+def extract_text_from_pdf(file_bytes):
+    """Extracts text from a PDF file, including any tables, normalised for prompting."""
+    return normalize_pages(pdf_pages(file_bytes)).text
+
+def extract_text_from_docx(file_bytes):
+    """Extracts text from a DOCX file, including any tables, normalised for prompting."""
+    return normalize_pages(docx_pages(file_bytes)).text
+
+def extract_text_from_pptx(file_bytes):
+    """Extracts text from a PPTX file, including all slides and shapes, normalised for prompting."""
+    return normalize_pages(pptx_pages(file_bytes)).text
+
+def extract_tables_from_pdf(file_bytes):
+    """Extracts every table in a PDF as a list of rows of cell strings."""
+    import pdfplumber
+    pages = None  # All of them
+    if PDF_ENGINE == "pdfium":
+        try:
+            pages = [index + 1 for index in pdfium_scan(file_bytes, render_scans=False)[1]]
+        except Exception as e:
+            logger.warning(f"PDFium could not read the PDF ({e}), scanning every page for tables")
+        if pages == []:
+            return []
+    tables = []
+    with pdfplumber.open(io.BytesIO(file_bytes), pages=pages) as pdf:
+        for page in pdf.pages:
+            for table in page.extract_tables():
+                tables.append([[str(cell or "").strip() for cell in row] for row in table])
+    return tables
+
+def extract_tables_from_docx(file_bytes):
+    """Extracts every table in a DOCX as a list of rows of cell strings."""
+    try:
+        return docx_stream(file_bytes)[1]
+    except Exception as e:
+        logger.warning(f"Streaming DOCX table extraction failed ({e}), falling back to python-docx")
+    import docx
+    doc = docx.Document(io.BytesIO(file_bytes))
+    return [[[cell.text.strip() for cell in row.cells] for row in table.rows] for table in doc.tables]
+
+def extract_tables_from_pptx(file_bytes):
+    """Extracts every table shape in a PPTX as a list of rows of cell strings."""
+    try:
+        return pptx_stream(file_bytes)[1]
+    except Exception as e:
+        logger.warning(f"Streaming PPTX table extraction failed ({e}), falling back to python-pptx")
+    from pptx import Presentation
+    tables = []
+    prs = Presentation(io.BytesIO(file_bytes))
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if getattr(shape, "has_table", False):
+                tables.append([[cell.text.strip() for cell in row.cells] for row in shape.table.rows])
+    return tables
+
+def _read_files(files):
+    """Yields (filename, file_bytes) for uploaded file objects or a {filename: path} mapping."""
+    if isinstance(files, dict):
+        for filename, path in files.items():
+            with open(path, 'rb') as f:
+                yield filename, f.read()
+        return
     for file in files:
         # Check that file has 'name' and 'read' attributes (i.e., is an UploadedFile)
         if not hasattr(file, 'name') or not hasattr(file, 'read'):
+            yield "Unknown", None
+            continue
+        yield file.name, file.read()
+
+# Cost classes: "heavy" backends load big libraries and burn CPU (the async app runs them in
+# its process pool); "light" ones are stdlib parsing and run in a thread.
+COST_LIGHT = "light"
+COST_HEAVY = "heavy"
+
+Extractor = namedtuple("Extractor", ["name", "pages", "tables", "cost"])
+
+EXTRACTORS = {}  # content type -> Extractor
+
+def register_extractor(content_type, name, pages, tables=None, cost=COST_LIGHT):
+    """Registers a backend: pages(bytes) -> [(page text, [table rows])]; tables(bytes) -> [table rows]."""
+    EXTRACTORS[content_type] = Extractor(name, pages, tables, cost)
+
+register_extractor("application/pdf", "PDF", pdf_pages, extract_tables_from_pdf, COST_HEAVY)
+register_extractor("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "DOCX", docx_pages, extract_tables_from_docx, COST_HEAVY)
+register_extractor("application/vnd.openxmlformats-officedocument.presentationml.presentation", "PPTX", pptx_pages, extract_tables_from_pptx, COST_HEAVY)
+register_extractor("application/vnd.oasis.opendocument.text", "ODT", odt_pages)
+register_extractor("application/rtf", "RTF", rtf_pages)
+register_extractor("text/markdown", "Markdown", markdown_pages)
+register_extractor("text/plain", "Text", text_pages)
+
+# Zip-based formats are told apart by the part that only they contain
+_ZIP_MARKERS = [
+    ("word/document.xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("ppt/presentation.xml", "application/vnd.openxmlformats-officedocument.presentationml.presentation"),
+]
+_MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+def sniff_content_type(file_bytes, filename=""):
+    """Content type from the file's magic bytes; the extension only separates Markdown from plain text."""
+    head = file_bytes[:8]
+    if file_bytes[:1024].lstrip().startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"{\\rtf"):
+        return "application/rtf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+                names = set(archive.namelist())
+                if "mimetype" in names:
+                    return archive.read("mimetype").decode("ascii", errors="replace").strip()
+        except zipfile.BadZipFile:
+            return "application/octet-stream"
+        return next((content_type for part, content_type in _ZIP_MARKERS if part in names), "application/zip")
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")) or b"\x00" not in file_bytes[:8192]:
+        return "text/markdown" if filename.lower().endswith(_MARKDOWN_EXTENSIONS) else "text/plain"
+    return "application/octet-stream"
+
+def extractor_for(file_bytes, filename=""):
+    """The registered Extractor for a file's sniffed content type, or None if unsupported."""
+    return EXTRACTORS.get(sniff_content_type(file_bytes, filename))
+
+def extraction_cost(path):
+    """Cost class of extracting the file at path (COST_LIGHT for unsupported files)."""
+    with open(path, "rb") as f:
+        extractor = extractor_for(f.read(), path)
+    return extractor.cost if extractor else COST_LIGHT
+
+def extract_tables(files):
+    """Extracts tables from uploaded files as {filename: [rows, ...]}."""
+    tables = {}
+    for filename, file_bytes in _read_files(files):
+        extractor = extractor_for(file_bytes, filename) if file_bytes is not None else None
+        if extractor is None:
+            continue
+        try:
+            if extractor.tables:
+                tables[filename] = extractor.tables(file_bytes)
+            else:
+                tables[filename] = [rows for _, page_tables in extractor.pages(file_bytes) for rows in page_tables]
+        except Exception:
+            tables[filename] = []
+    return tables
+
+def extract_all_text(files):
+    """Extracts text from uploaded files (or a {filename: path} mapping) with the extractor for each file's content type."""
+    extracted_text = {}
+    for filename, file_bytes in _read_files(files):
+        if file_bytes is None:
             extracted_text["Unknown"] = "Error: Expected UploadedFile object, but got bytes."
             continue
         
-        filename = file.name  # Define filename before the try block
         try:
-            file_bytes = file.read()
-            
-            if filename.lower().endswith('.pdf'):
-                extracted_text[filename] = extract_text_from_pdf(file_bytes)
-            elif filename.lower().endswith('.docx'):
-                extracted_text[filename] = extract_text_from_docx(file_bytes)
-            elif filename.lower().endswith('.pptx'):
-                extracted_text[filename] = extract_text_from_pptx(file_bytes)
-            else:
+            extractor = extractor_for(file_bytes, filename)
+            if extractor is None:
                 extracted_text[filename] = "Unsupported file format."
+                continue
+            # Headers/footers, page numbers, duplicate tables and extraction artifacts are removed here
+            normalized = normalize_pages(extractor.pages(file_bytes))
+            logger.info(
+                f"Extracted {filename} ({extractor.name}): {normalized.original_tokens - normalized.saved_tokens} tokens "
+                f"({normalized.saved_tokens} of {normalized.original_tokens} saved by normalization)"
+            )
+            extracted_text[filename] = normalized.text
         
         except Exception as e:
             extracted_text[filename] = f"Error processing file {filename}: {e}"
     return extracted_text
-
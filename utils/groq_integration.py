@@ -1,10 +1,27 @@
 # utils/groq_integration.py
 
-from groq import Groq
+import os
+
+MISSING_KEY_MESSAGE = "🛑 GROQ_API_KEY not found. Please set it in the environment variables."
 
 class GroqClient:
-    def __init__(self, api_key):
-        self.client = Groq(api_key=api_key)
+    """Groq chat client. The SDK is imported and the connection built on the first request,
+    so creating a client is free and a missing key only fails the calls that need it."""
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self._client = None
+
+    def _make_client(self):
+        from groq import Groq
+        return Groq(api_key=self.api_key)
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise EnvironmentError(MISSING_KEY_MESSAGE)
+            self._client = self._make_client()
+        return self._client
 
     def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
         completion = self.client.chat.completions.create(
@@ -22,3 +39,26 @@ class GroqClient:
             response += chunk.message.content
 
         return response
+
+class AsyncGroqClient(GroqClient):
+    """Coroutine twin of GroqClient for the ASGI app; awaits the network call instead of blocking a thread."""
+    def _make_client(self):
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=self.api_key)
+
+    async def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
+        completion = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stream=False,
+            stop=None,
+        )
+
+        response = ""
+        for chunk in completion.choices:
+            response += chunk.message.content
+
+        return response
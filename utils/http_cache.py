@@ -0,0 +1,161 @@
+# utils/http_cache.py
+
+import os
+import gzip
+import time
+import logging
+import threading
+from collections import namedtuple
+from email.utils import formatdate, parsedate_to_datetime
+
+from jinja2 import FileSystemBytecodeCache
+
+from utils.storage import DATA_DIR, content_hash
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BYTECODE_CACHE_DIR = os.path.join(DATA_DIR, "jinja_bytecode")
+MIN_COMPRESS_BYTES = 500  # Below this the encoding overhead outweighs the saving
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Dynamic pages are compressed per request; 11 is reserved for prerendered ones
+
+StaticPage = namedtuple("StaticPage", ["body", "etag", "last_modified", "encoded"])
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def jinja_options(app_name, cache_size=50):
+    """Jinja environment options: compiled templates kept in memory, bytecode cached on disk,
+    and no per-render mtime checks (templates change only on deploy).
+
+    Each app gets its own bytecode directory: Jinja's cache key ignores enable_async, so
+    bytecode compiled for Flask's sync environment breaks Quart's async one.
+    """
+    directory = os.path.join(BYTECODE_CACHE_DIR, app_name)
+    os.makedirs(directory, exist_ok=True)
+    return {
+        "bytecode_cache": FileSystemBytecodeCache(directory),
+        "cache_size": cache_size,
+        "auto_reload": False,
+    }
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def choose_encoding(accept_encoding):
+    """Picks the best encoding the client accepts (brotli over gzip), or None for identity."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding, static=False):
+    """Encodes body with gzip or brotli; static content gets the slower, smaller settings."""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+    return body
+
+
+def prerender(html, template_paths):
+    """Builds a StaticPage: the body once, its ETag, Last-Modified (newest template file)
+    and every encoded variant."""
+    body = html.encode("utf-8")
+    encoded = {encoding: compress(body, encoding, static=True) for encoding in supported_encodings()}
+    last_modified = max(os.path.getmtime(path) for path in template_paths)
+    return StaticPage(body, content_hash(body)[:16], last_modified, encoded)
+
+
+def variant(page, encoding):
+    """Returns (body, etag) for the requested encoding; each encoding has its own ETag."""
+    if encoding in page.encoded:
+        return page.encoded[encoding], f"{page.etag}-{encoding}"
+    return page.body, page.etag
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(page, etag, if_none_match, if_modified_since):
+    """True when the client's cached copy of page is still current (RFC 9110 precedence)."""
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if if_modified_since:
+        try:
+            return int(page.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def encode_body(body, accept_encoding):
+    """Compresses a dynamic response body if it is worth it; returns (body, encoding or None)."""
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    return compress(body, encoding), encoding
+
+
+def static_response(page, request_headers):
+    """Returns (status, body, headers) serving page, answering conditional GETs with 304."""
+    encoding = choose_encoding(request_headers.get("Accept-Encoding"))
+    body, etag = variant(page, encoding)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(page.last_modified),
+        "Cache-Control": "no-cache",  # Always revalidate; unchanged pages cost a 304
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(page, etag, request_headers.get("If-None-Match"), request_headers.get("If-Modified-Since")):
+        return 304, b"", headers
+    headers["Content-Type"] = "text/html; charset=utf-8"
+    if encoding in page.encoded:
+        headers["Content-Encoding"] = encoding
+    return 200, body, headers
+
+
+def record_response(endpoint, started, raw_bytes, sent_bytes):
+    """Logs server-side time to first byte and bytes on the wire for one response."""
+    ttfb = time.perf_counter() - started
+    logger.info("HTTP %s ttfb=%.1fms bytes=%d wire=%d", endpoint, ttfb * 1000, raw_bytes, sent_bytes)
+    with _stats_lock:
+        entry = _stats.setdefault(endpoint, {"responses": 0, "ttfb": 0.0, "bytes": 0, "wire": 0})
+        entry["responses"] += 1
+        entry["ttfb"] += ttfb
+        entry["bytes"] += raw_bytes
+        entry["wire"] += sent_bytes
+
+
+def page_stats():
+    """Per endpoint response counts, mean TTFB (ms) and total bytes before/after compression."""
+    with _stats_lock:
+        return {
+            endpoint: {
+                "responses": entry["responses"],
+                "mean_ttfb_ms": round(entry["ttfb"] / entry["responses"] * 1000, 2),
+                "bytes": entry["bytes"],
+                "wire": entry["wire"],
+            }
+            for endpoint, entry in _stats.items()
+        }
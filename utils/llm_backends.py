@@ -0,0 +1,376 @@
+# utils/llm_backends.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+from utils.groq_integration import GroqClient, AsyncGroqClient
+from utils.model_router import classify_error
+from utils.single_flight import prompt_key, single_flight, single_flight_async
+from utils.circuit_breaker import CircuitBreaker
+from utils.scheduler import LLM_SCHEDULER
+
+# LLM backends and the balancer in front of them. A backend is anything with the GroqClient
+# interface, get_groq_response(messages, model, temperature, max_tokens): the Groq SDK (one
+# backend per API key), any OpenAI-compatible /chat/completions endpoint (vLLM, llama.cpp,
+# OpenRouter, ...) or the local stand-in server (utils/llm_stand_in.py). LLMBalancer has the
+# same interface, so the tools and the model router use it unchanged.
+#
+# Each call goes to a backend that serves the model and has a free concurrency slot, chosen
+# by smooth weighted round-robin on weight x live health (an average of recent successes).
+# Rate-limited, rejected and unreachable backends cool down for a while; provider errors fail
+# over to the next backend before the model router's own fallbacks kick in. Identical
+# concurrent requests share one upstream call (utils/single_flight.py), and a circuit breaker
+# (utils/circuit_breaker.py) fails calls fast while the backends as a whole are down or slow.
+# Calls that get through wait for a slot from the LLM scheduler (utils/scheduler.py), which
+# orders them by priority class and shares them fairly between users.
+#
+# Backends are configured with LLM_BACKENDS, a JSON list such as
+#   [{"kind": "groq", "api_key": "gsk_...", "weight": 2, "concurrency": 8},
+#    {"kind": "openai", "base_url": "http://vllm:8000/v1", "models": {"llama-3.1-8b-instant": "meta-llama/Llama-3.1-8B-Instruct"}}]
+# Without it, every key in GROQ_API_KEYS (comma-separated), or GROQ_API_KEY, is a Groq backend.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8  # In-flight requests per backend
+HEALTH_ALPHA = 0.2  # Weight of the latest call in a backend's health and latency averages
+MIN_HEALTH = 0.05  # A failing backend keeps a trickle of traffic so it can recover
+RATE_LIMIT_COOLDOWN = 20.0  # Seconds a rate-limited key rests when the provider gives no Retry-After
+AUTH_COOLDOWN = 300.0  # Seconds a rejected key rests
+TRANSIENT_COOLDOWN = 2.0  # Seconds an unreachable or erroring backend rests
+OPENAI_TIMEOUT = 120.0
+
+
+class ProviderError(Exception):
+    """HTTP error from an OpenAI-compatible endpoint; status_code feeds classify_error."""
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class BackendUnavailable(ProviderError):
+    """No configured backend serves the model; a 503 so the model router tries its next model."""
+    def __init__(self, model):
+        super().__init__(503, f"No LLM backend serves {model}")
+
+
+def _payload(messages, model, temperature, max_tokens):
+    return {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, "top_p": 1, "stream": False}
+
+
+def _content(reply):
+    if reply.status_code >= 400:
+        raise ProviderError(reply.status_code, reply.text[:500], reply.headers.get("retry-after"))
+    return "".join(choice["message"]["content"] or "" for choice in reply.json()["choices"])
+
+
+class OpenAICompatibleClient:
+    """Chat client for an OpenAI-compatible endpoint; base_url ends before /chat/completions."""
+    def __init__(self, base_url, api_key=None, timeout=OPENAI_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+
+    def _make_client(self):
+        import httpx
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return httpx.Client(base_url=self.base_url, headers=headers, timeout=self.timeout)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._make_client()
+        return self._client
+
+    def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
+        import httpx
+        try:
+            reply = self.client.post("/chat/completions", json=_payload(messages, model, temperature, max_tokens))
+        except httpx.TransportError as e:
+            raise ProviderError(503, f"{type(e).__name__}: {e}")
+        return _content(reply)
+
+
+class AsyncOpenAICompatibleClient(OpenAICompatibleClient):
+    """Coroutine twin of OpenAICompatibleClient for the ASGI app."""
+    def _make_client(self):
+        import httpx
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=self.timeout)
+
+    async def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
+        import httpx
+        try:
+            reply = await self.client.post("/chat/completions", json=_payload(messages, model, temperature, max_tokens))
+        except httpx.TransportError as e:
+            raise ProviderError(503, f"{type(e).__name__}: {e}")
+        return _content(reply)
+
+
+# kind -> (sync client, async client, settings passed to the client)
+BACKEND_KINDS = {
+    "groq": (GroqClient, AsyncGroqClient, ("api_key",)),
+    "openai": (OpenAICompatibleClient, AsyncOpenAICompatibleClient, ("base_url", "api_key", "timeout")),
+}
+
+
+class Backend:
+    """One endpoint or API key: its client, its share of traffic and its live health."""
+    def __init__(self, name, client, weight=1.0, concurrency=DEFAULT_CONCURRENCY, models=None):
+        self.name = name
+        self.client = client
+        self.weight = float(weight)
+        self.concurrency = int(concurrency)
+        # Models it serves, as {our model name: its model name}; None serves every model as named
+        self.models = {model: model for model in models} if isinstance(models, list) else models
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.health = 1.0
+        self.latency = None
+        self.cooldown_until = 0.0
+        self.current = 0.0  # Smooth weighted round-robin credit
+
+    def serves(self, model):
+        return self.models is None or model in self.models
+
+    def upstream(self, model):
+        return (self.models or {}).get(model, model)
+
+
+def _retry_after(exc):
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        value = (getattr(getattr(exc, "response", None), "headers", None) or {}).get("retry-after")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _trips_breaker(exc):
+    # Provider trouble counts against the breaker; bad input, bad keys and our own bugs do not.
+    # None: no backend serves the model, so no provider was asked and the call is not recorded at all
+    if isinstance(exc, BackendUnavailable):
+        return None
+    return classify_error(exc) in ("rate_limit", "transient")
+
+
+def _settle(breaker, started, failed):
+    if failed is None:
+        breaker.release()
+    else:
+        breaker.record(time.perf_counter() - started, failed)
+
+
+class LLMBalancer:
+    """Spreads get_groq_response calls over backends by weight and health, failing over on errors."""
+    def __init__(self, backends, breaker=None, scheduler=None):
+        self.backends = list(backends)
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler or LLM_SCHEDULER
+        self._lock = threading.Lock()
+        self._capacity = threading.Condition(self._lock)
+
+    def _pick(self, model, tried):
+        """Reserves a slot on the next backend for model: (backend, None), or (None, busy)."""
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.serves(model) and b.name not in tried]
+        if not candidates:
+            return None, False
+        # Backends all cooling down are tried anyway: better a likely 429 than no answer
+        ready = [b for b in candidates if b.cooldown_until <= now] or candidates
+        free = [b for b in ready if b.in_flight < b.concurrency]
+        if not free:
+            return None, True
+        for backend in free:
+            backend.current += backend.weight * max(backend.health, MIN_HEALTH)
+        backend = max(free, key=lambda b: b.current)
+        backend.current -= sum(b.weight * max(b.health, MIN_HEALTH) for b in free)
+        backend.in_flight += 1
+        return backend, None
+
+    def _notify(self):
+        self._capacity.notify_all()
+
+    def _release(self, backend, started, error=None):
+        """Frees the backend's slot and records the call; returns the error's classification."""
+        kind = classify_error(error) if error is not None else None
+        with self._lock:
+            backend.in_flight -= 1
+            backend.calls += 1
+            if error is None:
+                elapsed = time.perf_counter() - started
+                backend.latency = elapsed if backend.latency is None else backend.latency + HEALTH_ALPHA * (elapsed - backend.latency)
+                backend.health += HEALTH_ALPHA * (1.0 - backend.health)
+            elif kind != "context_length":  # The input's fault, not the backend's
+                backend.errors += 1
+                backend.health -= HEALTH_ALPHA * backend.health
+                if kind == "rate_limit":
+                    backend.cooldown_until = time.monotonic() + (_retry_after(error) or RATE_LIMIT_COOLDOWN)
+                elif kind == "transient":
+                    backend.cooldown_until = time.monotonic() + TRANSIENT_COOLDOWN
+                elif getattr(error, "status_code", None) in (401, 403):
+                    backend.cooldown_until = time.monotonic() + AUTH_COOLDOWN
+            self._notify()
+        if error is not None and kind != "context_length":
+            logger.warning(f"LLM backend {backend.name} failed ({kind or type(error).__name__}): {error}")
+        return kind
+
+    def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
+        return single_flight(
+            prompt_key(messages, model, temperature, max_tokens),
+            lambda: self._call(messages, model, temperature, max_tokens),
+        )
+
+    def _call(self, messages, model, temperature, max_tokens):
+        self.breaker.before_call()
+        with self.scheduler.slot():
+            return self._timed(messages, model, temperature, max_tokens)
+
+    def _timed(self, messages, model, temperature, max_tokens):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self._dispatch(messages, model, temperature, max_tokens)
+            failed = False
+            return response
+        except Exception as e:
+            failed = _trips_breaker(e)
+            raise
+        finally:
+            _settle(self.breaker, started, failed)
+
+    def _dispatch(self, messages, model, temperature, max_tokens):
+        tried = set()
+        last_error = BackendUnavailable(model)
+        while True:
+            with self._lock:
+                backend, busy = self._pick(model, tried)
+                while backend is None and busy:
+                    self._capacity.wait()
+                    backend, busy = self._pick(model, tried)
+            if backend is None:
+                raise last_error
+            started = time.perf_counter()
+            try:
+                response = backend.client.get_groq_response(
+                    messages, model=backend.upstream(model), temperature=temperature, max_tokens=max_tokens
+                )
+            except Exception as e:
+                if self._release(backend, started, e) == "context_length":
+                    raise
+                tried.add(backend.name)
+                last_error = e
+                continue
+            self._release(backend, started)
+            return response
+
+    def stats(self):
+        """Per-backend traffic and health since startup."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                b.name: {
+                    "weight": b.weight,
+                    "concurrency": b.concurrency,
+                    "in_flight": b.in_flight,
+                    "calls": b.calls,
+                    "errors": b.errors,
+                    "health": round(b.health, 3),
+                    "latency": round(b.latency, 3) if b.latency is not None else None,
+                    "cooldown": round(max(0.0, b.cooldown_until - now), 1),
+                }
+                for b in self.backends
+            }
+
+
+class AsyncLLMBalancer(LLMBalancer):
+    """LLMBalancer over async clients; waiting for a free slot suspends the coroutine, not the loop."""
+    def __init__(self, backends, breaker=None, scheduler=None):
+        super().__init__(backends, breaker, scheduler)
+        self._freed = asyncio.Event()
+
+    def _notify(self):
+        self._freed.set()
+
+    async def get_groq_response(self, messages, model="llama-3.1-8b-instant", temperature=0.5, max_tokens=1024):
+        return await single_flight_async(
+            prompt_key(messages, model, temperature, max_tokens),
+            lambda: self._call(messages, model, temperature, max_tokens),
+        )
+
+    async def _call(self, messages, model, temperature, max_tokens):
+        self.breaker.before_call()
+        async with self.scheduler.slot_async():
+            return await self._timed(messages, model, temperature, max_tokens)
+
+    async def _timed(self, messages, model, temperature, max_tokens):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = await self._dispatch(messages, model, temperature, max_tokens)
+            failed = False
+            return response
+        except Exception as e:
+            failed = _trips_breaker(e)
+            raise
+        finally:
+            _settle(self.breaker, started, failed)
+
+    async def _dispatch(self, messages, model, temperature, max_tokens):
+        tried = set()
+        last_error = BackendUnavailable(model)
+        while True:
+            with self._lock:
+                backend, busy = self._pick(model, tried)
+                if backend is None and busy:
+                    self._freed.clear()
+            if backend is None and busy:
+                await self._freed.wait()
+                continue
+            if backend is None:
+                raise last_error
+            started = time.perf_counter()
+            try:
+                response = await backend.client.get_groq_response(
+                    messages, model=backend.upstream(model), temperature=temperature, max_tokens=max_tokens
+                )
+            except Exception as e:
+                if self._release(backend, started, e) == "context_length":
+                    raise
+                tried.add(backend.name)
+                last_error = e
+                continue
+            self._release(backend, started)
+            return response
+
+
+def backend_config(config=None, api_key=None):
+    """Backend settings: config (a list, or JSON) or LLM_BACKENDS, else one Groq backend per key."""
+    config = config if config is not None else os.getenv("LLM_BACKENDS")
+    if isinstance(config, str):
+        config = json.loads(config) if config.strip() else None
+    if config:
+        return config
+    keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+    return [{"kind": "groq", "api_key": key} for key in keys or [api_key]]
+
+
+def build_balancer(config=None, api_key=None, asynchronous=False):
+    """LLMBalancer (or AsyncLLMBalancer) over the configured backends."""
+    backends = []
+    for i, settings in enumerate(backend_config(config, api_key)):
+        kind = settings.get("kind", "groq")
+        sync_client, async_client, options = BACKEND_KINDS[kind]
+        client = (async_client if asynchronous else sync_client)(**{k: settings[k] for k in options if k in settings})
+        backends.append(Backend(
+            settings.get("name") or f"{kind}-{i + 1}", client, settings.get("weight", 1.0),
+            settings.get("concurrency", DEFAULT_CONCURRENCY), settings.get("models"),
+        ))
+    return (AsyncLLMBalancer if asynchronous else LLMBalancer)(backends)
@@ -0,0 +1,82 @@
+# utils/llm_stand_in.py
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local OpenAI-compatible /chat/completions server for tests, benchmarks and offline
+# development: point an "openai" backend at it (see utils/llm_backends.py). Answers are
+# deterministic for a prompt; latency and a failure status can be dialled in to exercise the
+# balancer and the fallback paths.
+#
+#   python -m utils.llm_stand_in [port]
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded stand-in server; start() serves in a daemon thread, url is its base_url."""
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, fail_status=None, reply=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.fail_status = fail_status  # Answer every request with this HTTP status instead
+        self.reply = reply  # Fixed answer text; by default one derived from the prompt
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server._calls_lock:
+            server.calls += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+        if server.fail_status:
+            headers = [("Retry-After", "1")] if server.fail_status == 429 else []
+            return self._send(server.fail_status, {"error": {"message": "Stand-in failure"}}, headers)
+        prompt = json.dumps(request.get("messages", []), sort_keys=True)
+        content = server.reply or f"Stand-in answer {hashlib.sha256(prompt.encode()).hexdigest()[:12]} from {request.get('model')}."
+        self._send(200, {
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        })
+
+
+if __name__ == "__main__":
+    server = StandInServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8099)
+    print(f"Stand-in LLM at {server.url}")
+    server.serve_forever()
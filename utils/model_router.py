@@ -0,0 +1,172 @@
+# utils/model_router.py
+
+import time
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Groq models we route between: context window (tokens) and USD per million tokens.
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+MODELS = {
+    DEFAULT_MODEL: {"context": 131072, "input_cost": 0.05, "output_cost": 0.08},
+    "llama-3.3-70b-versatile": {"context": 131072, "input_cost": 0.59, "output_cost": 0.79},
+}
+
+# Quality tiers: the models a tool's calls may use, in order, and the most output a call may
+# buy. Every tier answers on the 8B model, as every tool did before routing. Only the "high"
+# tier (the graded critical-writing report) may fall back to the 70B model, about 10x the
+# price per call: Groq rate-limits each model separately, so when the 8B quota is exhausted
+# the 70B model can still answer instead of failing the report. The tool's declared output
+# size is capped at the tier's max_output_tokens.
+Tier = namedtuple("Tier", ["models", "max_output_tokens"])
+ROUTING_POLICY = {
+    "fast": Tier([DEFAULT_MODEL], 768),
+    "standard": Tier([DEFAULT_MODEL], 1536),
+    "high": Tier([DEFAULT_MODEL, "llama-3.3-70b-versatile"], 2048),
+}
+
+DEFAULT_TOOL = "default"
+
+ToolProfile = namedtuple("ToolProfile", ["output_tokens", "temperature", "quality"])
+Route = namedtuple("Route", ["tool", "model", "max_tokens", "temperature", "input_tokens", "fallbacks"])
+
+TOOL_PROFILES = {DEFAULT_TOOL: ToolProfile(1024, 0.5, "standard")}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def declare_tool(name, output_tokens=1024, temperature=0.5, quality="standard"):
+    """Registers a tool's needs with the router and returns the tool name."""
+    if quality not in ROUTING_POLICY:
+        raise ValueError(f"Unknown quality tier: {quality}")
+    TOOL_PROFILES[name] = ToolProfile(output_tokens, temperature, quality)
+    return name
+
+
+def estimate_tokens(messages):
+    """Cheap token estimate (~4 characters per token plus per-message overhead)."""
+    return sum(len(m.get("content") or "") // 4 + 4 for m in messages)
+
+
+def choose_route(tool, messages, output_tokens=None):
+    """Maps (tool, input size, output size) to a model, max_tokens and temperature."""
+    profile = TOOL_PROFILES.get(tool, TOOL_PROFILES[DEFAULT_TOOL])
+    tier = ROUTING_POLICY[profile.quality]
+    input_tokens = estimate_tokens(messages)
+    wanted_output = min(output_tokens or profile.output_tokens, tier.max_output_tokens)
+
+    chain = [model for model in tier.models if MODELS[model]["context"] >= input_tokens + min(wanted_output, 256)]
+    if not chain:
+        # Nothing fits; let the largest context model try and surface the provider's error.
+        chain = [max(MODELS, key=lambda m: MODELS[m]["context"])]
+
+    model = chain[0]
+    max_tokens = min(wanted_output, MODELS[model]["context"] - input_tokens)
+    return Route(tool, model, max(max_tokens, 1), profile.temperature, input_tokens, chain[1:])
+
+
+def classify_error(exc):
+    """Returns 'rate_limit', 'context_length', 'transient' or None for a provider error."""
+    status = getattr(exc, "status_code", None)
+    message = str(exc).lower()
+    if status == 429 or "rate limit" in message or "rate_limit" in message:
+        return "rate_limit"
+    if status == 413 or "context_length" in message or "context length" in message or "maximum context" in message:
+        return "context_length"
+    if (status is not None and status >= 500) or type(exc).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError"):
+        return "transient"
+    return None
+
+
+def _cost(model, input_tokens, output_tokens):
+    prices = MODELS[model]
+    return (input_tokens * prices["input_cost"] + output_tokens * prices["output_cost"]) / 1_000_000
+
+
+def _record(route, model, latency, output_tokens, failed_attempts):
+    cost = _cost(model, route.input_tokens, output_tokens)
+    logger.info(
+        "LLM route tool=%s model=%s in_tokens=%d max_tokens=%d latency=%.2fs est_cost=$%.5f fallbacks_used=%d",
+        route.tool, model, route.input_tokens, route.max_tokens, latency, cost, failed_attempts,
+    )
+    with _stats_lock:
+        entry = _stats.setdefault((route.tool, model), {"calls": 0, "latency": 0.0, "cost": 0.0, "fallbacks": 0})
+        entry["calls"] += 1
+        entry["latency"] += latency
+        entry["cost"] += cost
+        entry["fallbacks"] += failed_attempts
+
+
+def route_stats():
+    """Per (tool, model) call counts, mean latency and estimated spend since startup."""
+    with _stats_lock:
+        return {
+            f"{tool}:{model}": {
+                "calls": entry["calls"],
+                "mean_latency": entry["latency"] / entry["calls"],
+                "est_cost": round(entry["cost"], 6),
+                "fallbacks": entry["fallbacks"],
+            }
+            for (tool, model), entry in _stats.items()
+        }
+
+
+def _max_tokens(route, model):
+    return max(1, min(route.max_tokens, MODELS[model]["context"] - route.input_tokens))
+
+
+def _on_failure(route, model, exc, too_small):
+    """Logs a failed attempt and returns the updated too_small, re-raising errors no fallback can fix."""
+    kind = classify_error(exc)
+    if kind is None:
+        raise exc
+    logger.warning(f"LLM route {route.tool} on {model} failed ({kind}): {exc}")
+    return max(too_small, MODELS[model]["context"]) if kind == "context_length" else too_small
+
+
+def routed_response(groq_client, messages, tool=DEFAULT_TOOL, output_tokens=None):
+    """Sends messages on the route chosen for tool, walking the fallback chain on
+    rate-limit, context-length and transient provider errors."""
+    route = choose_route(tool, messages, output_tokens)
+    last_error = None
+    too_small = 0  # Largest context window that has already rejected this input
+    for attempt, model in enumerate([route.model] + list(route.fallbacks)):
+        if MODELS[model]["context"] <= too_small:
+            continue
+        start = time.perf_counter()
+        try:
+            response = groq_client.get_groq_response(
+                messages, model=model, temperature=route.temperature, max_tokens=_max_tokens(route, model)
+            )
+        except Exception as e:
+            too_small = _on_failure(route, model, e, too_small)
+            last_error = e
+            continue
+        _record(route, model, time.perf_counter() - start, len(response) // 4, attempt)
+        return response
+    raise last_error
+
+
+async def routed_response_async(groq_client, messages, tool=DEFAULT_TOOL, output_tokens=None):
+    """routed_response for clients whose get_groq_response is a coroutine."""
+    route = choose_route(tool, messages, output_tokens)
+    last_error = None
+    too_small = 0
+    for attempt, model in enumerate([route.model] + list(route.fallbacks)):
+        if MODELS[model]["context"] <= too_small:
+            continue
+        start = time.perf_counter()
+        try:
+            response = await groq_client.get_groq_response(
+                messages, model=model, temperature=route.temperature, max_tokens=_max_tokens(route, model)
+            )
+        except Exception as e:
+            too_small = _on_failure(route, model, e, too_small)
+            last_error = e
+            continue
+        _record(route, model, time.perf_counter() - start, len(response) // 4, attempt)
+        return response
+    raise last_error
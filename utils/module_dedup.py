@@ -0,0 +1,142 @@
+# utils/module_dedup.py
+
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from utils.storage import content_hash, load_json, save_json
+
+# Module packs repeat themselves: every deck carries the same title slide, footer and reading
+# list, and handouts restate the slides. Before the pack goes into a prompt, paragraphs are
+# deduplicated across files, exactly (normalised text hash) and approximately (MinHash/LSH
+# from utils.similarity). The first occurrence stays, tagged with where else it appeared.
+# The result is cached per module pack, on disk and in memory.
+
+logger = logging.getLogger(__name__)
+
+DEDUP_NAMESPACE = "module_dedup"
+DEDUP_VERSION = "2"  # Bump when the dedup rules change so cached packs are rebuilt
+MIN_WORDS = 3  # Shorter paragraphs (headings) are kept: cheap, and they give the text its structure
+NEAR_DUPLICATE_MIN_WORDS = 12
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MEMORY_CACHE_SIZE = 8
+
+DedupResult = namedtuple("DedupResult", [
+    "text", "original_tokens", "removed_tokens", "removed_paragraphs", "duplicates",
+])
+
+_NORMALISE = re.compile(r"[\W\d_]+")
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def _tokens(text):
+    # Same ~4 characters per token estimate as the model router
+    return len(text) // 4
+
+
+def split_blocks(text):
+    """Splits extracted text into (paragraphs, separator): blank-line blocks, else lines."""
+    if re.search(r"\n\s*\n", text):
+        return [block.strip() for block in re.split(r"\n\s*\n", text) if block.strip()], "\n\n"
+    return [line.strip() for line in text.split("\n") if line.strip()], "\n"
+
+
+def normalise(paragraph):
+    """Lower-cased words only: page/slide numbers, punctuation and spacing do not matter."""
+    return " ".join(_NORMALISE.sub(" ", paragraph.lower()).split())
+
+
+def _sources_note(sources, own_file):
+    # Repeats within the paragraph's own file (slide footers, headers) are dropped silently
+    counts = OrderedDict()
+    for source in sources:
+        if source != own_file:
+            counts[source] = counts.get(source, 0) + 1
+    if not counts:
+        return ""
+    return " [also in: " + ", ".join(f"{name} x{n}" if n > 1 else name for name, n in counts.items()) + "]"
+
+
+def _deduplicate(module_texts):
+    from utils.similarity import minhash, band_buckets, estimated_similarity
+
+    files = []  # (name, [paragraph], separator)
+    canonical_by_hash = {}  # normalised hash -> (file index, paragraph index)
+    buckets = {}  # LSH bucket -> [(file index, paragraph index, signature)]
+    duplicates = {}  # (file index, paragraph index) -> [source file]
+    removed = []
+    for name, text in module_texts.items():
+        paragraphs, separator = split_blocks(text or "")
+        kept = []
+        for paragraph in paragraphs:
+            normalised = normalise(paragraph)
+            words = len(normalised.split())
+            if words < MIN_WORDS:
+                kept.append(paragraph)
+                continue
+            position = (len(files), len(kept))
+            key = content_hash(normalised)
+            canonical = canonical_by_hash.get(key)
+            signature = None
+            if canonical is None and words >= NEAR_DUPLICATE_MIN_WORDS:
+                signature = minhash(normalised)
+                paragraph_buckets = band_buckets(signature)
+                candidates = {(f, p): s for bucket in paragraph_buckets for f, p, s in buckets.get(bucket, ())}
+                canonical = next(
+                    (c for c, s in candidates.items() if estimated_similarity(signature, s) >= NEAR_DUPLICATE_THRESHOLD),
+                    None,
+                )
+            if canonical is not None:
+                duplicates.setdefault(canonical, []).append(name)
+                removed.append(paragraph)
+                continue
+            canonical_by_hash[key] = position
+            if signature is not None:
+                for bucket in paragraph_buckets:
+                    buckets.setdefault(bucket, []).append((position[0], position[1], signature))
+            kept.append(paragraph)
+        files.append((name, kept, separator))
+
+    texts = []
+    for file_index, (name, kept, separator) in enumerate(files):
+        tagged = [
+            paragraph + _sources_note(duplicates[(file_index, i)], name) if (file_index, i) in duplicates else paragraph
+            for i, paragraph in enumerate(kept)
+        ]
+        texts.append(separator.join(tagged))
+    original = "\n".join(module_texts.values())
+    return {
+        "text": "\n".join(texts),
+        "original_tokens": _tokens(original),
+        "removed_tokens": sum(_tokens(paragraph) for paragraph in removed),
+        "removed_paragraphs": len(removed),
+        # The dedup index: canonical paragraph -> the files that repeated it
+        "duplicates": [[files[f][0], p, sources] for (f, p), sources in duplicates.items()],
+    }
+
+
+def dedup_modules(module_texts):
+    """Returns the DedupResult for a module pack ({filename: text}), building it on first use."""
+    key = content_hash(DEDUP_VERSION + json.dumps(module_texts, sort_keys=True))
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    cached = load_json(DEDUP_NAMESPACE, key)
+    if cached is None:
+        cached = _deduplicate(module_texts)
+        save_json(DEDUP_NAMESPACE, key, cached)
+        logger.info(
+            f"Module dedup {key[:12]}: removed {cached['removed_tokens']} of {cached['original_tokens']} tokens "
+            f"in {cached['removed_paragraphs']} duplicate paragraph(s) across {len(module_texts)} file(s)"
+        )
+    result = DedupResult(**cached)
+    with _memory_lock:
+        _memory[key] = result
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+    return result
@@ -0,0 +1,136 @@
+# utils/ocr.py
+
+import io
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.storage import content_hash, load_json, save_json
+
+# OCR fallback for scanned PDF pages. Pages whose text layer is (nearly) empty are rendered
+# to images and read by Tesseract in a bounded process pool; everything else never leaves
+# pdfplumber. Results are cached by the hash of the page image, so re-uploads and shared
+# briefs are only recognised once.
+#
+# pytesseract and the tesseract binary are optional: without them scanned pages stay empty
+# and a warning is logged once.
+
+logger = logging.getLogger(__name__)
+
+OCR_NAMESPACE = "ocr_pages"
+OCR_RESOLUTION = 300  # DPI the page is rendered at
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+MIN_TEXT_CHARS = 25  # Fewer letters/digits than this and the page has no usable text layer
+
+_pool = None
+_pool_lock = threading.Lock()
+_available = None
+_stats = {"pages": 0, "cached_pages": 0, "seconds": 0.0, "worker_seconds": 0.0}
+_stats_lock = threading.Lock()
+
+
+def needs_ocr(page_text):
+    """True when a page's extracted text is too thin to be its real content."""
+    return sum(1 for char in page_text or "" if char.isalnum()) < MIN_TEXT_CHARS
+
+
+def ocr_available():
+    """True if pytesseract and the tesseract binary can be used (checked once per process)."""
+    global _available
+    if _available is None:
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+            _available = True
+        except Exception as e:
+            logger.warning(f"OCR unavailable, scanned pages will have no text: {e}")
+            _available = False
+    return _available
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_page(page, resolution=OCR_RESOLUTION):
+    """Renders a pdfplumber page to greyscale PNG bytes."""
+    return _png(page.to_image(resolution=resolution).original.convert("L"))
+
+
+def render_pdfium_page(page, resolution=OCR_RESOLUTION):
+    """Renders a pypdfium2 page to greyscale PNG bytes."""
+    return _png(page.render(scale=resolution / 72, grayscale=True).to_pil().convert("L"))
+
+
+def _recognise(png_bytes, language):
+    """Worker: OCRs one page image; returns (text, seconds)."""
+    import pytesseract
+    from PIL import Image
+    started = time.perf_counter()
+    text = pytesseract.image_to_string(Image.open(io.BytesIO(png_bytes)), lang=language)
+    return text, time.perf_counter() - started
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+        return _pool
+
+
+def shutdown_pool():
+    """Stops the OCR workers (they are started on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def ocr_images(images, language=OCR_LANGUAGE):
+    """OCRs page images (PNG bytes) in the worker pool; cached pages are not recognised again."""
+    keys = [f"{language}:{content_hash(image)}" for image in images]
+    known = {}
+    missing = {}  # key -> image, each distinct page recognised once
+    for key, image in zip(keys, images):
+        if key in known or key in missing:
+            continue
+        cached = load_json(OCR_NAMESPACE, key)
+        if cached is None:
+            missing[key] = image
+        else:
+            known[key] = cached["text"]
+    started = time.perf_counter()
+    results = list(_get_pool().map(_recognise, missing.values(), [language] * len(missing))) if missing else []
+    elapsed = time.perf_counter() - started
+    for key, (text, _) in zip(missing, results):
+        known[key] = text
+        save_json(OCR_NAMESPACE, key, {"text": text})
+
+    worker_seconds = sum(seconds for _, seconds in results)
+    with _stats_lock:
+        _stats["pages"] += len(missing)
+        _stats["cached_pages"] += len(images) - len(missing)
+        _stats["seconds"] += elapsed
+        _stats["worker_seconds"] += worker_seconds
+    if missing:
+        logger.info(
+            f"OCR: {len(missing)} page(s) in {elapsed:.1f}s on {min(OCR_WORKERS, len(missing))} worker(s), "
+            f"{len(missing) / worker_seconds if worker_seconds else 0:.2f} pages/s per core; "
+            f"{len(images) - len(missing)} from cache"
+        )
+    return [known[key] for key in keys]
+
+
+def ocr_stats():
+    """Pages recognised and served from cache so far, and throughput in pages/s per core."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pages_per_core_second"] = stats["pages"] / stats["worker_seconds"] if stats["worker_seconds"] else None
+    return stats
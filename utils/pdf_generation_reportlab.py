@@ -10,9 +10,16 @@ from reportlab.lib.units import inch, mm
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import markdown
 import io
 from datetime import datetime
+from xml.sax.saxutils import escape
+
+from utils.report_markdown import parse_report
+
+# Report Markdown is parsed once (utils/report_markdown.py, cached by content hash) and each
+# block maps straight to a flowable with a style built once per process.
+
+CONTENT_WIDTH = A4[0] - 60  # Page width inside the 30pt side margins
 
 class SectionHeader(Flowable):
     """Custom flowable for section headers with background and border"""
@@ -126,15 +133,90 @@ def create_document_styles():
         alignment=TA_CENTER
     )
     
+    # Headings inside a report
+    heading_styles = {
+        level: ParagraphStyle(
+            f'ReportHeading{level}',
+            parent=styles['Heading2'],
+            fontSize=size,
+            leading=size + 4,
+            spaceBefore=12,
+            spaceAfter=6,
+            textColor=colors.HexColor('#2D5F8B'),
+            fontName='Helvetica-Bold'
+        )
+        for level, size in ((1, 16), (2, 14), (3, 12))
+    }
+    
+    # List items, indented by nesting depth
+    list_styles = {
+        depth: ParagraphStyle(
+            f'ListItem{depth}',
+            parent=body_style,
+            firstLineIndent=0,
+            alignment=TA_LEFT,
+            leftIndent=18 * (depth + 1),
+            bulletIndent=18 * depth + 4,
+            spaceAfter=3
+        )
+        for depth in range(4)
+    }
+    
+    quote_style = ParagraphStyle(
+        'Quote',
+        parent=body_style,
+        firstLineIndent=0,
+        leftIndent=20,
+        textColor=colors.HexColor('#555555'),
+        fontName='Helvetica-Oblique'
+    )
+    
+    table_cell_style = ParagraphStyle('TableCell', parent=styles['BodyText'], fontSize=10, leading=12)
+    table_header_style = ParagraphStyle(
+        'TableHeader', parent=table_cell_style, fontName='Helvetica-Bold', textColor=colors.white
+    )
+    
     return {
         'title': title_style,
         'section': section_style,
         'warning': warning_style,
         'success': success_style,
         'body': body_style,
-        'score': score_style
+        'score': score_style,
+        'heading1': heading_styles[1],
+        'heading2': heading_styles[2],
+        'heading3': heading_styles[3],
+        'list': list_styles,
+        'quote': quote_style,
+        'table_cell': table_cell_style,
+        'table_header': table_header_style,
     }
 
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2D5F8B')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F8FA')]),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCD6DD')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+
+_styles = None
+
+def document_styles():
+    """The document styles, built on first use and shared by every report this process renders"""
+    global _styles
+    if _styles is None:
+        _styles = create_document_styles()
+    return _styles
+
+_MARKUP = {'': ('', ''), 'b': ('<b>', '</b>'), 'i': ('<i>', '</i>'), 'bi': ('<b><i>', '</i></b>'),
+           'code': ('<font face="Courier">', '</font>')}
+
+def spans_markup(spans):
+    """ReportLab paragraph markup for inline spans, with the text escaped"""
+    return ''.join(f"{_MARKUP[style][0]}{escape(text)}{_MARKUP[style][1]}" for text, style in spans or ())
+
 def create_header_footer(canvas, doc):
     """Enhanced header and footer"""
     canvas.saveState()
@@ -166,52 +248,36 @@ def create_header_footer(canvas, doc):
     
     canvas.restoreState()
 
+def block_flowables(block, styles):
+    """Flowables for one parsed Markdown block"""
+    if block.kind == 'heading':
+        return [Paragraph(spans_markup(block.spans), styles[f'heading{min(block.level, 3)}'])]
+    if block.kind == 'paragraph':
+        return [Paragraph(spans_markup(block.spans), styles[block.tone])]
+    if block.kind == 'quote':
+        return [Paragraph(spans_markup(block.spans), styles['quote'])]
+    if block.kind in ('bullets', 'numbered'):
+        return [
+            Paragraph(spans_markup(spans), styles['list'][depth], bulletText='•' if number is None else f"{number}.")
+            for depth, number, spans in block.items
+        ]
+    if block.kind == 'table':
+        header, *body = block.items
+        data = [[Paragraph(spans_markup(cell), styles['table_header']) for cell in header]]
+        data += [[Paragraph(spans_markup(cell), styles['table_cell']) for cell in row] for row in body]
+        return [Table(data, colWidths=[CONTENT_WIDTH / len(header)] * len(header), repeatRows=1, style=TABLE_STYLE)]
+    if block.kind == 'rule':
+        return [HRFlowable(width="100%", thickness=1, color=colors.HexColor('#CCD6DD'), spaceBefore=4, spaceAfter=4)]
+    if block.kind == 'score':
+        return [Spacer(1, 10), ScoreBox(block.level), Spacer(1, 12)]
+    return []
+
 def format_content_section(content, styles):
     """Format content sections with appropriate styling"""
     elements = []
-    
-    # Extract score if present
-    score = None
-    if 'Score:' in content:
-        score_text = content.split('Score:')[1].split('/')[0].strip()
-        try:
-            score = float(score_text)
-            content = content.split('Score:')[0].strip()
-        except ValueError:
-            pass
-
-    # Split content into sections
-    sections = content.split('\n\n')
-    
-    for section in sections:
-        # Remove extra whitespace
-        section = section.strip()
-        
-        if not section:
-            continue
-            
-        # Apply appropriate style based on content
-        if any(keyword in section.lower() for keyword in [
-            'non-compliance', 'weaknesses', 'issues', 'errors', 
-            'lacking', 'missing', 'incorrect'
-        ]):
-            elements.append(Paragraph(section, styles['warning']))
-        elif any(keyword in section.lower() for keyword in [
-            'compliance', 'strengths', 'alignment', 'effective',
-            'good', 'clear', 'well-structured'
-        ]):
-            elements.append(Paragraph(section, styles['success']))
-        else:
-            elements.append(Paragraph(section, styles['body']))
-        
+    for block in parse_report(content):
+        elements.extend(block_flowables(block, styles))
         elements.append(Spacer(1, 8))
-    
-    # Add score if present
-    if score is not None:
-        elements.append(Spacer(1, 10))
-        elements.append(ScoreBox(score))
-        elements.append(Spacer(1, 20))
-    
     return elements
 
 def create_toc(reports_dict):
@@ -272,7 +338,7 @@ def generate_individual_pdf_report(report_title, report_content):
         bottomMargin=60
     )
     
-    styles = create_document_styles()
+    styles = document_styles()
     elements = []
     
     # Add title section
@@ -306,7 +372,7 @@ def generate_compiled_pdf_report(assignment_name, reports_dict):
         bottomMargin=60
     )
     
-    styles = create_document_styles()
+    styles = document_styles()
     elements = []
     
     # Cover page
@@ -0,0 +1,78 @@
+# utils/prompt_registry.py
+
+import os
+import re
+
+from utils.storage import content_hash
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+_FIELD = re.compile(r"\$\{(\w+)\}")
+
+
+class PromptTemplate:
+    """A prompt template split once into static segments and ${field} slots.
+
+    Templates keep their instructions first and the per-student content last, so every
+    call for the same tool shares one long static prefix (good for provider-side prompt
+    caching) and rendering is a single join.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.version = f"{name}@{content_hash(text)[:12]}"
+        parts = _FIELD.split(text)
+        self._static = parts[0::2]
+        self._fields = parts[1::2]
+        self.prefix = self._static[0]
+        self.suffix = self._static[-1]
+
+    @property
+    def fields(self):
+        return tuple(self._fields)
+
+    def render(self, **values):
+        out = [self.prefix]
+        for field, static in zip(self._fields, self._static[1:]):
+            out.append(str(values[field]))
+            out.append(static)
+        return "".join(out)
+
+    def messages(self, **values):
+        return [{"role": "user", "content": self.render(**values)}]
+
+
+class ToolResult(str):
+    """A tool's report text, tagged with the prompt version that produced it."""
+
+    def __new__(cls, text, prompt_version=None):
+        result = super().__new__(cls, text)
+        result.prompt_version = prompt_version
+        return result
+
+
+_REGISTRY = {}
+
+
+def load_prompts(directory=PROMPTS_DIR):
+    """Loads every *.txt template in directory into the registry."""
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".txt"):
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                template = PromptTemplate(filename[:-4], f.read())
+            _REGISTRY[template.name] = template
+    return dict(_REGISTRY)
+
+
+def get_prompt(name):
+    """Returns the registered PromptTemplate called name."""
+    return _REGISTRY[name]
+
+
+def prompt_versions():
+    """Maps each registered prompt name to its version string."""
+    return {name: template.version for name, template in _REGISTRY.items()}
+
+
+load_prompts()
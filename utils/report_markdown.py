@@ -0,0 +1,236 @@
+# utils/report_markdown.py
+
+import re
+import html
+import threading
+from collections import OrderedDict, namedtuple
+
+from utils.storage import content_hash
+
+# One-pass tokenizer for the Markdown the LLM writes in its reports. A report is read line by
+# line once into a tuple of blocks (headings, paragraphs, bullet and numbered lists, tables,
+# quotes, rules and the 'Score: X/10' line), each with its inline text already split into
+# bold/italic/code spans and, for paragraphs, its tone (warning, success or body) already
+# chosen. The PDF renderer (utils/pdf_generation_reportlab.py) and to_html map blocks
+# straight to output, so nothing is re-scanned per format.
+#
+# Parsed reports are cached by content hash: viewing, downloading, compiling or showing the
+# same report as HTML parses it once per process.
+
+Block = namedtuple("Block", ["kind", "spans", "level", "items", "tone"])
+# kind      heading | paragraph | quote | bullets | numbered | table | rule | score
+# spans     inline spans ((text, style), ...); style is "", "b", "i", "bi" or "code"
+# level     heading level, or the score (a float)
+# items     list items ((depth, number or None, spans), ...) or table rows ((cell spans, ...), ...), header first
+# tone      paragraphs and quotes: "warning", "success" or "body"
+
+CACHE_SIZE = 256  # Parsed reports kept in memory
+
+WARNING_WORDS = {"non-compliance", "weaknesses", "issues", "errors", "lacking", "missing", "incorrect"}
+SUCCESS_WORDS = {"compliance", "strengths", "alignment", "effective", "good", "clear", "well-structured"}
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^(\s*)[-*+•]\s+(.*)$")
+_NUMBERED = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+_TABLE_ROW = re.compile(r"^\s*\|(.*)\|\s*$")
+_TABLE_RULE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_QUOTE = re.compile(r"^\s*>\s?(.*)$")
+_SCORE = re.compile(r"^[\W_]*(?:(?:overall|total|final)\s+)?Score\s*[:=]?\s*\**\s*(\d+(?:\.\d+)?)\s*/\s*10\b", re.IGNORECASE)
+# Longest markers first, so ** is not read as two *
+_INLINE = re.compile(
+    r"`([^`]+)`|\*\*\*(.+?)\*\*\*|\*\*(.+?)\*\*|__(.+?)__|\*(?!\s)(.+?)(?<!\s)\*|\b_(?!\s)(.+?)(?<!\s)_\b"
+    r"|\[([^\]]+)\]\([^)\s]+\)"
+)
+_TONE = re.compile("|".join(sorted(map(re.escape, WARNING_WORDS | SUCCESS_WORDS), key=len, reverse=True)))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def inline_spans(text):
+    """Splits inline Markdown into (text, style) spans; links keep their text."""
+    spans, position = [], 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            spans.append((text[position:match.start()], ""))
+        code, bold_italic, bold, bold_under, italic, italic_under, link = match.groups()
+        if code is not None:
+            spans.append((code, "code"))
+        elif bold_italic is not None:
+            spans.append((bold_italic, "bi"))
+        elif bold is not None or bold_under is not None:
+            spans.extend((t, "b" if s in ("", "b") else "bi") for t, s in inline_spans(bold or bold_under))
+        elif italic is not None or italic_under is not None:
+            spans.extend((t, "i" if s in ("", "i") else "bi") for t, s in inline_spans(italic or italic_under))
+        else:
+            spans.extend(inline_spans(link))
+        position = match.end()
+    if position < len(text):
+        spans.append((text[position:], ""))
+    return tuple(spans)
+
+
+def _tone(text):
+    words = set(_TONE.findall(text.lower()))
+    if words & WARNING_WORDS:
+        return "warning"
+    if words & SUCCESS_WORDS:
+        return "success"
+    return "body"
+
+
+def _cells(row):
+    return tuple(inline_spans(cell.strip()) for cell in row.split("|"))
+
+
+def tokenize(text):
+    """Parses report Markdown into a tuple of Blocks in one pass over its lines."""
+    blocks = []
+    paragraph, quote, items, rows = [], [], [], []
+
+    def flush():
+        if paragraph:
+            joined = " ".join(paragraph)
+            blocks.append(Block("paragraph", inline_spans(joined), None, None, _tone(joined)))
+            paragraph.clear()
+        if quote:
+            joined = " ".join(quote)
+            blocks.append(Block("quote", inline_spans(joined), None, None, _tone(joined)))
+            quote.clear()
+        if items:
+            kind = "bullets" if items[0][1] is None else "numbered"
+            blocks.append(Block(kind, None, None, tuple(items), None))
+            items.clear()
+        if rows:
+            width = max(len(row) for row in rows)
+            blocks.append(Block("table", None, None, tuple(row + ((),) * (width - len(row)) for row in rows), None))
+            rows.clear()
+
+    for line in text.replace("\r\n", "\n").split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            flush()
+            continue
+        match = _TABLE_ROW.match(line)
+        if match:
+            if not rows:
+                flush()
+            if not _TABLE_RULE.match(line):
+                rows.append(_cells(match.group(1)))
+            continue
+        if rows:
+            flush()
+        score = _SCORE.match(stripped)
+        if score:
+            flush()
+            blocks.append(Block("score", None, float(score.group(1)), None, None))
+            continue
+        match = _HEADING.match(stripped)
+        if match:
+            flush()
+            blocks.append(Block("heading", inline_spans(match.group(2)), len(match.group(1)), None, None))
+            continue
+        if _RULE.match(stripped):
+            flush()
+            blocks.append(Block("rule", None, None, None, None))
+            continue
+        bullet, numbered = _BULLET.match(line), _NUMBERED.match(line)
+        if bullet or numbered:
+            number = int(numbered.group(2)) if numbered else None
+            indent = len((bullet or numbered).group(1).expandtabs(4))
+            # A top-level item of the other kind starts a new list; nested ones stay in this one
+            if not items and (paragraph or quote) or items and indent == 0 and (items[0][1] is None) != (number is None):
+                flush()
+            depth = min(indent // 2, items[-1][0] + 1 if items else 0, 3)
+            body = bullet.group(2) if bullet else numbered.group(3)
+            items.append((depth, number, inline_spans(body)))
+            continue
+        match = _QUOTE.match(line)
+        if match:
+            if not quote:
+                flush()
+            quote.append(match.group(1).strip())
+            continue
+        if items:
+            # A wrapped list item
+            depth, number, spans = items[-1]
+            items[-1] = (depth, number, spans + ((" ", ""),) + inline_spans(stripped))
+            continue
+        if quote:
+            flush()
+        paragraph.append(stripped)
+    flush()
+    return tuple(blocks)
+
+
+def parse_report(text):
+    """tokenize, cached by the content hash of the report."""
+    key = content_hash(text)
+    with _cache_lock:
+        blocks = _cache.get(key)
+        if blocks is not None:
+            _cache.move_to_end(key)
+            return blocks
+    blocks = tokenize(text)
+    with _cache_lock:
+        _cache[key] = blocks
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return blocks
+
+
+_HTML_TAGS = {"": ("", ""), "b": ("<strong>", "</strong>"), "i": ("<em>", "</em>"),
+              "bi": ("<strong><em>", "</em></strong>"), "code": ("<code>", "</code>")}
+
+
+def spans_html(spans):
+    return "".join(f"{_HTML_TAGS[style][0]}{html.escape(text)}{_HTML_TAGS[style][1]}" for text, style in spans or ())
+
+
+def _list_html(items):
+    out, tags = [], []  # Tags of the open lists, outermost first
+    for depth, number, spans in items:
+        if depth >= len(tags):
+            tag = "ul" if number is None else "ol"
+            start = f' start="{number}"' if number not in (None, 1) else ""
+            out.append(f"<{tag}{start}>")
+            tags.append(tag)
+        else:
+            out.append("</li>")
+            while len(tags) > depth + 1:
+                out.append(f"</{tags.pop()}></li>")
+        out.append(f"<li>{spans_html(spans)}")
+    out.append("</li>")
+    while tags:
+        out.append(f"</{tags.pop()}>" + ("</li>" if tags else ""))
+    return "".join(out)
+
+
+def to_html(blocks):
+    """Renders parsed blocks as an HTML fragment."""
+    out = []
+    for block in blocks:
+        if block.kind == "heading":
+            out.append(f"<h{block.level}>{spans_html(block.spans)}</h{block.level}>")
+        elif block.kind == "paragraph":
+            out.append(f'<p class="{block.tone}">{spans_html(block.spans)}</p>')
+        elif block.kind == "quote":
+            out.append(f"<blockquote>{spans_html(block.spans)}</blockquote>")
+        elif block.kind in ("bullets", "numbered"):
+            out.append(_list_html(block.items))
+        elif block.kind == "table":
+            header, *body = block.items
+            head = "".join(f"<th>{spans_html(cell)}</th>" for cell in header)
+            rows = "".join("<tr>" + "".join(f"<td>{spans_html(cell)}</td>" for cell in row) + "</tr>" for row in body)
+            out.append(f"<table><thead><tr>{head}</tr></thead><tbody>{rows}</tbody></table>")
+        elif block.kind == "rule":
+            out.append("<hr>")
+        elif block.kind == "score":
+            out.append(f'<p class="score">Score: {block.level:g}/10</p>')
+    return "\n".join(out)
+
+
+def report_html(text):
+    """A report's Markdown as an HTML fragment (parsed once, shared with the PDF renderer)."""
+    return to_html(parse_report(text))
@@ -0,0 +1,141 @@
+# utils/report_service.py
+
+import os
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils.storage import DATA_DIR, content_hash
+
+# Report lookup and PDF rendering shared by the Streamlit pages and the web apps. Rendered
+# PDFs are cached by the hash of (renderer version, title, content), in memory and on disk,
+# so a report is only ever laid out once however often it is viewed or downloaded.
+#
+# The disk cache is bounded: every PRUNE_EVERY renders, files not read for PDF_CACHE_MAX_AGE
+# are removed, then the least recently read ones until it fits in PDF_CACHE_MAX_BYTES. A read
+# refreshes a file's mtime, and a pruned report is simply rendered again when next viewed.
+
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout changes so cached files are rebuilt.
+PDF_RENDERER_VERSION = "reportlab@2"
+PDF_CACHE_DIR = os.path.join(DATA_DIR, "report_pdfs")
+MEMORY_CACHE_SIZE = 64
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+PDF_CACHE_MAX_AGE = float(os.getenv("PDF_CACHE_MAX_AGE", str(30 * 24 * 3600)))  # Seconds since last read
+PRUNE_EVERY = 50  # Renders between two scans of the disk cache
+
+# (state key, report title); compliance reports are already {title: content} per assignment.
+REPORT_SOURCES = [
+    ("compliance_reports", None),
+    ("grammar_reports", "Grammar Check"),
+    ("critical_writing_reports", "Critical Writing Check"),
+    ("reference_reports", "Reference Check"),
+]
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_renders = 0
+
+
+def assignment_reports(state, assignment_name):
+    """Collects {report title: report} for one assignment from session-style state."""
+    reports = {}
+    for state_key, title in REPORT_SOURCES:
+        entries = state.get(state_key) or {}
+        if assignment_name not in entries:
+            continue
+        if title is None:
+            reports.update(entries[assignment_name])
+        else:
+            reports[title] = entries[assignment_name]
+    return reports
+
+
+def report_key(report_title, report_content):
+    """Cache key for a rendered report."""
+    return content_hash(f"{PDF_RENDERER_VERSION}\n{report_title}\n{report_content}")
+
+
+def _remember(key, pdf_bytes):
+    with _memory_lock:
+        _memory[key] = pdf_bytes
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def cached_pdf(key):
+    """Returns the cached PDF bytes for key, or None if it has not been rendered yet."""
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    path = os.path.join(PDF_CACHE_DIR, f"{key}.pdf")
+    try:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        os.utime(path)  # Recently read files are pruned last
+    except OSError:
+        return None
+    _remember(key, pdf_bytes)
+    return pdf_bytes
+
+
+def prune_pdf_cache(max_bytes=None, max_age=None):
+    """Removes cached PDFs not read for max_age seconds, then the least recently read ones
+    until the cache fits in max_bytes. Returns the number of files removed."""
+    max_bytes = PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = PDF_CACHE_MAX_AGE if max_age is None else max_age
+    try:
+        entries = list(os.scandir(PDF_CACHE_DIR))
+    except OSError:
+        return 0
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue  # Removed by another worker
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()  # Least recently read first
+    now, total, removed = time.time(), sum(size for _, size, _ in files), 0
+    for mtime, size, path in files:
+        # Leftover .tmp files of an interrupted write only go by age
+        if now - mtime <= max_age and (total <= max_bytes or path.endswith(".tmp")):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"Pruned {removed} cached PDF(s); {total} bytes left")
+    return removed
+
+
+def render_report_pdf(report_title, report_content):
+    """Returns the PDF for a report, rendering it only if this exact report was never rendered."""
+    key = report_key(report_title, report_content)
+    pdf_bytes = cached_pdf(key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    from utils.pdf_generation_reportlab import generate_individual_pdf_report  # reportlab is slow to import
+    pdf_bytes = generate_individual_pdf_report(report_title, report_content)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, os.path.join(PDF_CACHE_DIR, f"{key}.pdf"))
+    _remember(key, pdf_bytes)
+    logger.info(f"Rendered PDF {report_title} ({len(pdf_bytes)} bytes, key {key[:12]})")
+    global _renders
+    with _memory_lock:
+        _renders += 1
+        prune = _renders % PRUNE_EVERY == 1
+    if prune:
+        prune_pdf_cache()
+    return pdf_bytes
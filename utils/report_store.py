@@ -0,0 +1,149 @@
+# utils/report_store.py
+
+import re
+import time
+from collections import namedtuple
+
+from utils.database import connect, register_schema, transaction
+
+# Report repository: one row per generated (or failed) report of an analysis job. Routes
+# look reports up here by id or by (job, assignment, tool) instead of carrying filenames
+# around in the session and probing the filesystem.
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    status TEXT NOT NULL,
+    prompt_version TEXT,
+    score REAL,
+    content_hash TEXT,
+    pdf_path TEXT,
+    error TEXT,
+    llm_seconds REAL,
+    pdf_seconds REAL,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS reports_job_assignment_tool ON reports (job_id, assignment, tool);
+CREATE INDEX IF NOT EXISTS reports_user_job ON reports (user_id, job_id);
+CREATE INDEX IF NOT EXISTS reports_assignment_tool ON reports (assignment, tool);
+CREATE INDEX IF NOT EXISTS reports_tool ON reports (tool);
+""")
+
+COLUMNS = (
+    "id", "user_id", "job_id", "assignment", "tool", "status", "prompt_version", "score",
+    "content_hash", "pdf_path", "error", "llm_seconds", "pdf_seconds", "created_at",
+)
+ReportRecord = namedtuple("ReportRecord", COLUMNS)
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_QUEUED = "queued"  # Waiting in the deferred task queue (degraded mode)
+
+_SCORE = re.compile(r"Score\s*[:=]?\s*\**\s*(\d+(?:\.\d+)?)\s*/\s*10", re.IGNORECASE)
+_FRACTION = r"(\d+(?:\.\d+)?)\s*/\s*(\d+)"
+# 'Argument Structure: 1.5/2', '### Evidence (2/2)', '**Clarity** - 1/2': the name, a separator
+# and a fraction that ends the line; a fraction anywhere else (e.g. quoted from the essay) is not a score
+_CRITERION = re.compile(rf"^[\s>*_#•+-]*(?:\d+[.)]\s+)?([A-Za-z][^:()\d]{{0,79}}?)[\s*_]*(?::|\(|\s[-–—])[\s*_]*{_FRACTION}[\s*_).]*$")
+_BARE_SCORE = re.compile(rf"^[\s>*_#•+-]*Score\s*[:=]?[\s*_]*{_FRACTION}[\s*_).]*$", re.IGNORECASE)
+_TRAILING = re.compile(rf"^[\s>*_•+-]*(?:\d+[.)]\s+)?([A-Za-z][^\d]{{0,79}}?)[\s*_]*{_FRACTION}[\s*_).]*$")
+_CELL = re.compile(rf"^[\s*_]*{_FRACTION}[\s*_]*$")
+_SCORES_SECTION = re.compile(r"\b(?:scores?|scoring|criteria|criterion|breakdown|marks|rubric)\b", re.IGNORECASE)
+_HEADING = re.compile(r"^\s*#{1,6}\s*(.*)$")
+_NAME_NOISE = re.compile(r"[^A-Za-z&/' -]+|\bscores?\b", re.IGNORECASE)
+_OVERALL_WORDS = ("overall", "total", "final")
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM reports"
+
+
+def parse_score(report_text):
+    """Returns the last 'Score: X/10' in a report as a float, or None."""
+    scores = _SCORE.findall(report_text or "")
+    return float(scores[-1]) if scores else None
+
+
+def _criterion_name(text):
+    return " ".join(_NAME_NOISE.sub(" ", text).split()).strip(" -/&'")
+
+
+def _criterion_score(line, heading, in_scores):
+    """(name, score, out of) of a line that scores a criterion, or None."""
+    if line.lstrip().startswith("|"):
+        # Table row: the first cell names the criterion, a cell holding only a fraction scores it
+        cells = line.strip().strip("|").split("|")
+        scored = [match for match in map(_CELL.match, cells[1:]) if match]
+        return (cells[0], *scored[-1].groups()) if scored else None
+    match = _BARE_SCORE.match(line)
+    if match:
+        # 'Score: 1.5/2' scores the section it is in; the overall X/10 is parse_score's
+        return (heading, *match.groups()) if match.group(2) != "10" else None
+    match = _CRITERION.match(line) or (in_scores and _TRAILING.match(line))
+    return match.groups() if match else None
+
+
+def parse_criteria(report_text):
+    """Returns {criterion: (score, out of)} for per-category scores such as 'Argument Structure: 1.5/2'.
+
+    A score is a fraction ending a 'Criterion: x/y' line, heading or table row, a bare
+    'Score: x/y' line (scoring its heading), or any line ending in one under a scores or
+    criteria heading. Fractions elsewhere, such as figures quoted from the essay, are not
+    scores. The overall 'Score: X/10' is left to parse_score.
+    """
+    criteria = {}
+    heading, in_scores = "", False
+    for line in (report_text or "").splitlines():
+        heading_match = _HEADING.match(line)
+        found = _criterion_score(line, heading, in_scores)
+        if heading_match and not found:
+            heading = _criterion_name(heading_match.group(1))
+            in_scores = bool(_SCORES_SECTION.search(heading_match.group(1)))
+        if not found:
+            continue
+        name, score, out_of = _criterion_name(found[0]), float(found[1]), float(found[2])
+        if not name or any(word in name.lower() for word in _OVERALL_WORDS):
+            continue
+        if 0 < out_of <= 100 and score <= out_of:
+            criteria[name] = (score, out_of)
+    return criteria
+
+
+def save_reports(records, path=None):
+    """Inserts or replaces report rows (dicts of column values) in one transaction."""
+    now = time.time()
+    fields = [column for column in COLUMNS if column != "id"]
+    rows = [tuple(record.get(field, now if field == "created_at" else None) for field in fields) for record in records]
+    with transaction(path) as conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO reports ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})", rows
+        )
+
+
+def job_reports(job_id, user_id=None, tools=None, path=None):
+    """Every report of a job (optionally only the user's, only some tools), in creation order."""
+    sql, params = f"{_SELECT} WHERE job_id = ?", [job_id]
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    if tools is not None:
+        sql += f" AND tool IN ({', '.join('?' * len(tools))})"
+        params.extend(tools)
+    return [ReportRecord(*row) for row in connect(path).execute(sql + " ORDER BY id", params)]
+
+
+def get_report(report_id, user_id=None, path=None):
+    """One report by primary key; None if missing or owned by another user."""
+    row = connect(path).execute(f"{_SELECT} WHERE id = ?", (report_id,)).fetchone()
+    record = ReportRecord(*row) if row else None
+    if record is None or (user_id is not None and record.user_id != user_id):
+        return None
+    return record
+
+
+def find_report(job_id, assignment, tool, path=None):
+    """One report by its (job, assignment, tool) key, or None."""
+    row = connect(path).execute(
+        f"{_SELECT} WHERE job_id = ? AND assignment = ? AND tool = ?", (job_id, assignment, tool)
+    ).fetchone()
+    return ReportRecord(*row) if row else None
@@ -0,0 +1,279 @@
+# utils/run_journal.py
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from utils.database import connect, register_schema, transaction
+from utils.storage import content_hash
+from utils.prompt_registry import ToolResult
+
+# Checkpoint journal for analysis jobs. Before a job runs, its plan (every (assignment,
+# report) task with its arguments) is written to the SQLite store, which runs in WAL mode.
+# As each task runs, two checkpoints are written: the LLM answer as soon as it arrives, and
+# the task's outcome once its PDF is written. If the worker dies halfway, resuming the job
+# replays the finished tasks from the journal, renders the answers that were already paid
+# for, and only calls the LLM for the tasks that never got one.
+#
+# Every text a job's tasks read (an assignment, a brief, the module pack) is journaled once per
+# job in run_texts; task rows and the job header refer to texts by content hash.
+#
+# Task ids are a hash of the job and the task itself, so journaling the same plan twice or
+# resuming a job twice never runs a task again. While a task runs, its job's heartbeat is
+# refreshed every HEARTBEAT_SECONDS (not only at checkpoints, so a long LLM call does not look
+# like a dead worker). A job whose heartbeat is STALE_SECONDS old counts as interrupted and can
+# be claimed by another worker (the /resume route, or the `resume` command of either app after a
+# restart: `flask --app main resume`, `quart --app asgi resume`).
+#
+# Claiming a job makes the claimant its owner. Checkpoints and finish_run only write while
+# their worker still owns the job; a worker that was fenced out gets RunLost and stops. A job's
+# results are recorded in the same transaction as its finish_run (see save_outcomes), so a
+# fenced-out worker's results are rolled back rather than overwriting its successor's.
+
+logger = logging.getLogger(__name__)
+
+RUNNING, DONE = "running", "done"
+STALE_SECONDS = float(os.getenv("RUN_STALE_SECONDS", "300"))  # Silence after which a running job is interrupted
+HEARTBEAT_SECONDS = STALE_SECONDS / 3  # Refresh interval while a task is in flight
+DONE_TTL = 7 * 24 * 3600.0  # Seconds a finished job's header is kept
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS analysis_runs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    submitter_id TEXT NOT NULL,
+    cohort_id TEXT,
+    reports_folder TEXT NOT NULL,
+    selected_tools TEXT NOT NULL,
+    assignments TEXT NOT NULL,  -- {assignment name: text hash}
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_runs_status ON analysis_runs (status, user_id, heartbeat_at);
+CREATE TABLE IF NOT EXISTS run_tasks (
+    task_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    assignment TEXT NOT NULL,
+    title TEXT NOT NULL,
+    args TEXT NOT NULL,  -- [text hash per argument]
+    kwargs TEXT NOT NULL,
+    response TEXT,
+    prompt_version TEXT,
+    outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS run_tasks_job ON run_tasks (job_id, seq);
+CREATE TABLE IF NOT EXISTS run_texts (
+    job_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (job_id, hash)
+);
+""")
+
+Run = namedtuple("Run", [
+    "job_id", "user_id", "submitter_id", "cohort_id", "reports_folder", "selected_tools", "assignments_text", "tasks", "finished",
+])
+
+_WORKER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_beats = {}  # (path, job_id) -> _Heartbeat of this process
+_beats_lock = threading.Lock()
+
+
+class RunLost(Exception):
+    """Another worker has claimed the job; this one must stop writing to it."""
+    def __init__(self, job_id):
+        super().__init__(f"Analysis job {job_id} was taken over by another worker")
+
+
+def task_id(job_id, task):
+    """Idempotent id of a job's task: the same task of the same job always gets the same id."""
+    return content_hash(json.dumps([job_id, task.assignment, task.title, list(task.args), task.kwargs], sort_keys=True))
+
+
+def start_run(job_id, user_id, cohort_id, reports_folder, selected_tools, assignments_text, tasks, submitter_id=None, path=None):
+    """Journals a job's plan before any of it runs; tasks already journaled keep their checkpoints.
+    submitter_id (default user_id) is who the job's scores are filed under."""
+    now = time.time()
+    texts = {}
+
+    def ref(text):
+        key = content_hash(text)
+        texts[key] = text
+        return key
+
+    assignments = {name: ref(text) for name, text in assignments_text.items()}
+    rows = [
+        (task_id(job_id, task), job_id, seq, task.assignment, task.title, json.dumps([ref(arg) for arg in task.args]),
+         json.dumps(task.kwargs))
+        for seq, task in enumerate(tasks)
+    ]
+    conn = connect(path)
+    with conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO analysis_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, user_id, submitter_id or user_id, cohort_id, reports_folder, json.dumps(selected_tools),
+             json.dumps(assignments), RUNNING, _WORKER, now, now),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO run_texts VALUES (?, ?, ?)", [(job_id, h, text) for h, text in texts.items()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO run_tasks (task_id, job_id, seq, assignment, title, args, kwargs) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def journaled_outcome(tid, path=None):
+    """The recorded outcome fields of a finished task, or None."""
+    row = connect(path).execute("SELECT outcome FROM run_tasks WHERE task_id = ?", (tid,)).fetchone()
+    return json.loads(row[0]) if row and row[0] is not None else None
+
+
+def journaled_response(tid, path=None):
+    """The LLM answer checkpointed for a task (a ToolResult), or None if it never got one."""
+    row = connect(path).execute("SELECT response, prompt_version FROM run_tasks WHERE task_id = ?", (tid,)).fetchone()
+    return ToolResult(row[0], row[1]) if row and row[0] is not None else None
+
+
+def _touch(conn, tid, now):
+    # Refreshes the heartbeat of the task's job if this worker still owns it; raises RunLost otherwise
+    job_id = conn.execute("SELECT job_id FROM run_tasks WHERE task_id = ?", (tid,)).fetchone()
+    if job_id is None:
+        return  # Not journaled (or its job already finished)
+    if not _beat(conn, job_id[0], now):
+        raise RunLost(job_id[0])
+
+
+def _beat(conn, job_id, now):
+    return conn.execute(
+        "UPDATE analysis_runs SET heartbeat_at = ? WHERE job_id = ? AND owner = ? AND status = ?",
+        (now, job_id, _WORKER, RUNNING),
+    ).rowcount
+
+
+def record_response(tid, response, path=None):
+    """Checkpoints a task's LLM answer the moment it arrives (RunLost if the job was claimed elsewhere)."""
+    conn = connect(path)
+    with conn:
+        _touch(conn, tid, time.time())
+        conn.execute(
+            "UPDATE run_tasks SET response = ?, prompt_version = ? WHERE task_id = ?",
+            (str(response), getattr(response, "prompt_version", None), tid),
+        )
+
+
+def record_outcome(tid, fields, path=None):
+    """Checkpoints a finished task's outcome fields (JSON-serialisable); RunLost if the job was claimed elsewhere."""
+    conn = connect(path)
+    with conn:
+        _touch(conn, tid, time.time())
+        conn.execute("UPDATE run_tasks SET outcome = ? WHERE task_id = ?", (json.dumps(fields), tid))
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, job_id, path):
+        super().__init__(name=f"heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.path = path
+        self.users = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_SECONDS):
+            try:
+                conn = connect(self.path)
+                with conn:
+                    owned = _beat(conn, self.job_id, time.time())
+            except Exception as e:
+                logger.error(f"Error refreshing the heartbeat of job {self.job_id}: {e}")
+                continue
+            if not owned:
+                # Claimed elsewhere or finished: the next checkpoint raises RunLost if need be
+                return
+
+
+@contextmanager
+def heartbeat(job_id, path=None):
+    """Keeps the job's heartbeat fresh while the block runs; one thread per job however many tasks are in flight."""
+    key = (path, job_id)
+    with _beats_lock:
+        beat = _beats.get(key)
+        if beat is None:
+            beat = _beats[key] = _Heartbeat(job_id, path)
+            beat.start()
+        beat.users += 1
+    try:
+        yield
+    finally:
+        with _beats_lock:
+            beat.users -= 1
+            if not beat.users:
+                del _beats[key]
+                beat.stopped.set()
+
+
+def finish_run(job_id, path=None):
+    """Closes a job whose outcomes are recorded: its task rows and texts go, its header stays a while.
+    RunLost if another worker has claimed the job (an enclosing transaction() then rolls back)."""
+    now = time.time()
+    with transaction(path) as conn:
+        if not conn.execute(
+            "UPDATE analysis_runs SET status = ?, heartbeat_at = ? WHERE job_id = ? AND owner = ? AND status = ?",
+            (DONE, now, job_id, _WORKER, RUNNING),
+        ).rowcount:
+            raise RunLost(job_id)
+        conn.execute("DELETE FROM run_tasks WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM run_texts WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM analysis_runs WHERE status = ? AND heartbeat_at < ?", (DONE, now - DONE_TTL))
+
+
+def interrupted_runs(user_id=None, force=False, path=None):
+    """Job ids of running jobs whose worker went quiet (any running job when force), oldest first."""
+    sql, params = "SELECT job_id FROM analysis_runs WHERE status = ?", [RUNNING]
+    if not force:
+        sql += " AND heartbeat_at < ?"
+        params.append(time.time() - STALE_SECONDS)
+    if user_id is not None:
+        sql += " AND user_id = ?"
+        params.append(user_id)
+    return [row[0] for row in connect(path).execute(sql + " ORDER BY created_at", params)]
+
+
+def claim_run(job_id, task_type, force=False, path=None):
+    """Takes over an interrupted job as a Run, with tasks built by task_type(assignment, title, args, kwargs);
+    None if the job is finished, unknown or (unless force) still making progress elsewhere."""
+    now = time.time()
+    conn = connect(path)
+    with conn:
+        claimed = conn.execute(
+            "UPDATE analysis_runs SET owner = ?, heartbeat_at = ? WHERE job_id = ? AND status = ? AND heartbeat_at < ?",
+            (_WORKER, now, job_id, RUNNING, now if force else now - STALE_SECONDS),
+        ).rowcount
+    if not claimed:
+        return None
+    header = conn.execute(
+        "SELECT user_id, submitter_id, cohort_id, reports_folder, selected_tools, assignments FROM analysis_runs WHERE job_id = ?",
+        (job_id,),
+    ).fetchone()
+    rows = conn.execute(
+        "SELECT assignment, title, args, kwargs, outcome IS NOT NULL FROM run_tasks WHERE job_id = ? ORDER BY seq",
+        (job_id,),
+    ).fetchall()
+    texts = dict(conn.execute("SELECT hash, text FROM run_texts WHERE job_id = ?", (job_id,)))
+    tasks = [
+        task_type(row[0], row[1], tuple(texts[h] for h in json.loads(row[2])), json.loads(row[3])) for row in rows
+    ]
+    assignments_text = {name: texts[h] for name, h in json.loads(header[5]).items()}
+    return Run(
+        job_id, header[0], header[1], header[2], header[3], json.loads(header[4]), assignments_text, tasks,
+        sum(1 for row in rows if row[4]),
+    )
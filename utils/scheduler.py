@@ -0,0 +1,212 @@
+# utils/scheduler.py
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+
+# Priority and fair-share scheduling for the shared executors (LLM calls, PDF rendering).
+# Work is tagged with a priority class and a tenant (the user) through context variables,
+# set once where the work starts (scheduling(...)) and inherited by everything it calls,
+# including asyncio tasks it spawns.
+#
+# Each scheduler has a total number of slots and a cap per class. A free slot goes to the
+# highest class that has work waiting and is under its cap, so an interactive upload never
+# waits behind a batch; the batch and speculative caps stay below the total to leave room
+# for it. Within a class, tenants are served by start-time weighted fair queuing: each
+# request is stamped with a virtual finish time based on its tenant's previous requests, so
+# a user with 500 queued assignments and a user with one take turns instead of queuing FIFO.
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BATCH, SPECULATIVE = "interactive", "batch", "speculative"
+CLASSES = (INTERACTIVE, BATCH, SPECULATIVE)  # Highest priority first
+
+_priority = ContextVar("scheduler_priority", default=INTERACTIVE)
+_tenant = ContextVar("scheduler_tenant", default=None)
+
+TENANT_WEIGHTS = {}  # Tenant -> share weight (default 1); a weight of 2 gets twice the slots of 1
+
+
+def _slots(name, klass, default):
+    """Slot count from <NAME>_SLOTS or <NAME>_<CLASS>_SLOTS, e.g. LLM_BATCH_SLOTS=4."""
+    variable = f"{name.upper()}_{klass.upper()}_SLOTS" if klass else f"{name.upper()}_SLOTS"
+    return max(1, int(os.getenv(variable, str(default))))
+
+
+@contextmanager
+def scheduling(priority=INTERACTIVE, tenant=None):
+    """Runs the block's scheduled work in a priority class on behalf of a tenant."""
+    if priority not in CLASSES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    priority_token, tenant_token = _priority.set(priority), _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(tenant_token)
+        _priority.reset(priority_token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class _Waiter:
+    def __init__(self, klass, tenant, start, finish, grant):
+        self.klass = klass
+        self.tenant = tenant
+        self.start = start
+        self.finish = finish
+        self.grant = grant
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+
+
+class _ClassQueue:
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.heap = []  # (virtual finish, sequence, waiter)
+        self.virtual_time = 0.0
+        self.finish = {}  # Tenant -> virtual finish of its latest request
+        self.served = 0
+        self.waited = 0.0  # Seconds spent queued, summed over served requests
+        self.max_wait = 0.0
+
+
+class Scheduler:
+    """Slots for one executor, handed out by priority class, then fairly across tenants."""
+    def __init__(self, name, capacity, limits=None):
+        self.name = name
+        self.capacity = capacity
+        limits = limits or {}
+        self.classes = {klass: _ClassQueue(min(capacity, limits.get(klass, capacity))) for klass in CLASSES}
+        self.running = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, cost, grant):
+        klass, tenant = _priority.get(), _tenant.get()
+        queue = self.classes[klass]
+        start = max(queue.virtual_time, queue.finish.get(tenant, 0.0))
+        finish = start + cost / TENANT_WEIGHTS.get(tenant, 1.0)
+        queue.finish[tenant] = finish
+        waiter = _Waiter(klass, tenant, start, finish, grant)
+        heapq.heappush(queue.heap, (finish, next(self._sequence), waiter))
+        self._dispatch()
+        return waiter
+
+    def _dispatch(self):
+        # Called with the lock held: fills free slots, highest class first
+        while self.running < self.capacity:
+            for queue in self.classes.values():
+                while queue.heap and queue.heap[0][2].cancelled:
+                    heapq.heappop(queue.heap)
+                if queue.heap and queue.running < queue.limit:
+                    break
+            else:
+                return
+            waiter = heapq.heappop(queue.heap)[2]
+            queue.virtual_time = waiter.start
+            if not queue.heap:
+                queue.finish = {t: f for t, f in queue.finish.items() if f > queue.virtual_time}
+            waited = time.monotonic() - waiter.queued_at
+            queue.served += 1
+            queue.waited += waited
+            queue.max_wait = max(queue.max_wait, waited)
+            queue.running += 1
+            self.running += 1
+            waiter.granted = True
+            waiter.grant()
+
+    def _release(self, klass):
+        with self._lock:
+            self.classes[klass].running -= 1
+            self.running -= 1
+            self._dispatch()
+
+    def _withdraw(self, waiter):
+        """Takes a waiter that gave up out of the queue; False if it already holds a slot."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            return True
+
+    @contextmanager
+    def slot(self, cost=1.0):
+        """Blocks the thread until the current class and tenant get a slot, and holds it for the block."""
+        granted = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(cost, granted.set)
+        granted.wait()
+        try:
+            yield
+        finally:
+            self._release(waiter.klass)
+
+    @asynccontextmanager
+    async def slot_async(self, cost=1.0):
+        """slot for coroutines: waiting suspends the coroutine, not the event loop."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._lock:
+            waiter = self._enqueue(cost, grant)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if not self._withdraw(waiter):
+                self._release(waiter.klass)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter.klass)
+
+    def stats(self):
+        """Slots in use and queue depth per class, with time spent waiting."""
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "running": self.running,
+                "classes": {
+                    klass: {
+                        "limit": queue.limit,
+                        "running": queue.running,
+                        "queued": sum(1 for _, _, w in queue.heap if not w.cancelled),
+                        "tenants_queued": len({w.tenant for _, _, w in queue.heap if not w.cancelled}),
+                        "served": queue.served,
+                        "mean_wait": round(queue.waited / queue.served, 3) if queue.served else 0.0,
+                        "max_wait": round(queue.max_wait, 3),
+                    }
+                    for klass, queue in self.classes.items()
+                },
+            }
+
+
+def _scheduler(name, capacity):
+    capacity = _slots(name, None, capacity)
+    limits = {
+        INTERACTIVE: _slots(name, INTERACTIVE, capacity),
+        BATCH: _slots(name, BATCH, max(1, capacity * 3 // 4)),
+        SPECULATIVE: _slots(name, SPECULATIVE, max(1, capacity // 4)),
+    }
+    return Scheduler(name, capacity, limits)
+
+
+LLM_SCHEDULER = _scheduler("llm", 8)
+PDF_SCHEDULER = _scheduler("pdf", os.cpu_count() or 1)
+
+
+def scheduler_stats():
+    return {"llm": LLM_SCHEDULER.stats(), "pdf": PDF_SCHEDULER.stats()}
@@ -0,0 +1,251 @@
+# utils/similarity.py
+
+import re
+import json
+import time
+import zlib
+import hashlib
+import logging
+from difflib import SequenceMatcher
+
+from utils.database import connect, register_schema
+from utils.storage import content_hash
+
+# Near-duplicate detection within a cohort. Each submission is reduced to word shingles and
+# a MinHash signature; LSH banding puts signatures that agree on a whole band in the same
+# bucket, so a new submission is only compared with the few submissions it shares a bucket
+# with instead of with the whole cohort. Signatures and buckets are persisted, so every
+# job only indexes its own submissions.
+#
+# numpy is imported on first use so it stays out of the apps' cold start.
+
+logger = logging.getLogger(__name__)
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    cohort_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    text BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_cohort_user_assignment ON submissions (cohort_id, user_id, assignment);
+CREATE INDEX IF NOT EXISTS submissions_cohort_text ON submissions (cohort_id, text_hash);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    cohort_id TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    submission_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_buckets_cohort_bucket ON lsh_buckets (cohort_id, bucket);
+CREATE INDEX IF NOT EXISTS lsh_buckets_submission ON lsh_buckets (submission_id);
+CREATE TABLE IF NOT EXISTS similar_pairs (
+    first_id INTEGER NOT NULL,
+    second_id INTEGER NOT NULL,
+    cohort_id TEXT NOT NULL,
+    similarity REAL NOT NULL,
+    excerpts TEXT NOT NULL,
+    PRIMARY KEY (first_id, second_id)
+);
+CREATE INDEX IF NOT EXISTS similar_pairs_cohort ON similar_pairs (cohort_id, similarity);
+""")
+
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32  # 4 rows per band: pairs above ~0.42 Jaccard become candidates
+SIMILARITY_THRESHOLD = 0.5  # Estimated Jaccard similarity at which a pair is reported
+EXCERPT_MIN_WORDS = 12
+EXCERPT_LIMIT = 3
+EXCERPT_MAX_WORDS = 60
+REPORT_LIMIT = 100
+
+_WORD = re.compile(r"\w+")
+_PERMUTATIONS = None
+
+
+def _permutations():
+    # Fixed seed: signatures are persisted and must stay comparable across processes
+    global _PERMUTATIONS
+    if _PERMUTATIONS is None:
+        import numpy as np
+        rng = np.random.default_rng(20240517)
+        a = rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+        b = rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+        _PERMUTATIONS = a, b
+    return _PERMUTATIONS
+
+
+def shingle_hashes(text):
+    """32-bit hashes of the text's overlapping SHINGLE_WORDS-word shingles (lower-cased words)."""
+    import numpy as np
+
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    k = min(SHINGLE_WORDS, len(words))
+    # Polynomial combination of k consecutive word hashes, all windows at once
+    shingles = np.zeros(len(words) - k + 1, dtype=np.uint64)
+    for offset in range(k):
+        shingles = shingles * np.uint64(1000003) + word_hashes[offset:len(words) - k + 1 + offset]
+    return np.unique(shingles >> np.uint64(32) ^ (shingles & np.uint64(0xFFFFFFFF)))
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM uint64 values) of the text's shingle set; None for empty text."""
+    import numpy as np
+
+    shingles = shingle_hashes(text)
+    if not shingles.size:
+        return None
+    a, b = _permutations()
+    # Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits; one row per permutation
+    with np.errstate(over="ignore"):
+        hashed = (a[:, None] * shingles[None, :] + b[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1)
+
+
+def band_buckets(signature):
+    """One bucket id per LSH band (a 63-bit hash of the band index and its rows)."""
+    rows = NUM_PERM // BANDS
+    buckets = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8, person=band.to_bytes(4, "little")).digest()
+        buckets.append(int.from_bytes(digest, "little") >> 1)
+    return buckets
+
+
+def estimated_similarity(first, second):
+    """Estimated Jaccard similarity: the share of MinHash values two signatures agree on."""
+    return float((first == second).mean())
+
+
+def overlap_excerpts(first_text, second_text, limit=EXCERPT_LIMIT, min_words=EXCERPT_MIN_WORDS):
+    """The longest word runs two texts share (at least min_words words), longest first."""
+    first_words, second_words = first_text.split(), second_text.split()
+    matcher = SequenceMatcher(
+        None, [w.lower() for w in first_words], [w.lower() for w in second_words], autojunk=False
+    )
+    blocks = [block for block in matcher.get_matching_blocks() if block.size >= min_words]
+    blocks.sort(key=lambda block: block.size, reverse=True)
+    excerpts = []
+    for block in blocks[:limit]:
+        excerpt = " ".join(first_words[block.a:block.a + min(block.size, EXCERPT_MAX_WORDS)])
+        excerpts.append(excerpt + (" ..." if block.size > EXCERPT_MAX_WORDS else ""))
+    return excerpts
+
+
+def _remove(conn, submission_id):
+    conn.execute("DELETE FROM lsh_buckets WHERE submission_id = ?", (submission_id,))
+    conn.execute("DELETE FROM similar_pairs WHERE first_id = ? OR second_id = ?", (submission_id, submission_id))
+    conn.execute("DELETE FROM submissions WHERE id = ?", (submission_id,))
+
+
+def _index_one(conn, cohort_id, user_id, job_id, assignment, text):
+    """Indexes one submission and returns its new similar pairs as (other id, similarity, excerpts)."""
+    import numpy as np
+
+    text_hash = content_hash(text)
+    existing = conn.execute(
+        "SELECT id, text_hash FROM submissions WHERE cohort_id = ? AND user_id = ? AND assignment = ?", (cohort_id, user_id, assignment)
+    ).fetchone()
+    if existing:
+        # The submitter uploading the same file again is not a new submission; anyone else's
+        # identical text is indexed (and paired) like any other
+        if existing[1] == text_hash:
+            return []
+        _remove(conn, existing[0])
+    signature = minhash(text)
+    if signature is None:
+        return []
+
+    buckets = band_buckets(signature)
+    candidates = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT submission_id FROM lsh_buckets WHERE cohort_id = ? AND bucket IN ({', '.join('?' * len(buckets))})",
+        [cohort_id, *buckets],
+    )]
+    submission_id = conn.execute(
+        "INSERT INTO submissions (cohort_id, user_id, assignment, job_id, text_hash, signature, text, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (cohort_id, user_id, assignment, job_id, text_hash, signature.tobytes(), zlib.compress(text.encode("utf-8")), time.time()),
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO lsh_buckets (cohort_id, bucket, submission_id) VALUES (?, ?, ?)",
+        [(cohort_id, bucket, submission_id) for bucket in buckets],
+    )
+
+    pairs = []
+    for other_id in candidates:
+        other_signature, other_text = conn.execute(
+            "SELECT signature, text FROM submissions WHERE id = ?", (other_id,)
+        ).fetchone()
+        similarity = estimated_similarity(signature, np.frombuffer(other_signature, dtype=np.uint64))
+        if similarity < SIMILARITY_THRESHOLD:
+            continue
+        excerpts = overlap_excerpts(text, zlib.decompress(other_text).decode("utf-8"))
+        conn.execute(
+            "INSERT OR REPLACE INTO similar_pairs (first_id, second_id, cohort_id, similarity, excerpts) VALUES (?, ?, ?, ?, ?)",
+            (other_id, submission_id, cohort_id, similarity, json.dumps(excerpts)),
+        )
+        pairs.append((other_id, similarity, excerpts))
+    return pairs
+
+
+def index_submissions(cohort_id, user_id, job_id, assignments_text, path=None):
+    """Adds a job's submissions to the cohort index; returns how many new similar pairs were found.
+
+    user_id identifies the submitter across uploads. Their re-uploads of an indexed file are skipped;
+    a changed resubmission replaces its earlier signature and pairs.
+    """
+    conn = connect(path)
+    found = 0
+    with conn:
+        for assignment, text in assignments_text.items():
+            pairs = _index_one(conn, cohort_id, user_id, job_id, assignment, text)
+            for other_id, similarity, _ in pairs:
+                logger.warning(f"{assignment} is {similarity:.0%} similar to submission {other_id} in cohort {cohort_id}")
+            found += len(pairs)
+    return found
+
+
+def similarity_report(cohort_id, job_ids=None, limit=REPORT_LIMIT, path=None):
+    """The cohort's similar pairs, most similar first, with their overlapping excerpts.
+
+    With job_ids (a submitter's own jobs), only pairs involving those jobs are listed and the
+    other submission is not identified beyond its file name.
+    """
+    conn = connect(path)
+    submissions = conn.execute("SELECT COUNT(*) FROM submissions WHERE cohort_id = ?", (cohort_id,)).fetchone()[0]
+    sql, params = (
+        "SELECT p.similarity, p.excerpts, a.assignment, a.job_id, b.assignment, b.job_id "
+        "FROM similar_pairs p JOIN submissions a ON a.id = p.first_id JOIN submissions b ON b.id = p.second_id "
+        "WHERE p.cohort_id = ?"
+    ), [cohort_id]
+    if job_ids is not None:
+        marks = ", ".join("?" * len(job_ids))
+        sql += f" AND (a.job_id IN ({marks}) OR b.job_id IN ({marks}))"
+        params += [*job_ids, *job_ids]
+    rows = conn.execute(sql + " ORDER BY p.similarity DESC LIMIT ?", [*params, limit]).fetchall()
+
+    def side(assignment, job_id):
+        if job_ids is None or job_id in job_ids:
+            return {"assignment": assignment, "job_id": job_id}
+        return {"assignment": assignment, "job_id": None}
+
+    return {
+        "cohort_id": cohort_id,
+        "submissions": submissions,
+        "threshold": SIMILARITY_THRESHOLD,
+        "pairs": [
+            {
+                "first": side(first, first_job),
+                "second": side(second, second_job),
+                "similarity": round(similarity, 3),
+                "excerpts": json.loads(excerpts),
+            }
+            for similarity, excerpts, first, first_job, second, second_job in rows
+        ],
+    }
@@ -0,0 +1,233 @@
+# utils/single_flight.py
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+
+from utils.database import connect, register_schema
+from utils.storage import content_hash
+
+# Single-flight coalescing for LLM calls. When identical prompts are in flight at the same
+# time (several markers opening the same submission, duplicate files in a batch), only the
+# first one goes upstream; the others wait for it and share its answer.
+#
+# Within a process, waiters block on the leader's flight (threads) or await its future
+# (coroutines). Across worker processes the flight is a row in the shared SQLite store: the
+# process that inserts it leads, the others poll it until the answer is written. A failed or
+# abandoned flight is taken over by the next waiter, which makes its own call; so is the flight
+# of a leader that was cancelled (its client went away), which lands as failed right away
+# instead of holding the others until FLIGHT_TIMEOUT. Only calls that overlap are coalesced;
+# a prompt arriving after its flight has landed starts a new one.
+
+logger = logging.getLogger(__name__)
+
+SHARED_FLIGHTS = os.getenv("LLM_SHARED_FLIGHTS", "1") != "0"  # Coalesce across processes too
+FLIGHT_TIMEOUT = 300.0  # Seconds after which a running flight is presumed abandoned
+RESULT_TTL = 60.0  # Seconds a landed flight's row is kept for slow pollers
+POLL_INTERVAL = 0.05  # First wait between polls of another process's flight; doubles up to
+MAX_POLL_INTERVAL = 1.0
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS llm_flights (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    response TEXT
+);
+""")
+
+_OWNER_PREFIX = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_flights = {}  # key -> _Flight, threads of this process
+_flights_lock = threading.Lock()
+_async_flights = {}  # key -> Future, coroutines of this process's event loop
+_stats = {"leaders": 0, "coalesced": 0, "coalesced_shared": 0, "taken_over": 0}
+_stats_lock = threading.Lock()
+
+
+class _Abandoned(Exception):
+    """The leader of an in-process async flight was cancelled; a waiter takes the flight over."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def prompt_key(messages, model, temperature, max_tokens):
+    """Hash of a request with its prompt whitespace-normalised; identical keys get identical answers."""
+    normalised = [[m.get("role"), " ".join((m.get("content") or "").split())] for m in messages]
+    return content_hash(json.dumps([model, temperature, max_tokens, normalised]))
+
+
+def _claim(key, owner, path, takeover=False):
+    """Tries to lead the shared flight for key: a new one, a landed one or (when takeover) a failed or abandoned one."""
+    now = time.time()
+    conn = connect(path)
+    with conn:
+        if conn.execute(
+            "INSERT OR IGNORE INTO llm_flights (key, owner, status, started_at) VALUES (?, ?, ?, ?)",
+            (key, owner, RUNNING, now),
+        ).rowcount:
+            return True
+        statuses = (DONE, FAILED) if takeover else (DONE,)
+        return bool(conn.execute(
+            f"UPDATE llm_flights SET owner = ?, status = ?, started_at = ?, finished_at = NULL, response = NULL "
+            f"WHERE key = ? AND (status IN ({', '.join('?' * len(statuses))}) OR started_at < ?)",
+            (owner, RUNNING, now, key, *statuses, now - FLIGHT_TIMEOUT),
+        ).rowcount)
+
+
+def _poll(key, owner, path):
+    """Checks another process's flight: (DONE, answer), (RUNNING, None), or (None, None) once we lead it instead."""
+    row = connect(path).execute("SELECT status, response, started_at FROM llm_flights WHERE key = ?", (key,)).fetchone()
+    if row is not None and row[0] == DONE:
+        return DONE, row[1]
+    if row is not None and row[0] == RUNNING and row[2] >= time.time() - FLIGHT_TIMEOUT:
+        return RUNNING, None
+    if _claim(key, owner, path, takeover=True):
+        _count("taken_over")
+        return None, None
+    return RUNNING, None
+
+
+def _land(key, owner, path, response=None, failed=False):
+    now = time.time()
+    conn = connect(path)
+    with conn:
+        conn.execute(
+            "UPDATE llm_flights SET status = ?, response = ?, finished_at = ? WHERE key = ? AND owner = ?",
+            (FAILED if failed else DONE, response, now, key, owner),
+        )
+        conn.execute("DELETE FROM llm_flights WHERE status != ? AND finished_at < ?", (RUNNING, now - RESULT_TTL))
+
+
+def _lead(key, call, path):
+    """Runs call as this process's leader for key, or waits for another process that leads it."""
+    owner = f"{_OWNER_PREFIX}:{uuid.uuid4().hex[:8]}"
+    if SHARED_FLIGHTS:
+        leading = _claim(key, owner, path)
+        delay = POLL_INTERVAL
+        while not leading:
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_POLL_INTERVAL)
+            status, response = _poll(key, owner, path)
+            if status == DONE:
+                _count("coalesced_shared")
+                return response
+            leading = status is None
+    _count("leaders")
+    try:
+        response = call()
+    except Exception:
+        if SHARED_FLIGHTS:
+            _land(key, owner, path, failed=True)
+        raise
+    if SHARED_FLIGHTS:
+        _land(key, owner, path, response)
+    return response
+
+
+async def _lead_async(key, call, path):
+    """_lead for a coroutine call; the shared store is read off the event loop."""
+    owner = f"{_OWNER_PREFIX}:{uuid.uuid4().hex[:8]}"
+    try:
+        if SHARED_FLIGHTS:
+            leading = await asyncio.to_thread(_claim, key, owner, path)
+            delay = POLL_INTERVAL
+            while not leading:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_POLL_INTERVAL)
+                status, response = await asyncio.to_thread(_poll, key, owner, path)
+                if status == DONE:
+                    _count("coalesced_shared")
+                    return response
+                leading = status is None
+        _count("leaders")
+        response = await call()
+    except (Exception, asyncio.CancelledError):
+        if SHARED_FLIGHTS:
+            # Shielded, so a cancelled leader still lands its flight (a no-op unless we own it)
+            await asyncio.shield(asyncio.to_thread(_land, key, owner, path, None, True))
+        raise
+    if SHARED_FLIGHTS:
+        await asyncio.to_thread(_land, key, owner, path, response)
+    return response
+
+
+def single_flight(key, call, path=None):
+    """Returns call() (a string), sharing one call among all concurrent callers with the same key."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        _count("coalesced")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = _lead(key, call, path)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+async def single_flight_async(key, call, path=None):
+    """single_flight for a coroutine function call."""
+    flight = _async_flights.get(key)
+    if flight is not None:
+        _count("coalesced")
+        try:
+            return await asyncio.shield(flight)
+        except _Abandoned:
+            # The first waiter to get here leads the flight again; the others wait for it
+            _count("taken_over")
+            return await single_flight_async(key, call, path)
+    flight = _async_flights[key] = asyncio.get_running_loop().create_future()
+    flight.add_done_callback(lambda f: f.cancelled() or f.exception())  # Nobody waiting is fine
+    try:
+        result = await _lead_async(key, call, path)
+    except asyncio.CancelledError:
+        # Only the leader's caller went away; its waiters still want the answer
+        flight.set_exception(_Abandoned())
+        raise
+    except Exception as e:
+        flight.set_exception(e)
+        raise
+    else:
+        flight.set_result(result)
+        return result
+    finally:
+        if _async_flights.get(key) is flight:
+            del _async_flights[key]
+
+
+def flight_stats():
+    """Upstream calls made (leaders) and calls that shared another's answer, in or across processes."""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _flights_lock:
+        stats["in_flight"] = len(_flights) + len(_async_flights)
+    return stats
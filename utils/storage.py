@@ -0,0 +1,43 @@
+# utils/storage.py
+
+import os
+import json
+import hashlib
+import tempfile
+
+# Server-side data lives next to the uploads unless configured otherwise.
+DATA_DIR = os.getenv("QA_DATA_DIR", os.path.join("uploads", ".data"))
+
+def content_hash(text):
+    """Returns a stable SHA-256 hex digest for a piece of text."""
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.sha256(text).hexdigest()
+
+def _namespace_path(namespace, key):
+    folder = os.path.join(DATA_DIR, namespace)
+    os.makedirs(folder, exist_ok=True)
+    # Keys may be arbitrary strings (e.g. file names), so store them under their hash.
+    return os.path.join(folder, f"{content_hash(key)[:32]}.json")
+
+def load_json(namespace, key, default=None):
+    """Loads a JSON document stored under (namespace, key), or returns default."""
+    path = _namespace_path(namespace, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(namespace, key, data):
+    """Atomically stores a JSON document under (namespace, key)."""
+    path = _namespace_path(namespace, key)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,105 @@
+# utils/task_queue.py
+
+import os
+import json
+import time
+import uuid
+from collections import namedtuple
+
+from utils.database import connect, register_schema, transaction
+
+# Deferred LLM work. In degraded mode (the LLM circuit is open) the analysis pipeline files
+# each task's LLM part here instead of failing it; a drainer in the app (see
+# utils/analysis.py) runs the queue once calls get through again and replaces the
+# placeholder reports. Rows are claimed before they run, so several worker processes can
+# drain the same queue without running a task twice.
+
+QUEUED, RUNNING = "queued", "running"
+CLAIM_TIMEOUT = 900.0  # Seconds after which a running claim is presumed dead and requeued
+
+register_schema("""
+CREATE TABLE IF NOT EXISTS deferred_tasks (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    submitter_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    cohort_id TEXT,
+    assignment TEXT NOT NULL,
+    title TEXT NOT NULL,
+    args TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    reports_folder TEXT NOT NULL,
+    status TEXT NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS deferred_tasks_job_assignment_title ON deferred_tasks (job_id, assignment, title);
+CREATE INDEX IF NOT EXISTS deferred_tasks_status ON deferred_tasks (status, id);
+""")
+
+DeferredTask = namedtuple("DeferredTask", ["id", "user_id", "submitter_id", "job_id", "cohort_id", "task", "reports_folder", "attempts"])
+
+_WORKER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def defer_tasks(user_id, submitter_id, job_id, cohort_id, items, path=None):
+    """Queues (task, reports folder) pairs; a task already queued for the job is replaced."""
+    now = time.time()
+    rows = [
+        (user_id, submitter_id, job_id, cohort_id, task.assignment, task.title, json.dumps(list(task.args)), json.dumps(task.kwargs),
+         reports_folder, QUEUED, now)
+        for task, reports_folder in items
+    ]
+    with transaction(path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO deferred_tasks "
+            "(user_id, submitter_id, job_id, cohort_id, assignment, title, args, kwargs, reports_folder, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def queued_count(path=None):
+    """Tasks waiting (or running) in the queue."""
+    return connect(path).execute("SELECT COUNT(*) FROM deferred_tasks").fetchone()[0]
+
+
+def claim_deferred(task_type, limit=1, path=None):
+    """Claims up to limit queued tasks, oldest first, as DeferredTask with task built by task_type(assignment, title, args, kwargs)."""
+    now = time.time()
+    conn = connect(path)
+    claimed = []
+    with conn:
+        rows = conn.execute(
+            "SELECT id, user_id, submitter_id, job_id, cohort_id, assignment, title, args, kwargs, reports_folder, attempts "
+            "FROM deferred_tasks WHERE status = ? OR claimed_at < ? ORDER BY id LIMIT ?",
+            (QUEUED, now - CLAIM_TIMEOUT, limit),
+        ).fetchall()
+        for row in rows:
+            if conn.execute(
+                "UPDATE deferred_tasks SET status = ?, claimed_by = ?, claimed_at = ? "
+                "WHERE id = ? AND (status = ? OR claimed_at < ?)",
+                (RUNNING, _WORKER, now, row[0], QUEUED, now - CLAIM_TIMEOUT),
+            ).rowcount:
+                task = task_type(row[5], row[6], tuple(json.loads(row[7])), json.loads(row[8]))
+                claimed.append(DeferredTask(row[0], row[1], row[2], row[3], row[4], task, row[9], row[10]))
+    return claimed
+
+
+def release_deferred(task_id, path=None):
+    """Puts a claimed task back in the queue (its LLM part still could not run)."""
+    conn = connect(path)
+    with conn:
+        conn.execute(
+            "UPDATE deferred_tasks SET status = ?, claimed_by = NULL, claimed_at = NULL, attempts = attempts + 1 WHERE id = ?",
+            (QUEUED, task_id),
+        )
+
+
+def finish_deferred(task_id, path=None):
+    """Removes a task whose report has been written."""
+    conn = connect(path)
+    with conn:
+        conn.execute("DELETE FROM deferred_tasks WHERE id = ?", (task_id,))
@@ -0,0 +1,102 @@
+# utils/text_normalization.py
+
+import re
+from collections import Counter, namedtuple
+
+# Clean-up between extraction and prompting. PDF (and slide) text comes with page furniture:
+# running headers and footers, page numbers, words hyphenated across line breaks, ligature
+# glyphs, and tables that pdfplumber emits a second time after the page text. None of it
+# helps the model, and all of it is paid for in every prompt built from the document.
+
+NormalizedText = namedtuple("NormalizedText", ["text", "original_tokens", "saved_tokens"])
+
+EDGE_LINES = 2  # Lines at the top and bottom of a page that may be headers/footers
+MIN_PAGES = 3  # Repetition is only meaningful across this many pages
+REPEAT_SHARE = 0.5  # A header/footer appears on at least this share of pages
+TABLE_OVERLAP = 0.8  # Share of a table's cells already in the page text for it to be dropped
+
+LIGATURES = {
+    "\ufb00": "ff", "\ufb01": "fi", "\ufb02": "fl", "\ufb03": "ffi", "\ufb04": "ffl", "\ufb05": "st", "\ufb06": "st",
+    # Soft hyphen, zero-width characters and BOM are dropped; non-breaking spaces become spaces
+    "\u00ad": "", "\u200b": "", "\u200c": "", "\u200d": "", "\ufeff": "", "\u00a0": " ",
+}
+
+_LIGATURES = str.maketrans(LIGATURES)
+_CID = re.compile(r"\(cid:\d+\)")
+_DIGITS = re.compile(r"\d+")
+_PAGE_NUMBER = re.compile(r"^(?:[Pp]age\s*)?(?:\d+|x{0,3}(?:ix|iv|v?i{1,3}|v))(?:\s*(?:of|/)\s*\d+)?$")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n[ \t]*([a-z])")
+_SPACES = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _tokens(text):
+    # Same ~4 characters per token estimate as the model router
+    return len(text) // 4
+
+
+def _line_key(line):
+    return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+
+def _edges(lines):
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def repeated_edge_lines(pages_lines):
+    """Header/footer keys: edge lines (digits ignored) repeated on enough pages."""
+    if len(pages_lines) < MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in pages_lines:
+        counts.update({_line_key(lines[i]) for i in _edges(lines)})
+    needed = max(MIN_PAGES, REPEAT_SHARE * len(pages_lines))
+    return {key for key, n in counts.items() if n >= needed and key.strip("# ")}
+
+
+def _strip_furniture(lines, furniture, page_numbers):
+    edges = _edges(lines)
+    return [
+        line for i, line in enumerate(lines)
+        if i not in edges or not (_line_key(line) in furniture or (page_numbers and _PAGE_NUMBER.match(line.strip())))
+    ]
+
+
+def table_rows_text(rows):
+    """Tab-separated text of a table, one line per row."""
+    return "\n".join("\t".join("" if cell is None else str(cell) for cell in row) for row in rows)
+
+
+def _table_in_text(rows, page_text):
+    cells = [" ".join(str(cell).split()) for row in rows for cell in row if cell is not None and str(cell).strip()]
+    flat = " ".join(page_text.split())
+    return sum(1 for cell in cells if cell in flat) >= TABLE_OVERLAP * len(cells)
+
+
+def clean_text(text):
+    """Repairs extraction artifacts: ligatures, (cid:N) glyphs, hyphenated line breaks, runs of whitespace."""
+    text = _CID.sub("", text.translate(_LIGATURES))
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    text = "\n".join(_SPACES.sub(" ", line).strip() if "\t" not in line else line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def normalize_pages(pages):
+    """Normalises a document given as [(page text, [table rows, ...])] and reports the tokens saved.
+
+    original_tokens is measured on the text the extractors used to return: every page followed
+    by its tables.
+    """
+    original = "".join(
+        page_text + "\n" + "".join("\n".join("\t".join(map(str, row)) for row in rows) + "\n" for rows in tables)
+        for page_text, tables in pages
+    )
+    pages_lines = [page_text.split("\n") for page_text, _ in pages]
+    furniture = repeated_edge_lines(pages_lines)
+    parts = []
+    for lines, (page_text, tables) in zip(pages_lines, pages):
+        parts.append("\n".join(_strip_furniture(lines, furniture, page_numbers=len(pages) > 1)))
+        parts.extend(table_rows_text(rows) for rows in tables if not _table_in_text(rows, page_text))
+    text = clean_text("\n".join(parts))
+    return NormalizedText(text, _tokens(original), _tokens(original) - _tokens(text))